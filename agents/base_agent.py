@@ -1,11 +1,15 @@
-from threading import Thread
-from time import sleep
-from typing import Callable, Dict, Optional
+from contextlib import contextmanager
+from concurrent.futures import Future, InvalidStateError, TimeoutError
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional
 
 from jsonschema import validate, ValidationError
 from enum import Enum
 
 from models.base_model import BaseModel
+from utils.json_stream import JsonStreamParser, Path
+from utils.timeouts import timeout_scheduler
+from utils.utils import extract_json, json_from_str
 
 
 class AgentState(Enum):
@@ -18,17 +22,20 @@ class AgentState(Enum):
 class BaseAgent:
     """Base class for all agents."""
 
-    def __init__(self, name: str, llm: Optional[BaseModel] = None):
+    def __init__(self, name: str, llm: Optional[BaseModel] = None, user_input_timeout: Optional[float] = 30):
         """
         Initializes the agent.
 
         :param name: The name of the agent.
         :param llm: The language model to use for the agent.
+        :param user_input_timeout: Seconds to wait for user input before giving up, or None to wait forever.
         """
         self._name: str = name
         self._llm: Optional[BaseModel] = llm
         self._agent_state: AgentState = AgentState.IDLE
-        self._user_input_thread: Optional[Thread] = None
+        self._user_input_timeout: Optional[float] = user_input_timeout
+        self._user_input_future: Optional[Future] = None
+        self._user_input_lock = Lock()
         self._user_input: Optional[Dict] = None
         self._send_user_message_callback: Optional[Callable[[str], None]] = None
 
@@ -50,6 +57,23 @@ class BaseAgent:
         """
         self._agent_state = state
 
+    @property
+    def llm(self) -> Optional[BaseModel]:
+        """
+        Returns the language model of the agent.
+
+        :return: The language model, or None if the agent doesn't use one.
+        """
+        return self._llm
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Identifies what determines the agent's output besides its input: the agent and its model's
+        fingerprint.  Agents with settings that change their output add them.
+        """
+        return f"{type(self).__name__}:{self._llm.fingerprint if self._llm else ''}"
+
     def run_agent(self, agent_input: Dict) -> Dict:
         """
         Runs the agent with the specified input.
@@ -59,16 +83,28 @@ class BaseAgent:
         """
         pass
 
-    def request_user_input(self, message: str) -> None:
+    def request_user_input(self, message: str, timeout: Optional[float] = None) -> Future:
         """
-        Requests user input from the user.
+        Requests user input from the user.  No thread is held while waiting; the returned future
+        resolves as soon as user_input_received is called, or with None when the timeout expires.
 
         :param message: The message to display to the user.
+        :param timeout: Seconds to wait for the input, defaults to the agent's user_input_timeout.
+        :return: A future resolving to the user input.
         """
+        future = Future()
+        with self._user_input_lock:
+            self._user_input = None
+            self._user_input_future = future
+        self.agent_state = AgentState.WAITING_FOR_USER
+
+        timeout = self._user_input_timeout if timeout is None else timeout
+        if timeout is not None:
+            handle = timeout_scheduler.schedule(timeout, lambda: self._resolve_user_input(future, None))
+            future.add_done_callback(lambda _: handle.cancel())
+
         self.send_user_message(message)
-        # start thread to wait for input
-        self._user_input_thread = Thread(target=self._wait_for_user_input, daemon=True)
-        self._user_input_thread.start()
+        return future
 
     def user_input_received(self, user_input: Dict) -> None:
         """
@@ -76,22 +112,118 @@ class BaseAgent:
 
         :param user_input: The user input.
         """
-        self._user_input = user_input
+        with self._user_input_lock:
+            self._user_input = user_input
+            future = self._user_input_future
+        if future:
+            self._resolve_user_input(future, user_input)
 
-    def _wait_for_user_input(self) -> None:
+    def wait_for_user_input(self, timeout: Optional[float] = None) -> Optional[Dict]:
         """
-        Waits for user input for a specified timeout.
+        Blocks until the requested user input arrives or the timeout expires.
+
+        :param timeout: Seconds to wait, defaults to the agent's user_input_timeout.
+        :return: The user input, or None if none was received in time.
         """
-        timeout = 30
-        delay = 1
-        while True:
-            if self._user_input:
-                break
-            if timeout <= 0:
-                break
+        future = self._user_input_future
+        if not future:
+            return self._user_input
+
+        try:
+            return future.result(timeout=self._user_input_timeout if timeout is None else timeout)
+        except TimeoutError:
+            return None
+
+    def _resolve_user_input(self, future: Future, user_input: Optional[Dict]) -> None:
+        """
+        Completes a pending user input request, ignoring requests that were already completed.
+        """
+        with self._user_input_lock:
+            if future.done():
+                return
+            if self._user_input_future is future:
+                self._user_input_future = None
+                self.agent_state = AgentState.IDLE
+
+        try:
+            future.set_result(user_input)
+        except InvalidStateError:
+            pass  # the input arrived and the timeout fired at the same time
+
+    @contextmanager
+    def listen(self, llm: BaseModel, listener: Optional[Callable[[str], None]]):
+        """
+        Passes the chunks of the model's responses to a listener, on top of the model's own callback,
+        while the context is active.
+
+        :param llm: The model.
+        :param listener: Called with each chunk as it's streamed (or the whole response if the model
+                         doesn't stream), or None to do nothing.
+        """
+        if not listener:
+            yield
+            return
+
+        previous_callback = llm.response_callback
+
+        def callback(text: str) -> None:
+            if text != '[END]':
+                listener(text)
+            if previous_callback:
+                previous_callback(text)
+
+        llm.set_callback(callback)
+        try:
+            yield
+        finally:
+            llm.set_callback(previous_callback)
+
+    def send_structured_message(self, prompt: str, schema: Dict, llm: Optional[BaseModel] = None,
+                                stream_paths: Optional[List[Path]] = None,
+                                on_value: Optional[Callable[[Path, Any], None]] = None,
+                                fallback_key: Optional[str] = None) -> Optional[Dict]:
+        """
+        Sends a prompt to the model and parses the response as JSON matching the schema.
+        The model constrains its output to the schema where supported, otherwise the JSON
+        is extracted from the free-form response.
+
+        :param prompt: The prompt to send.
+        :param schema: The schema the response must conform to.
+        :param llm: The model to send the prompt to, defaults to the agent's model.
+        :param stream_paths: Paths (see JsonStreamParser) of values to report while the response streams.
+        :param on_value: Called with the path and value of each completed value at stream_paths, before
+                         the rest of the response has been generated when the model streams.
+        :param fallback_key: If set, a response that isn't a JSON object is returned whole under this key
+                             instead of being rejected.
+        :return: The parsed response, or None if no JSON could be parsed.
+        """
+        llm = llm or self._llm
+        parser = None
+        listener = None
+        if stream_paths and on_value:
+            parser = JsonStreamParser(paths=stream_paths)
+
+            def listener(text: str) -> None:
+                for path, value in parser.feed(text):
+                    on_value(path, value)
+
+        with self.listen(llm, listener):
+            response = llm.send_structured_message(prompt, schema).strip()
+
+        if parser and not parser.started:
+            # the model didn't stream, so report the values from the whole response
+            for path, value in parser.feed(response):
+                on_value(path, value)
+        if parser and parser.done and isinstance(parser.result, dict):
+            return parser.result
+
+        ok, data = json_from_str(response)
+        if not ok:
+            data = extract_json(response)
 
-            sleep(delay)
-            timeout -= delay
+        if isinstance(data, dict):
+            return data
+        return {fallback_key: response} if fallback_key and response else None
 
     def send_user_message(self, message: str) -> None:
         """
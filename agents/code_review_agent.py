@@ -1,7 +1,14 @@
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
 
 from agents.base_agent import BaseAgent
 from models.base_model import BaseModel
 from tools.file_tools import *
+from utils.code_chunker import CodeChunk, chunk_source
+from utils.rate_limiter import RateLimiter
+from utils.symbol_index import SymbolIndex
 
 
 class CodeReviewAgent(BaseAgent):
@@ -10,7 +17,8 @@ class CodeReviewAgent(BaseAgent):
         "properties": {
             "prompt": {"type": "string"},
             "path": {"type": "string"},
-            "architecture": {"type": "string"}
+            "architecture": {"type": "string"},
+            "chunked": {"type": "boolean"}
         },
         "required": ["prompt"]
     }
@@ -23,10 +31,41 @@ class CodeReviewAgent(BaseAgent):
         "response": ["review"]
     }
 
-    def __init__(self, llm: BaseModel):
+    REVIEW_FORMAT_INSTRUCTION = ('\nRespond with a JSON object of the form {"review": "<the list of changes>"} '
+                                 'and nothing else.')
+
+    review_schema = {
+        "type": "object",
+        "properties": {
+            "review": {"type": "string"},
+        },
+        "required": ["review"]
+    }
+
+    def __init__(self, llm: BaseModel, llm_factory: Callable[[], BaseModel] | None = None,
+                 chunk_lines: int = 200, max_workers: int = 4, symbol_index: SymbolIndex | None = None,
+                 rate_limiter: RateLimiter | None = None):
+        """
+        :param llm: The language model used for reviews.
+        :param llm_factory: Callable returning a new initialized model; enables reviewing chunks of large
+            files in parallel, each worker using its own model and conversation.  The workers and their
+            models are kept for the agent's lifetime.
+        :param chunk_lines: Files longer than this are reviewed in chunks when llm_factory is set.
+        :param max_workers: Maximum number of chunks reviewed at the same time.
+        :param symbol_index: Optional index used to add the definitions referenced by the code under review.
+        :param rate_limiter: Optional limiter every chunk review waits for, shared with other agents.
+        """
         super().__init__(name="Code Review Agent", llm=llm)
         self._change_summary = []
         self._last_good_output = {}
+        self._llm_factory = llm_factory
+        self._chunk_lines = chunk_lines
+        self._max_workers = max(1, max_workers)
+        self._local = threading.local()
+        self._executor: ThreadPoolExecutor | None = None
+        self._executor_lock = threading.Lock()
+        self._symbol_index = symbol_index
+        self.rate_limiter = rate_limiter
 
     def run_agent(self, agent_input: dict) -> dict:
         if not self.validate_input(agent_input=agent_input, schema=self.input_schema):
@@ -37,15 +76,110 @@ class CodeReviewAgent(BaseAgent):
             architecture = read_file(agent_input["architecture"])
             prompt = f"\nYou are reviewing with code as part of a larger project. Below is the architecture of the project you are working on which will inform how you review this particular piece:\n" + architecture
 
+        existing_code = ""
         if agent_input.get("path", None):
             if os.path.exists(agent_input["path"]):
                 existing_code = read_file(agent_input["path"])
+
+        if self._symbol_index and existing_code:
+            definitions = self._symbol_index.context_for(existing_code, exclude_path=agent_input["path"])
+            if definitions:
+                prompt += f"\nHere are the definitions the code uses from other files: {definitions}"
+
+        chunked = agent_input.get("chunked", len(existing_code.splitlines()) > self._chunk_lines)
+        if chunked and self._llm_factory and existing_code:
+            review = self._review_chunks(prompt, agent_input["path"], existing_code)
+        else:
+            if existing_code:
                 prompt += f"\nHere is the code to review: {existing_code}"
+            prompt += self.REVIEW_FORMAT_INSTRUCTION
+
+            # a model that ignores the format still gets its review through
+            data = self.send_structured_message(prompt, self.review_schema, fallback_key="review")
+            if data is None:
+                return {"error": "Invalid output data."}
+            review = str(data.get("review", "")).strip()
 
-        response = self._llm.send_message(prompt)
-        agent_output = {"response": response.strip()}
+        agent_output = {"response": review}
 
         if not self.validate_output(agent_output=agent_output, schema=self.output_schema):
             return {"error": "Invalid input data."}
 
         return agent_output
+
+    def _review_chunks(self, prompt: str, path: str, code: str) -> str:
+        """
+        Reviews a file in chunks split along class and function boundaries (map), then merges
+        and de-duplicates the findings locally (reduce).
+
+        :param prompt: The shared prompt, including the architecture if any.
+        :param path: The path of the file under review.
+        :param code: The contents of the file.
+        :return: The merged review.
+        """
+        chunks = chunk_source(code, max_lines=self._chunk_lines)
+        outline = ", ".join(chunk.name for chunk in chunks if chunk.name)
+
+        reviews = list(self._pool().map(lambda chunk: self._review_chunk(prompt, path, outline, chunk), chunks))
+
+        return self._merge_reviews(chunks, reviews)
+
+    def _pool(self) -> ThreadPoolExecutor:
+        """
+        Returns the pool chunks are reviewed on, created on first use and kept so its threads keep their
+        models between reviews.
+        """
+        with self._executor_lock:
+            if not self._executor:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers,
+                                                    thread_name_prefix="code-review")
+            return self._executor
+
+    def shutdown(self) -> None:
+        """Stops the chunk review workers, releasing their models."""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=True)
+
+    def _review_chunk(self, prompt: str, path: str, outline: str, chunk: CodeChunk) -> str:
+        llm = self._worker_llm()
+        chunk_prompt = prompt
+        chunk_prompt += f"\nThe file {path} defines: {outline}."
+        chunk_prompt += f"\nHere is the code to review (lines {chunk.start_line}-{chunk.end_line}): {chunk.text}"
+        chunk_prompt += self.REVIEW_FORMAT_INSTRUCTION
+
+        try:
+            data = self.send_structured_message(chunk_prompt, self.review_schema, llm=llm, fallback_key="review")
+        finally:
+            llm.clear_conversation()
+
+        return str(data.get("review", "")).strip() if data else ""
+
+    def _worker_llm(self) -> BaseModel:
+        """
+        Returns the model owned by the calling worker thread, creating it on first use.
+        """
+        if not hasattr(self._local, "llm"):
+            self._local.llm = self._llm_factory()
+        if self.rate_limiter:
+            self.rate_limiter.throttle(self._local.llm)
+        return self._local.llm
+
+    @staticmethod
+    def _merge_reviews(chunks: list[CodeChunk], reviews: list[str]) -> str:
+        """
+        Splits each chunk review into findings, drops duplicates and renumbers them.
+        """
+        findings = []
+        seen = set()
+        for chunk, review in zip(chunks, reviews):
+            for finding in re.split(r'\n+\s*(?:\d+[.)]|[-*•])\s+', "\n" + review):
+                finding = finding.strip()
+                key = re.sub(r'[^a-z0-9]+', ' ', finding.lower()).strip()
+                if not key or key in seen:
+                    continue
+                seen.add(key)
+                findings.append(f"(lines {chunk.start_line}-{chunk.end_line}) {finding}")
+
+        return "\n".join(f"{i}. {finding}" for i, finding in enumerate(findings, start=1))
@@ -1,19 +1,43 @@
 from agents.base_agent import BaseAgent
 from models.base_model import BaseModel
 from tools.file_tools import *
-from utils.utils import extract_content
+from tools.patch_tools import DIVIDER_MARKER, REPLACE_MARKER, SEARCH_MARKER, PatchError, apply_edits, parse_edits
+from utils.code_stream import CodeBlockStream
+from utils.prompt_registry import PromptTemplate
+from utils.symbol_index import SymbolIndex
+from utils.utils import extract_content, extract_summary, strip_summary
 
 
 class CodingAgent(BaseAgent):
     """
     Agent for modifying code based on user input.
     """
+    SUMMARY_INSTRUCTION = ("At the end of your response, provide a brief summary of the changes you made "
+                           "inside <summary></summary> tags.")
+    PATCH_INSTRUCTION = ("Do not rewrite the whole file. Return only the edits needed, each as a block of the form\n"
+                         f"{SEARCH_MARKER}\n<exact lines from the existing code>\n{DIVIDER_MARKER}\n"
+                         f"<replacement lines>\n{REPLACE_MARKER}\n"
+                         "Include enough surrounding lines for the search text to be unique.")
+    REWRITE_INSTRUCTION = "The edits could not be applied. Please return the complete modified code instead."
+
+    CONTEXT_TEMPLATE = PromptTemplate("<context>{{context}}</context>")
+    DEFINITIONS_TEMPLATE = PromptTemplate("<definitions>{{definitions}}</definitions>")
+    ARCHITECTURE_TEMPLATE = PromptTemplate(
+        "You are working with code as part of a larger project.  The description of the piece you are working "
+        "on is '{{description}}'.Below is the architecture of the project in which you are working."
+        "<architecture>{{architecture}}</architecture>")
+    CODE_TEMPLATE = PromptTemplate("Here is the code to modify: <code>{{code}}</code>")
+
+    EDIT_MODE_FULL = "full"
+    EDIT_MODE_PATCH = "patch"
+
     input_schema = {
         "type": "object",
         "properties": {
             "user_input": {"type": "string"},
             "context": {"type": "string"},
             "code_to_modify": {"type": "string"},
+            "path": {"type": "string"},
             "architecture": {"type": "string"}
         },
         "required": ["user_input"]
@@ -29,16 +53,57 @@ class CodingAgent(BaseAgent):
         "required": ["modified_code", "agent_summary"]
     }
 
-    def __init__(self, llm: BaseModel):
+    def __init__(self, llm: BaseModel, single_call: bool = True, edit_mode: str = EDIT_MODE_PATCH,
+                 symbol_index: SymbolIndex | None = None):
         """
         Initializes the CodingAgent.
 
         Args:
             llm (BaseModel): The language model to use for code generation.
+            single_call (bool): If True, the code and the summary are requested in a single response.
+                Otherwise a second message is sent to ask the model for a summary.
+            edit_mode (str): EDIT_MODE_PATCH to have the model return search/replace edits to existing code,
+                falling back to a full rewrite if they cannot be applied, or EDIT_MODE_FULL to always
+                have the model return the whole file.
+            symbol_index (SymbolIndex): Optional index used to add the definitions referenced by the code
+                to modify to the prompt.
         """
         super().__init__(name="Coding Agent", llm=llm)
         self._change_summary = []
         self._last_good_output = {}
+        self._single_call = single_call
+        self._edit_mode = edit_mode
+        self._symbol_index = symbol_index
+        self._code_writer: StreamingFileWriter | None = None
+
+    @property
+    def fingerprint(self) -> str:
+        return f"{super().fingerprint}:{self._edit_mode}:{self._single_call}"
+
+    def set_code_writer(self, writer: StreamingFileWriter | None) -> None:
+        """
+        Streams the code of whole-file responses to a writer as it's generated, so the file can be
+        written while the model is still responding.  Commit the writer with the final modified code.
+
+        Args:
+            writer (StreamingFileWriter): The writer, or None to stop streaming.
+        """
+        self._code_writer = writer
+
+    def _send_code_message(self, prompt: str, whole_file: bool) -> str:
+        """
+        Sends a prompt to the model, streaming the code of the response to the code writer if the
+        response holds the whole file.
+        """
+        writer = self._code_writer
+        if not whole_file or not writer:
+            return self._llm.send_message(prompt)
+
+        # a new response replaces whatever an earlier one streamed
+        writer.discard()
+        code_stream = CodeBlockStream()
+        with self.listen(self._llm, lambda text: writer.write(code_stream.feed(text))):
+            return self._llm.send_message(prompt)
 
     def run_agent(self, agent_input: dict) -> dict:
         """
@@ -53,30 +118,68 @@ class CodingAgent(BaseAgent):
         if not self.validate_input(agent_input=agent_input, schema=self.input_schema):
             return {"error": "Invalid input data."}
 
-        prompt = ""
+        prompt_parts = []
 
         # Add context data to the prompt
         if agent_input.get("context", None):
-            prompt += f"<context>{agent_input['context'].strip()}</context>"
+            prompt_parts.append(self.CONTEXT_TEMPLATE.render(context=agent_input['context'].strip()))
+
+        # Add the definitions the existing code references
+        if self._symbol_index and agent_input.get('code_to_modify', None):
+            definitions = self._symbol_index.context_for(agent_input['code_to_modify'],
+                                                         exclude_path=agent_input.get('path', None))
+            if definitions:
+                prompt_parts.append(self.DEFINITIONS_TEMPLATE.render(definitions=definitions.strip()))
 
         # Add architecture if available
         if agent_input.get("architecture", None):
-            architecture = read_file(agent_input["architecture"])
-            description = agent_input.get("prompt", "")
-            prompt += f"You are working with code as part of a larger project.  The description of the piece you are working on is '{description}'."
-            prompt += "Below is the architecture of the project in which you are working."
-            prompt += f"<architecture>{architecture}</architecture>"
+            prompt_parts.append(self.ARCHITECTURE_TEMPLATE.render(description=agent_input.get("prompt", ""),
+                                                                  architecture=read_file(agent_input["architecture"])))
 
         # Add existing source code if available
         if agent_input.get('code_to_modify', None):
-            prompt += f"Here is the code to modify: <code>{agent_input['code_to_modify'].strip()}</code>"
+            prompt_parts.append(self.CODE_TEMPLATE.render(code=agent_input['code_to_modify'].strip()))
 
         # Finally, add the user's request
-        prompt += agent_input["user_input"].strip()
-
-        modified_code = self._llm.send_message(prompt)
-        modified_code = extract_content(modified_code)
-        agent_summary = self._llm.send_message("Please provide a summary of the changes you made.")
+        prompt_parts.append(agent_input["user_input"].strip())
+        prompt = "".join(prompt_parts)
+
+        code_to_modify = agent_input.get('code_to_modify', None) or ''
+        use_patch = self._edit_mode == self.EDIT_MODE_PATCH and code_to_modify.strip()
+        if use_patch:
+            prompt += f" {self.PATCH_INSTRUCTION}"
+
+        if self._single_call:
+            prompt += f" {self.SUMMARY_INSTRUCTION}"
+
+        response = self._send_code_message(prompt, whole_file=not use_patch)
+
+        modified_code = None
+        if use_patch:
+            edits = parse_edits(strip_summary(response))
+            if edits:
+                try:
+                    modified_code = apply_edits(code_to_modify, edits)
+                except PatchError as e:
+                    # fall back to having the model rewrite the whole file
+                    print(f"Unable to apply edits: {e}")
+                    rewrite_prompt = self.REWRITE_INSTRUCTION
+                    if self._single_call:
+                        rewrite_prompt += f" {self.SUMMARY_INSTRUCTION}"
+                    response = self._send_code_message(rewrite_prompt, whole_file=True)
+
+        # no edits (or edits that failed to apply) means the response holds the whole file
+        if modified_code is None:
+            modified_code = extract_content(strip_summary(response))
+
+        if self._single_call:
+            agent_summary = extract_summary(response)
+            if not agent_summary:
+                # fall back to a summary built locally from the diff
+                agent_summary = summarize_diff(text1=agent_input.get('code_to_modify', None) or '',
+                                               text2=modified_code)
+        else:
+            agent_summary = self._llm.send_message("Please provide a summary of the changes you made.")
 
         diff = ''
         if agent_input.get('code_to_modify', None):
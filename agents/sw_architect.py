@@ -1,9 +1,10 @@
 import json
+from typing import Callable, Optional
 
 from agents.base_agent import BaseAgent
 from models.base_model import BaseModel
 from tools.file_tools import write_file
-from utils.utils import extract_json
+from utils.json_stream import ANY
 
 class SWArchitect(BaseAgent):
     input_schema = {
@@ -93,15 +94,25 @@ class SWArchitect(BaseAgent):
           }
         }
 
-    def __init__(self, llm: BaseModel):
+    def __init__(self, llm: BaseModel, on_file: Optional[Callable[[dict], None]] = None):
+        """
+        :param llm: The model that designs the architecture.
+        :param on_file: Called with each entry of the file structure as soon as the model has generated
+                        it, so work on the files can start before the architecture is complete.
+        """
         super().__init__(name="Software Architect", llm=llm)
+        self._on_file = on_file
 
     def run_agent(self, agent_input: dict) -> dict:
         if not self.validate_input(agent_input=agent_input, schema=self.input_schema):
             return {"error": "Invalid input data."}
 
-        response = self._llm.send_message(agent_input["prompt"])
-        data = extract_json(response.strip())
+        data = self.send_structured_message(agent_input["prompt"], self.output_schema,
+                                            stream_paths=[("file_structure", ANY)] if self._on_file else None,
+                                            on_value=lambda path, value: self._on_file(value))
+        if data is None:
+            return {"error": "Invalid output data."}
+
         write_file("architecture.txt", json.dumps(data))
         agent_output = data
         if not self.validate_output(agent_output=agent_output, schema=self.output_schema):
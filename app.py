@@ -9,14 +9,18 @@ from agents.chat_agent import ChatAgent
 from agents.coding_agent import CodingAgent
 from agents.code_review_agent import CodeReviewAgent
 from agents.sw_architect import SWArchitect
+from workflows.session_manager import Session, SessionManager
 from workflows.workflow_controller import WorkflowController
 from model_controller import ModelController
 from models.base_model import BaseModel
+from utils.directory_index import directory_index
+from utils.symbol_index import SymbolIndex
 from utils.utils import load_prompt
 
 
 yaml_file = "prompts.yaml"
 write_code_prompt = load_prompt(yaml_file=yaml_file, prompt_name='write_code')
+review_code_prompt = load_prompt(yaml_file=yaml_file, prompt_name='code_review')
 
 app = Flask(__name__)
 socketio = SocketIO(app)
@@ -24,37 +28,73 @@ socketio = SocketIO(app)
 # Load model configuration
 
 model_controller = ModelController()
-workflow_controller: WorkflowController | None = None
-active_model: BaseModel | None = None
-active_agent: BaseAgent | None = None
+symbol_index = SymbolIndex(os.getcwd())
 
 
-def workflow_handler(input_prompt: str):
-    # print('workflow_handler input_data: ', input_prompt)
-    update_chat(input_prompt)
+def start_session(session: Session) -> None:
+    """Creates the model, agent and workflow of a new session and starts the workflow."""
+    session_id = session.session_id
+    try:
+        model_names = model_controller.available_models
+        model = get_model(model_name=model_names[0], system_prompt='', session_id=session_id)
+        agent = get_agent(agent_name='code', model=model)
+
+        # socket ids don't survive a reconnect, so there is nothing to resume from a checkpoint
+        controller = WorkflowController(lambda input_prompt: update_chat(input_prompt, session_id=session_id),
+                                        checkpoint_dir=None)
+        if model:
+            model.initialize()
+        controller.set_agent(agent)
+        controller.load_workflow('code_flow')
+    except Exception as e:
+        update_chat(text=f"Unable to start the session: {e}", system=True, session_id=session_id)
+        raise
+
+    session.model, session.agent, session.controller = model, agent, controller
+
+
+sessions = SessionManager(start_session)
+
+
+def open_session() -> Session | None:
+    """
+    Returns the calling client's session.  A client that just connected, or whose session was closed for
+    being idle, gets a new one, which is started on a worker before any of its work runs.
+    """
+    session = sessions.open(request.sid)
+    if not session:
+        update_chat(text="The server has too many open sessions, please try again later.", system=True,
+                    session_id=request.sid)
+    return session
+
+
+def submit(fn, *args) -> None:
+    """Queues fn(session, *args) for the calling client, telling it when the server is too busy to take it."""
+    session = open_session()
+    if session and not sessions.submit(request.sid, fn, session, *args):
+        update_chat(text="The server is busy, please try again shortly.", system=True, session_id=request.sid)
 
 
 @app.route("/")
 def index():
-    global active_model
-    global active_agent
-    global workflow_controller
-
     # get available LLMs
     model_names = model_controller.available_models
-
-    active_model = get_model(model_name=model_names[0], system_prompt='')
-    active_agent = get_agent(agent_name='code', model=active_model)
-    workflow_controller = WorkflowController(workflow_handler)
-    workflow_controller.load_workflow('code_flow')
-    workflow_controller.set_agent(active_agent)
     return render_template("index.html", model_names=model_names)
 
 
+@socketio.on('connect')
+def handle_connect():
+    open_session()
+
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    sessions.close(request.sid)
+
+
 # Model selection and chat clearing
 @app.route("/set_model", methods=["POST"])
 def set_model():
-    global active_model
     # selected_model = request.json.get("model")
     # active_model = get_model(model_name=selected_model, system_prompt=write_code_prompt)
     # active_model = get_model(model_name=selected_model, system_prompt=None)
@@ -68,32 +108,14 @@ def get_directory_contents():
     if not os.path.isdir(directory):
         return jsonify({"error": "Invalid directory path"}), 400
 
-    def build_tree(path, exclude_dirs=['__pycache__'], top_level=False):
-        if top_level:
-            tree = {'name': os.path.abspath(path), 'type': 'folder', 'path': path, 'children': []}
-        else:
-            tree = {'name': os.path.basename(path), 'type': 'folder', 'path': path, 'children': []}
-        try:
-            with os.scandir(path) as entries:
-                for entry in entries:
-                    if entry.is_dir() and not entry.name.startswith('.') and entry.name not in exclude_dirs:
-                        tree['children'].append(build_tree(entry.path))
-                    elif entry.is_file() and not entry.name.endswith(('.txt', '.log')):
-                        tree['children'].append({
-                            'name': entry.name,
-                            'type': 'file',
-                            'path': os.path.join(path, entry.name) # Use full path
-                        })
-        except PermissionError:
-            # Handle permission errors gracefully
-            tree['children'].append({
-                'name': 'Permission Denied',
-                'type': 'error',
-                'path': path
-            })
-        return tree
-
-    contents = build_tree(os.path.abspath(directory), top_level=True)
+    try:
+        offset = int(request.json.get("offset", 0))
+        limit = int(request.json.get("limit", 200))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid offset or limit"}), 400
+
+    # one level at a time; the browser asks for a folder's contents when it's opened
+    contents = directory_index.list_dir(directory, offset=offset, limit=min(limit, 1000))
     return jsonify(contents)
 
 # @app.route("/set_agent", methods=["POST"])
@@ -113,7 +135,6 @@ def get_directory_contents():
 # Chat interaction using SocketIO
 @socketio.on('send_message')
 def handle_message(data):
-    global workflow_controller
     files = [file[:-1] for file in data.get('files_to_modify', [])]
     input_data = {
         "user_input": data.get('user_input'),
@@ -121,21 +142,16 @@ def handle_message(data):
         "context_files": data.get('context_files', [])
     }
 
-    if workflow_controller:
-        workflow_controller.set_user_input(user_input=input_data)
-    else:
-        response = active_agent.run_agent(agent_input={"user_input": input_data['user_input']})
-
+    submit(lambda session: session.controller.set_user_input(input_data))
 
 
 @socketio.on('clear_history')
 def clear_history():
-    active_agent.clear_chat()
+    submit(lambda session: session.agent and session.agent.clear_chat())
 
 
-def get_model(model_name: str, system_prompt: str | None):
-    global active_model
-    update_chat(text=f"Setting model to {model_name}", system=True)
+def get_model(model_name: str, system_prompt: str | None, session_id: str):
+    update_chat(text=f"Setting model to {model_name}", system=True, session_id=session_id)
     model = model_controller.get_model(model_name)
     if not model:
         print('No model matching name ', model)
@@ -144,45 +160,39 @@ def get_model(model_name: str, system_prompt: str | None):
     if system_prompt:
         model.system_prompt = system_prompt
 
-    model._response_callback = update_chat
-
-    active_model = model
-    if active_agent:
-        active_agent._llm = active_model
+    model._response_callback = lambda text: update_chat(text, session_id=session_id)
 
-    socketio.emit('model_changed', {'model': model_name})
+    socketio.emit('model_changed', {'model': model_name}, to=session_id)
     return model
 
 
 # def update_chat(text: str, system: bool = False) -> None:
-def update_chat(text: str, system: bool = False) -> None:
+def update_chat(text: str, system: bool = False, session_id: str | None = None) -> None:
     if system:
-        socketio.emit('post_message', {'response': text, 'end': False, 'system': True})
+        socketio.emit('post_message', {'response': text, 'end': False, 'system': True}, to=session_id)
     elif text == '[END]':
-        socketio.emit('post_message', {'response': text, 'end': True, 'system': False})
+        socketio.emit('post_message', {'response': text, 'end': True, 'system': False}, to=session_id)
     else:
-        socketio.emit('post_message', {'response': text, 'end': False, 'system': False})
+        socketio.emit('post_message', {'response': text, 'end': False, 'system': False}, to=session_id)
 
 
 def get_agent(agent_name: str, model: BaseModel) -> BaseAgent:
-    global active_agent
     agent = None
     if agent_name == "chat":
         agent = ChatAgent(llm=model)
     elif agent_name == "code":
         model.system_prompt = write_code_prompt
-        agent = CodingAgent(llm=model)
+        agent = CodingAgent(llm=model, symbol_index=symbol_index)
+    elif agent_name == "review":
+        model.system_prompt = review_code_prompt
+        agent = CodeReviewAgent(llm=model, symbol_index=symbol_index)
 
-    model.initialize()
-    active_agent = agent
     return agent
 
 
 @socketio.on('start_workflow')
 def start_workflow():
-    global workflow_controller
-    if workflow_controller:
-        workflow_controller.execute_workflow()
+    submit(lambda session: session.controller.execute_workflow())
 
 if __name__ == "__main__":
     # socketio.run(app, debug=True, allow_unsafe_werkzeug=True, use_reloader=False)
@@ -1,4 +1,6 @@
+import atexit
 import json
+import os
 from pathlib import Path
 
 import tools.file_tools
@@ -7,7 +9,10 @@ from agents.code_review_agent import CodeReviewAgent
 from agents.sw_architect import SWArchitect
 from agents.coding_agent import CodingAgent
 from model_controller import ModelController
+from utils.symbol_index import SymbolIndex
+from utils.tracing import tracer
 from utils.utils import extract_content, load_prompt
+from workflows.app_builder import AppBuilder
 from workflows.workflow_controller import WorkflowController
 
 def user_input(inputs: list, outputs: list) -> dict:
@@ -23,7 +28,15 @@ if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("--mode", choices=["build_app_mode", "chat_mode", "code_mode", "workflow_mode"], required=True)
+    parser.add_argument("--workers", type=int, default=4, help="Files generated in parallel in build_app_mode")
+    parser.add_argument("--rpm", type=int, default=0, help="Provider requests per minute limit (0 for none)")
+    parser.add_argument("--trace", help="Write a Chrome trace of the run to this file; "
+                                        "summarize it with python -m utils.tracing <file>")
     args = parser.parse_args()
+
+    if args.trace:
+        tracer.enable()
+        atexit.register(tracer.export, args.trace)
     
     with open("credentials.json") as f:
         config = json.load(f)
@@ -86,43 +99,47 @@ if __name__ == "__main__":
 
     print("Models loaded.")
 
+    # definitions referenced by the code being written or reviewed, shared by every agent
+    symbol_index = SymbolIndex(os.getcwd())
+
     sw_arch_agent = SWArchitect(llm=llm_swarch_gemini)
-    code_agent = CodingAgent(llm=llm_write_code_gemini)
-    review_agent = CodeReviewAgent(llm=llm_review_code_gemini)
+    code_agent = CodingAgent(llm=llm_write_code_gemini, symbol_index=symbol_index)
+    review_agent = CodeReviewAgent(llm=llm_review_code_gemini, symbol_index=symbol_index)
     chat_agent = ChatAgent(llm=llm_chat_gemini)
 
     if args.mode == "build_app_mode":
         app_prompt: str = input("App to write: ")
         response = sw_arch_agent.run_agent(agent_input={"prompt": app_prompt.strip()})
 
-        for file in response['response']['file_structure']:
-            filepath = file["path"]
-            prompt = {"prompt": file["description"], "architecture": "architecture.txt", "path": filepath}
-
-            # write code for this file
-            response = code_agent.run_agent(agent_input=prompt)
-            code_output = extract_content(response["response"].strip(), "CODE")
-
-            # write the code to the specified file
-            tools.file_tools.write_file(filename=filepath, content=code_output)
-            code_agent.clear_chat()
-
-            # review the code
-            prompt = {"prompt": "", "architecture": "architecture.txt", "path": filepath}
-            review_output = review_agent.run_agent(agent_input=prompt)
-
-            # provide feedback and write the updated code back to the file
-            coding_prompt = f"Please make the following changes to the code: {review_output['response']}"
-            prompt = {"prompt": coding_prompt, "path": filepath}
-            response = code_agent.run_agent(agent_input=prompt)
-            code_output = extract_content(response["response"].strip(), "CODE")
-            summary_output = extract_content(response["response"].strip(), "SUMMARY")
-            tools.file_tools.write_file(filename=file["path"], content=code_output)
-            print(summary_output)
+        if "error" in response:
+            print(response["error"])
+            exit()
 
-            # cleanup
-            code_agent.clear_chat()
-            review_agent.clear_chat()
+        def create_review_model():
+            llm_review = ModelController.create_gemini_model(model_name="Gemini", api_key=gemini_api)
+            llm_review.system_prompt = review_code_prompt
+            llm_review.initialize()
+            return llm_review
+
+        def create_build_agents():
+            # each worker gets its own models so conversations are never shared
+            llm_write = ModelController.create_gemini_model(model_name="Gemini", api_key=gemini_api)
+            llm_write.system_prompt = write_code_prompt
+            llm_write.initialize()
+            return (CodingAgent(llm=llm_write, symbol_index=symbol_index),
+                    CodeReviewAgent(llm=create_review_model(), llm_factory=create_review_model,
+                                    symbol_index=symbol_index))
+
+        builder = AppBuilder(agent_factory=create_build_agents,
+                             architecture_file="architecture.txt",
+                             max_workers=args.workers,
+                             requests_per_minute=args.rpm,
+                             prompts=[write_code_prompt, review_code_prompt],
+                             model_fingerprints=[llm_write_code_gemini.fingerprint,
+                                                 llm_review_code_gemini.fingerprint])
+        builder.build(response['response'])
+        for path, error in builder.failures.items():
+            print(f"Failed to build {path}: {error}")
 
     elif args.mode == "code_mode":
         filepath = input("What file should I modify? ").strip()
@@ -158,7 +175,7 @@ if __name__ == "__main__":
             response = chat_agent.run_agent(agent_input={"prompt": user_input})
             print(f"ChatAgent: {response['response']}")
     elif args.mode == "workflow_mode":
-        controller = WorkflowController(user_input)
+        controller = WorkflowController(user_input, trace_file=args.trace)
         # controller.load_workflow('write_code')
         # controller.set_agent(code_agent)
         controller.load_workflow('chat')
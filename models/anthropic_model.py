@@ -1,9 +1,13 @@
-from anthropic import Anthropic
+import json
+
+from anthropic import NOT_GIVEN, Anthropic
 from anthropic.types import ToolUseBlock
 
 from .base_model import BaseModel
 from .model_settings import ModelSettings
-from tools.file_tools import process_tool_call
+from tools.tool_runtime import tool_registry, tool_runtime
+from utils.schema_utils import schema_to_tool_input
+from utils.tracing import record_usage, trace_model_call
 
 
 class AnthropicModel(BaseModel):
@@ -11,11 +15,13 @@ class AnthropicModel(BaseModel):
     MODEL_SONNET = "claude-3-sonnet-20240229"
     MODEL_SONNET_3_5 = "claude-3-5-sonnet-20240620"
     MODEL_OPUS = "claude-3-opus-20240229"
+    STRUCTURED_OUTPUT_TOOL = "structured_output"
 
     def __init__(self, api_key: str, settings: ModelSettings):
         super().__init__(settings=settings)
         self._client = Anthropic(api_key=api_key)
 
+    @trace_model_call
     def send_message(self, contents: str) -> None:
         """
         Send a prompt to the API and return the response
@@ -23,14 +29,18 @@ class AnthropicModel(BaseModel):
         :return: the response
         """
         self.conversation.add_user_message(contents)
+        # the tools the model may call; the follow-up request must declare them too
+        tools = tool_registry.schemas() or NOT_GIVEN
 
         response = self._client.messages.create(model=self._settings.model_id,
                                                 max_tokens=self._settings.max_tokens,
                                                 system=self._system_prompt if self._system_prompt else "",
                                                 messages=self.conversation.construct_api_message(),
                                                 temperature=self._settings.temperature,
-                                                top_k=500
+                                                top_k=500,
+                                                tools=tools
                                                 )
+        record_usage(response.usage.input_tokens, response.usage.output_tokens)
 
         if response.stop_reason == "end_turn":
             response_text = response.content[0].text
@@ -42,10 +52,9 @@ class AnthropicModel(BaseModel):
                 self._response_callback(response_text)
 
         elif response.stop_reason == "tool_use":
-            tool_use = next(block for block in response.content if block.type == "tool_use")
-            tool_name = tool_use.name
-            tool_input = tool_use.input
-            tool_result = process_tool_call(tool_name, tool_input)
+            # independent tool calls of the same turn run in parallel
+            tool_uses = [block for block in response.content if block.type == "tool_use"]
+            tool_results = tool_runtime.call_many([(tool_use.name, tool_use.input) for tool_use in tool_uses])
 
             convo_history = self.conversation.construct_api_message()
             llm_response = {
@@ -63,6 +72,7 @@ class AnthropicModel(BaseModel):
                         "tool_use_id": tool_use.id,
                         "content": tool_result
                     }
+                    for tool_use, tool_result in zip(tool_uses, tool_results)
                 ]
             })
 
@@ -71,11 +81,50 @@ class AnthropicModel(BaseModel):
                                                          system=self._system_prompt if self._system_prompt else "",
                                                          messages=convo_history,
                                                          temperature=self._settings.temperature,
-                                                         top_k=500
+                                                         top_k=500,
+                                                         tools=tools
                                                          )
+            record_usage(tool_response.usage.input_tokens, tool_response.usage.output_tokens)
 
             if not isinstance(tool_response.content[0], ToolUseBlock):
                 self.conversation.add_assistant_message(tool_response.content[0].text)
 
                 if self._response_callback:
                     self._response_callback(tool_response.content[0].text)
+
+    @trace_model_call
+    def send_structured_message(self, contents: str, schema: dict) -> str:
+        """
+        Send a prompt and force a tool call whose input schema is the output schema,
+        so the response is JSON matching the schema
+        :param contents: the prompt to send
+        :param schema: JSON schema the response must conform to
+        :return: the response as a JSON string
+        """
+        self.conversation.add_user_message(contents)
+
+        tool = {
+            "name": self.STRUCTURED_OUTPUT_TOOL,
+            "description": "Respond with output matching this schema.",
+            "input_schema": schema_to_tool_input(schema)
+        }
+        response = self._client.messages.create(model=self._settings.model_id,
+                                                max_tokens=self._settings.max_tokens,
+                                                system=self._system_prompt if self._system_prompt else "",
+                                                messages=self.conversation.construct_api_message(),
+                                                temperature=self._settings.temperature,
+                                                tools=[tool],
+                                                tool_choice={"type": "tool", "name": self.STRUCTURED_OUTPUT_TOOL}
+                                                )
+
+        record_usage(response.usage.input_tokens, response.usage.output_tokens)
+        tool_use = next((block for block in response.content if block.type == "tool_use"), None)
+        response_text = json.dumps(tool_use.input) if tool_use else ""
+        self._conversation.num_tokens += response.usage.input_tokens
+        self._conversation.num_tokens += response.usage.output_tokens
+        self._conversation.add_assistant_message(response_text)
+
+        if self._response_callback:
+            self._response_callback(response_text)
+
+        return response_text
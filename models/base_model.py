@@ -1,3 +1,4 @@
+import hashlib
 from threading import Thread
 
 from .model_settings import ModelSettings
@@ -20,6 +21,22 @@ class BaseModel:
     def model_name(self) -> str:
         return self._settings.model_name
 
+    @property
+    def model_id(self) -> str:
+        return self._settings.model_id
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Identifies everything that determines the model's output besides the prompt: the provider, the
+        model id, the generation settings and the system prompt.  Models with the same fingerprint are
+        interchangeable for caching their results.
+        """
+        settings = self._settings
+        parts = [settings.model_type.name, settings.model_id, str(settings.max_tokens),
+                 repr(settings.temperature), self._system_prompt or ""]
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
     @property
     def conversation(self) -> Conversation:
         return self._conversation
@@ -54,12 +71,26 @@ class BaseModel:
             self._conversation.save_conversation(self._settings.model_name)
             self._conversation = Conversation()
 
+    @property
+    def response_callback(self):
+        return self._response_callback
+
     def set_callback(self, func) -> None:
         self._response_callback = func
 
     def send_message(self, contents: str) -> str:
         pass
 
+    def send_structured_message(self, contents: str, schema: dict) -> str:
+        """
+        Send a prompt whose response must be JSON matching the schema.
+        Models that support constrained decoding override this; by default the prompt is sent as is.
+        :param contents: the prompt to send
+        :param schema: JSON schema the response must conform to
+        :return: the response
+        """
+        return self.send_message(contents)
+
     def initialize(self) -> None:
         """
         Start the chatbot by sending the initial prompt to it.
@@ -5,6 +5,9 @@ from .model_settings import ModelSettings
 
 import google.generativeai as genai
 
+from utils.schema_utils import schema_to_gemini
+from utils.tracing import record_usage, trace_model_call
+
 
 class GeminiModel(BaseModel):
     MODEL_FLASH = "gemini-1.5-flash"
@@ -33,16 +36,18 @@ class GeminiModel(BaseModel):
         except Exception as e:
             print("Unable to create Gemini model due to exception: ", e)
 
-    def send_message(self, contents: str) -> str:
+    @trace_model_call
+    def send_message(self, contents: str, generation_config: genai.types.GenerationConfig | None = None) -> str:
         """
         Send a prompt to the API and return the response
         :param prompt: the prompt to send
+        :param generation_config: optional config merged over the model's config for this message only
         :return: the response
         """
         self.conversation.add_user_message(contents)
 
         try:
-            response = self._chat.send_message(contents, stream=self._stream)
+            response = self._chat.send_message(contents, stream=self._stream, generation_config=generation_config)
             if self._stream:
                 for chunk in response:
                     if self._response_callback:
@@ -56,6 +61,9 @@ class GeminiModel(BaseModel):
             return ""
 
         # print(response)
+        usage = getattr(response, "usage_metadata", None)
+        if usage:
+            record_usage(usage.prompt_token_count, usage.candidates_token_count)
 
         self.conversation.add_system_message(response.text)
 
@@ -65,6 +73,20 @@ class GeminiModel(BaseModel):
 
         return response.text
 
+    @trace_model_call
+    def send_structured_message(self, contents: str, schema: dict) -> str:
+        """
+        Send a prompt using Gemini's native JSON mode so the response matches the schema
+        :param contents: the prompt to send
+        :param schema: JSON schema the response must conform to
+        :return: the response
+        """
+        config = genai.types.GenerationConfig(
+            response_mime_type="application/json",
+            response_schema=schema_to_gemini(schema)
+        )
+        return self.send_message(contents, generation_config=config)
+
     def clear_conversation(self) -> None:
         self._chat.history = []
         super().clear_conversation()
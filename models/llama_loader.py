@@ -0,0 +1,34 @@
+import threading
+
+from llama_cpp import Llama
+
+
+class SharedLlama:
+    """
+    A GGUF model loaded once and shared by every model instance (and so every session) using it.
+    llama.cpp contexts aren't thread-safe, so generations take turns under the lock.
+    """
+
+    def __init__(self, llama: Llama):
+        self.llama = llama
+        self.lock = threading.Lock()
+
+
+_loaded: dict[tuple, SharedLlama] = {}
+_loaded_lock = threading.Lock()
+
+
+def load_llama(model_path: str, **params) -> SharedLlama:
+    """
+    Returns the loaded model of a GGUF file, loading it on first use.
+
+    :param model_path: The GGUF file.
+    :param params: Arguments of llama_cpp.Llama; the same file with other parameters is loaded separately.
+    """
+    key = (model_path, tuple(sorted(params.items())))
+    # held while loading so concurrent sessions don't load the same file twice
+    with _loaded_lock:
+        shared = _loaded.get(key)
+        if not shared:
+            shared = _loaded[key] = SharedLlama(Llama(model_path=model_path, **params))
+        return shared
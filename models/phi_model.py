@@ -1,9 +1,13 @@
 from pathlib import Path
 
 from .base_model import BaseModel
+from .llama_loader import load_llama
 from .model_settings import ModelSettings
 
-from llama_cpp import Llama
+from llama_cpp import LlamaGrammar
+
+from utils.schema_utils import schema_to_gbnf
+from utils.tracing import record_usage, trace_model_call
 
 
 class PhiModel(BaseModel):
@@ -12,7 +16,8 @@ class PhiModel(BaseModel):
 
         print("PhiModel: ", model_dir)
         print("Settings: ", settings)
-        self._model = Llama(model_path=str(model_dir),
+        # the weights are loaded once and shared by every session's model
+        shared = load_llama(str(model_dir),
                             verbose=False,
                             max_tokens=self._settings.max_tokens,
                             n_gpu_layers=16,
@@ -20,14 +25,18 @@ class PhiModel(BaseModel):
                             n_threads=24,
                             n_threads_batch=16,
                             n_ctx=20480)
+        self._model = shared.llama
+        self._model_lock = shared.lock
 
         self._system_prompt_sent = False
         self._stream = True
 
-    def send_message(self, contents: str) -> str:
+    @trace_model_call
+    def send_message(self, contents: str, grammar: LlamaGrammar | None = None) -> str:
         """
         Send a prompt to the API and return the response
         :param prompt: the prompt to send
+        :param grammar: optional grammar used to constrain the output
         :return: the response
         """
 
@@ -36,25 +45,31 @@ class PhiModel(BaseModel):
             self._system_prompt_sent = True
 
         self.conversation.add_user_message(contents)
-        response = self._model.create_chat_completion(
-            messages=self._conversation.construct_api_message(),
-            max_tokens=self._settings.max_tokens,  # Limit the length of the output
-            temperature=self._settings.temperature,  # Control the creativity of the model (0.0-1.0)
-            stream=self._stream,
-            # top_p=0.9  # Use nucleus sampling to limit the highest-probability tokens
-        )
+        # the model is shared, so the whole generation, including the stream, holds its lock
+        with self._model_lock:
+            response = self._model.create_chat_completion(
+                messages=self._conversation.construct_api_message(),
+                max_tokens=self._settings.max_tokens,  # Limit the length of the output
+                temperature=self._settings.temperature,  # Control the creativity of the model (0.0-1.0)
+                stream=self._stream,
+                grammar=grammar,
+                # top_p=0.9  # Use nucleus sampling to limit the highest-probability tokens
+            )
 
-        if self._stream:
-            response_text: str = ''
-            for token in response:
-                text = token.get('choices', {})[0].get('delta', {}).get('content', '')
-                response_text += text
+            if self._stream:
+                response_text: str = ''
+                for token in response:
+                    text = token.get('choices', {})[0].get('delta', {}).get('content', '')
+                    response_text += text
+                    if self._response_callback:
+                        self._response_callback(text)
                 if self._response_callback:
-                    self._response_callback(text)
-            if self._response_callback:
-                self._response_callback('[END]')
-        else:
-            response_text = response['choices'][0]['message']['content']
+                    self._response_callback('[END]')
+            else:
+                response_text = response['choices'][0]['message']['content']
+                usage = response.get('usage')
+                if usage:
+                    record_usage(usage.get('prompt_tokens'), usage.get('completion_tokens'))
 
         self.conversation.add_system_message(response_text)
 
@@ -63,3 +78,14 @@ class PhiModel(BaseModel):
                 self._response_callback(response_text)
 
         return response_text
+
+    @trace_model_call
+    def send_structured_message(self, contents: str, schema: dict) -> str:
+        """
+        Send a prompt and constrain the output with a grammar compiled from the schema
+        :param contents: the prompt to send
+        :param schema: JSON schema the response must conform to
+        :return: the response
+        """
+        grammar = LlamaGrammar.from_string(schema_to_gbnf(schema), verbose=False)
+        return self.send_message(contents, grammar=grammar)
@@ -75,71 +75,113 @@ document.getElementById('load-directory-btn').addEventListener('click', function
     loadDirectory(directoryPath);
 });
 
-function loadDirectory(path) {
+const PAGE_SIZE = 200;
+
+function fetchDirectory(path, offset = 0) {
     return fetch('/get_directory_contents', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ directory: path })
+        body: JSON.stringify({ directory: path, offset: offset, limit: PAGE_SIZE })
+    })
+    .then(response => response.json());
+}
+
+function addSelectionListeners(node) {
+    node.on('select', (node) => {
+        const fileName = node.getUserObject();
+        selectedFiles.add(fileName); // Add to selected files
+        const span = document.createElement('span');
+        span.textContent = fileName;
+        span.classList.add('file-span'); // Add the file-span class
+        fileHolder.appendChild(span); // Add filename to file_holder div
     })
-    .then(response => response.json())
+    node.on('deselect', (node) => {
+        const fileName = node.getUserObject();
+        selectedFiles.delete(fileName); // Remove from selected files
+        const spans = fileHolder.querySelectorAll('span');
+        spans.forEach(span => {
+            if (span.textContent === fileName) {
+                span.remove();
+            }
+        });
+    })
+}
+
+// Folders are listed one level at a time: their children are fetched the first time they're opened,
+// a page at a time.
+function buildTreeNode(item) {
+    // Ignore folders starting with a period
+    if (item.type === 'folder' && item.name.startsWith('.')) {
+        return null; // Skip building the node
+    }
+
+    if (item.type !== 'folder') {
+        const node = new TreeNode(item.name);
+        addSelectionListeners(node);
+        return node;
+    }
+
+    const node = new TreeNode(item.name, { forceParent: true, expanded: false });
+    addSelectionListeners(node);
+    let loaded = false;
+    node.on('click', (e, node) => {
+        if (!loaded) {
+            loaded = true;
+            loadChildren(node, item.path, 0);
+        }
+    });
+    return node;
+}
+
+function addChildren(node, path, data) {
+    data.children.forEach(child => {
+        const childNode = buildTreeNode(child);
+        if (childNode) { // Only add if not null (skipped hidden folder)
+            node.addChild(childNode);
+        }
+    });
+
+    if (data.has_more) {
+        const more = new TreeNode(`... ${data.total - data.offset - data.children.length} more`);
+        more.on('click', () => {
+            node.removeChild(more);
+            loadChildren(node, path, data.offset + data.children.length);
+        });
+        node.addChild(more);
+    }
+}
+
+function loadChildren(node, path, offset) {
+    return fetchDirectory(path, offset)
     .then(data => {
         if (data.error) {
             alert(data.error);
-            return null;
+            return;
         }
+        addChildren(node, path, data);
+        node.setExpanded(true);
+        treeView.reload();
+    })
+    .catch(error => console.error('Error:', error));
+}
 
-        function buildTreeNode(item, parentNode) {
-            // Ignore folders starting with a period
-            if (item.type === 'folder' && item.name.startsWith('.')) {
-                return null; // Skip building the node
-            }
-
-            const node = new TreeNode(item.name, parentNode);
-            if (item.type === 'folder' && Array.isArray(item.children)) {
-                item.children.forEach(child => {
-                    const childNode = buildTreeNode(child, node);
-                    if (childNode) { // Only add if not null (skipped hidden folder)
-                        node.addChild(childNode);
-                        childNode.on('select', (node) => {
-                            const fileName = node.getUserObject();
-                            selectedFiles.add(fileName); // Add to selected files
-                            const span = document.createElement('span');
-                            span.textContent = fileName;
-                            span.classList.add('file-span'); // Add the file-span class
-                            fileHolder.appendChild(span); // Add filename to file_holder div
-                        })
-                        childNode.on('deselect', (node) => {
-                            const fileName = node.getUserObject();
-                            selectedFiles.delete(fileName); // Remove from selected files
-                            const spans = fileHolder.querySelectorAll('span');
-                            spans.forEach(span => {
-                                if (span.textContent === fileName) {
-                                    span.remove();
-                                }
-                            });
-                        })
-                    }
-                });
-            }
-            return node;
+function loadDirectory(path) {
+    return fetchDirectory(path)
+    .then(data => {
+        if (data.error) {
+            alert(data.error);
+            return null;
         }
 
-        const root = buildTreeNode(data, null);
+        const root = new TreeNode(data.name);
+        addChildren(root, data.path, data);
 
         if (treeView) {
-            // Check if the root is null before setting it
-            if (root) {
-                treeView.setRoot(root);
-                treeView.reload();
-            } else {
-                console.error("Error: Root node is null. Check directory structure.");
-            }
-
-            treeView.collapseAllNodes();
+            treeView.setRoot(root);
+            treeView.reload();
         } else {
             treeView = new TreeView(root, directoryExplorer);
             treeView.reload();
-            // Collapse all nodes
         }
 
         return data;
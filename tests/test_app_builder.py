@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+
+from workflows.app_builder import AppBuilder, build_dependency_graph
+
+ARCHITECTURE = {
+    "file_structure": [{"path": "base.py", "description": "Base"},
+                       {"path": "service.py", "description": "Service"},
+                       {"path": "api.py", "description": "Api"},
+                       {"path": "util.py", "description": "Util"}],
+    "component_schema": [{"name": "Base", "dependencies": []},
+                         {"name": "Service", "dependencies": ["Base"]},
+                         {"name": "Api", "dependencies": ["Service"]},
+                         {"name": "Util", "dependencies": []}],
+}
+
+
+class FakeCodingAgent:
+    llm = None
+
+    def __init__(self, failing: set[str], calls: list[str]):
+        self._failing = failing
+        self._calls = calls
+
+    def run_agent(self, agent_input: dict) -> dict:
+        path = agent_input["user_input"].split()[-1].rstrip(".")
+        self._calls.append(path)
+        if path in self._failing:
+            return {"error": "Invalid output data."}
+        return {"modified_code": f"# {path}\n", "agent_summary": f"wrote {path}"}
+
+    def clear_chat(self) -> None:
+        pass
+
+
+class FakeReviewAgent(FakeCodingAgent):
+    def run_agent(self, agent_input: dict) -> dict:
+        return {"response": ""}
+
+
+class AppBuilderTest(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._dir = tempfile.TemporaryDirectory()
+        os.chdir(self._dir.name)
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._dir.cleanup()
+
+    def build(self, failing: set[str]) -> tuple[AppBuilder, dict, list]:
+        calls = []
+        builder = AppBuilder(lambda: (FakeCodingAgent(failing, calls), FakeReviewAgent(failing, calls)),
+                             max_workers=2, manifest_file=None)
+        return builder, builder.build(ARCHITECTURE), calls
+
+    def test_dependency_graph(self):
+        self.assertEqual(build_dependency_graph(ARCHITECTURE),
+                         {"base.py": set(), "service.py": {"base.py"}, "api.py": {"service.py"}, "util.py": set()})
+
+    def test_builds_every_file(self):
+        builder, summaries, calls = self.build(failing=set())
+        self.assertEqual(builder.failures, {})
+        self.assertEqual(summaries, {path: f"wrote {path}" for path in ("base.py", "service.py", "api.py", "util.py")})
+        self.assertLess(calls.index("base.py"), calls.index("service.py"))
+        self.assertLess(calls.index("service.py"), calls.index("api.py"))
+
+    def test_agent_error_fails_the_file_and_skips_its_dependents(self):
+        builder, summaries, calls = self.build(failing={"base.py"})
+        self.assertEqual(set(builder.failures), {"base.py", "service.py", "api.py"})
+        self.assertIn("Invalid output data.", builder.failures["base.py"])
+        self.assertEqual(builder.failures["api.py"], "Skipped, service.py failed")
+        self.assertEqual(summaries["util.py"], "wrote util.py")
+        self.assertNotIn("service.py", calls)
+        self.assertFalse(os.path.exists("base.py"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from workflows import workflow_controller
+from workflows.checkpoint import CheckpointStore
+from workflows.workflow_compiler import WorkflowRegistry
+from workflows.workflow_controller import WorkflowController
+
+WORKFLOW = {
+    "workflow_id": "answer",
+    "name": "Answer",
+    "description": "Asks a question, answers it and asks for confirmation.",
+    "repeat": False,
+    "steps": [
+        {"id": 1, "type": "user_input", "description": "Question", "input": {"prompt": "Question?"},
+         "output": ["user_input"], "next_step": 2},
+        {"id": 2, "type": "agent_action", "agent": "answer_agent", "description": "Answer",
+         "input": ["user_input"], "output": ["answer"], "next_step": 3},
+        {"id": 3, "type": "user_input", "description": "Confirm", "prepend": ["answer"],
+         "input": {"prompt": "Good?"}, "output": ["confirm"], "next_step": None},
+    ]
+}
+
+
+class EchoAgent:
+    def __init__(self):
+        self.inputs = []
+
+    def run_agent(self, agent_input: dict) -> dict:
+        self.inputs.append(agent_input)
+        return {"answer": f"echo {agent_input['user_input']}"}
+
+
+class CheckpointStoreTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.store = CheckpointStore(self.directory)
+
+    def test_round_trip(self):
+        self.store.save("flow.run", {"state": {"code": "x = 1"}, "current_step_id": 2})
+        self.assertEqual(self.store.load("flow.run"), {"state": {"code": "x = 1"}, "current_step_id": 2})
+        self.assertEqual(os.listdir(self.directory), ["flow.run.json"])
+
+        self.store.clear("flow.run")
+        self.assertIsNone(self.store.load("flow.run"))
+        self.store.clear("flow.run")
+
+    def test_unchanged_checkpoints_are_not_rewritten(self):
+        with mock.patch("os.replace", wraps=os.replace) as replace:
+            self.store.save("flow.run", {"current_step_id": 1})
+            self.store.save("flow.run", {"current_step_id": 1})
+            self.store.save("flow.run", {"current_step_id": 2})
+        self.assertEqual(replace.call_count, 2)
+
+    def test_unserializable_checkpoint_is_refused(self):
+        self.store.save("flow.run", {"current_step_id": 1})
+        with self.assertRaises(TypeError):
+            self.store.save("flow.run", {"state": {"agent": object()}})
+        # the last good checkpoint is kept, and no temporary file is left behind
+        self.assertEqual(self.store.load("flow.run"), {"current_step_id": 1})
+        self.assertEqual(os.listdir(self.directory), ["flow.run.json"])
+
+    def test_corrupt_checkpoint(self):
+        with open(os.path.join(self.directory, "flow.run.json"), "w") as f:
+            f.write('{"state": ')
+        self.assertIsNone(self.store.load("flow.run"))
+
+
+class ResumeTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        workflows_dir = os.path.join(directory.name, "workflows")
+        os.makedirs(workflows_dir)
+        with open(os.path.join(workflows_dir, "answer.json"), "w") as f:
+            json.dump(WORKFLOW, f)
+        registry = mock.patch.object(workflow_controller, "workflow_registry", WorkflowRegistry(workflows_dir))
+        registry.start()
+        self.addCleanup(registry.stop)
+        self.checkpoint_dir = os.path.join(directory.name, "checkpoints")
+        self.prompts = []
+
+    def controller(self, run_id: str) -> tuple[WorkflowController, EchoAgent]:
+        controller = WorkflowController(self.prompts.append, checkpoint_dir=self.checkpoint_dir, run_id=run_id)
+        agent = EchoAgent()
+        controller.set_agent(agent)
+        return controller, agent
+
+    def test_resume_round_trip(self):
+        controller, agent = self.controller("session-1")
+        controller.load_workflow("answer")
+        controller.set_user_input({"user_input": "hello"})
+        self.assertEqual(agent.inputs, [{"user_input": "hello"}])
+        self.assertIn("echo hello", self.prompts[-1])
+        self.assertEqual(os.listdir(self.checkpoint_dir), ["answer.session-1.json"])
+
+        # a new controller for the same run picks up where the first one stopped
+        self.prompts.clear()
+        resumed, resumed_agent = self.controller("session-1")
+        self.assertTrue(resumed.resume_workflow("answer"))
+        self.assertIn("echo hello", self.prompts[-1])
+        resumed.set_user_input({"confirm": "yes"})
+        # the answered question and the agent step weren't run again
+        self.assertEqual(resumed_agent.inputs, [])
+        self.assertEqual(len(self.prompts), 1)
+        # a finished run leaves no checkpoint
+        self.assertEqual(os.listdir(self.checkpoint_dir), [])
+
+    def test_runs_have_their_own_checkpoints(self):
+        first, _ = self.controller("session-1")
+        first.load_workflow("answer")
+        first.set_user_input({"user_input": "first"})
+        second, _ = self.controller("session/2")
+        second.load_workflow("answer")
+        second.set_user_input({"user_input": "second"})
+        self.assertEqual(sorted(os.listdir(self.checkpoint_dir)), ["answer.session-1.json", "answer.session_2.json"])
+
+        self.assertFalse(self.controller("session-3")[0].resume_workflow("answer"))
+        self.prompts.clear()
+        self.assertTrue(self.controller("session-1")[0].resume_workflow("answer"))
+        self.assertIn("echo first", self.prompts[-1])
+
+    def test_unserializable_state_is_refused(self):
+        controller, _ = self.controller("session-1")
+        controller.load_workflow("answer")
+        controller._state["agent"] = object()
+        with self.assertRaises(TypeError):
+            controller.save_checkpoint()
+
+
+if __name__ == "__main__":
+    unittest.main()
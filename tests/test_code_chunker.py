@@ -0,0 +1,83 @@
+import unittest
+
+from agents.code_review_agent import CodeReviewAgent
+from utils.code_chunker import CodeChunk, chunk_source
+
+
+def function(name: str, body_lines: int) -> str:
+    return f"def {name}():\n" + "".join(f"    x_{i} = {i}\n" for i in range(body_lines)) + "\n"
+
+
+class ChunkSourceTest(unittest.TestCase):
+    def check_covers(self, source: str, chunks: list[CodeChunk]) -> None:
+        lines = source.splitlines(keepends=True)
+        # chunks are in file order, don't overlap and their text is the lines they claim
+        previous_end = 0
+        for chunk in chunks:
+            self.assertGreater(chunk.start_line, previous_end)
+            self.assertTrue(chunk.text.endswith("".join(lines[chunk.start_line - 1:chunk.end_line])))
+            previous_end = chunk.end_line
+
+    def test_empty_source(self):
+        self.assertEqual(chunk_source(""), [])
+
+    def test_small_file_is_one_chunk(self):
+        source = "import os\n\n" + function("a", 3) + function("b", 3)
+        chunk, = chunk_source(source, max_lines=50)
+        self.assertEqual((chunk.start_line, chunk.end_line), (1, len(source.splitlines())))
+        self.assertEqual(chunk.text, source)
+        self.assertEqual(chunk.name, "a, b")
+
+    def test_splits_between_functions(self):
+        source = "".join(function(f"f{i}", 8) for i in range(6))
+        chunks = chunk_source(source, max_lines=25)
+        self.assertEqual([chunk.name for chunk in chunks], ["f0, f1", "f2, f3", "f4, f5"])
+        self.assertTrue(all(chunk.end_line - chunk.start_line + 1 <= 25 for chunk in chunks))
+        self.assertEqual("".join(chunk.text for chunk in chunks), source)
+        self.check_covers(source, chunks)
+
+    def test_decorators_stay_with_their_function(self):
+        source = function("a", 8) + "@decorator\n" + function("b", 8)
+        chunks = chunk_source(source, max_lines=12)
+        self.assertEqual([chunk.name for chunk in chunks], ["a", "b"])
+        self.assertTrue(chunks[1].text.startswith("@decorator\ndef b():"))
+
+    def test_large_class_is_split_along_its_methods(self):
+        methods = "".join("    " + line if line.strip() else line
+                          for i in range(4) for line in function(f"m{i}", 8).splitlines(keepends=True))
+        source = "class Big:\n" + methods
+        chunks = chunk_source(source, max_lines=25)
+        self.assertEqual([chunk.name for chunk in chunks], ["Big.m0, Big.m1", "Big.m2, Big.m3"])
+        # chunks after the first keep the class line so the reviewer knows where the methods live
+        self.assertTrue(chunks[1].text.startswith("class Big:\n    ...\n    def m2():"))
+        self.check_covers(source, chunks)
+
+    def test_large_function_is_split_into_lines(self):
+        source = function("long", 30)
+        chunks = chunk_source(source, max_lines=10)
+        self.assertEqual([(chunk.start_line, chunk.end_line) for chunk in chunks], [(1, 10), (11, 20), (21, 30),
+                                                                                    (31, 31)])
+        self.assertTrue(all(chunk.name == "long" for chunk in chunks))
+
+    def test_invalid_python_is_split_into_lines(self):
+        source = "".join(f"not python {i} (\n" for i in range(25))
+        chunks = chunk_source(source, max_lines=10)
+        self.assertEqual([(chunk.start_line, chunk.end_line) for chunk in chunks], [(1, 10), (11, 20), (21, 25)])
+        self.assertEqual("".join(chunk.text for chunk in chunks), source)
+
+
+class MergeReviewsTest(unittest.TestCase):
+    def test_findings_are_deduplicated_and_renumbered(self):
+        chunks = [CodeChunk(1, 10, ""), CodeChunk(11, 20, "")]
+        reviews = ["1. Rename x.\n2. Add a docstring.", "- Add a docstring!\n- Handle the empty list."]
+        self.assertEqual(CodeReviewAgent._merge_reviews(chunks, reviews),
+                         "1. (lines 1-10) Rename x.\n"
+                         "2. (lines 1-10) Add a docstring.\n"
+                         "3. (lines 11-20) Handle the empty list.")
+
+    def test_empty_reviews(self):
+        self.assertEqual(CodeReviewAgent._merge_reviews([CodeChunk(1, 10, "")], [""]), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import random
+import tempfile
+import unittest
+
+from tools.file_tools import StreamingFileWriter, read_file
+from utils.code_stream import CodeBlockStream
+from utils.utils import extract_content
+
+RESPONSES = [
+    "Sure, here:\n```python\ndef f():\n    return '```'\n\n```\n<summary>did it</summary>",
+    "```\n    indented_first_line()\nsecond()\n```\n",
+    "Text\n  ```js\n\n\n  const a = 1;\n  const b = 2;\n```",
+    "``` python\nx = 1\n```\n",
+    "```python print('same line')\ny = 2\n```\n",
+    "```\n```\n",
+]
+
+
+def stream(response: str, seed: int) -> tuple[CodeBlockStream, str]:
+    rng = random.Random(seed)
+    code_stream = CodeBlockStream()
+    code = ""
+    i = 0
+    while i < len(response):
+        size = rng.randint(1, 7)
+        code += code_stream.feed(response[i:i + size])
+        i += size
+    return code_stream, code
+
+
+class CodeBlockStreamTest(unittest.TestCase):
+    def test_streamed_code_matches_extract_content(self):
+        for response in RESPONSES:
+            for seed in range(20):
+                code_stream, code = stream(response, seed)
+                # a closing fence at the very end is only recognized once its line is complete
+                self.assertEqual(code_stream.closed, not response.endswith("```"), response)
+                self.assertEqual(code, extract_content(response), response)
+                self.assertEqual(code, code_stream.finish())
+
+    def test_streamed_code_commits_by_rename(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "module.py")
+            with open(path, "w") as f:
+                f.write("old = True\n")
+
+            response = "Here you go:\n```python\n    def f():\n        return 1\n```\n<summary>added f</summary>"
+            writer = StreamingFileWriter(path)
+            code_stream = CodeBlockStream()
+            for i in range(0, len(response), 5):
+                writer.write(code_stream.feed(response[i:i + 5]))
+            temp_path = writer._temp_path
+            self.assertTrue(os.path.exists(temp_path))
+            temp_inode = os.stat(temp_path).st_ino
+
+            self.assertEqual(writer.commit(extract_content(response)), "Successfully wrote file.")
+            # the streamed temporary file became the target instead of the target being rewritten
+            self.assertFalse(os.path.exists(temp_path))
+            self.assertEqual(os.stat(path).st_ino, temp_inode)
+            self.assertEqual(read_file(path), "def f():\n        return 1\n")
+            self.assertEqual(os.listdir(directory), ["module.py"])
+
+    def test_changed_code_is_written_normally(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "module.py")
+            writer = StreamingFileWriter(path)
+            writer.write("streamed\n")
+            self.assertEqual(writer.commit("different\n"), "Successfully wrote file.")
+            self.assertEqual(read_file(path), "different\n")
+            self.assertEqual(os.listdir(directory), ["module.py"])
+
+
+if __name__ == "__main__":
+    unittest.main()
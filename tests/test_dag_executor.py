@@ -0,0 +1,143 @@
+import threading
+import unittest
+
+from workflows.dag_executor import DagExecutor, build_step_graph, step_keys
+
+
+class FakeController:
+    """Records the steps the executor runs, optionally running a hook first."""
+
+    def __init__(self, hook=None):
+        self.hook = hook
+        self.ran = []
+        self.asked = []
+        self.checkpoints = 0
+        self._lock = threading.Lock()
+
+    def run_step(self, step: dict) -> None:
+        if self.hook:
+            self.hook(step)
+        with self._lock:
+            self.ran.append(step['id'])
+
+    def handle_user_input(self, step: dict) -> None:
+        self.asked.append(step['id'])
+
+    def save_checkpoint(self) -> None:
+        with self._lock:
+            self.checkpoints += 1
+
+
+def action(step_id, inputs=(), outputs=(), **fields) -> dict:
+    return {"id": step_id, "type": "system_action", "input": list(inputs), "output": list(outputs), **fields}
+
+
+def question(step_id, prepend=(), outputs=("user_input",)) -> dict:
+    return {"id": step_id, "type": "user_input", "input": {"prompt": "?"}, "prepend": list(prepend),
+            "output": list(outputs)}
+
+
+class StepGraphTest(unittest.TestCase):
+    def test_step_keys(self):
+        self.assertEqual(step_keys(question(1, prepend=["code"]), "input"), ["code"])
+        self.assertEqual(step_keys({"output": {"user_input": "", "files": []}}, "output"), ["user_input", "files"])
+        self.assertEqual(step_keys(action(1, inputs=["a"]), "input"), ["a"])
+
+    def test_steps_depend_on_the_latest_producer(self):
+        graph = build_step_graph([
+            action(1, outputs=["code"]),
+            action(2, outputs=["context"]),
+            action(3, inputs=["code"], outputs=["code"]),
+            action(4, inputs=["code", "context"]),
+            action(5, depends_on=[1]),
+        ])
+        self.assertEqual(graph, {1: set(), 2: set(), 3: {1}, 4: {2, 3}, 5: {1}})
+
+
+class DagExecutorTest(unittest.TestCase):
+    def test_independent_steps_run_concurrently(self):
+        barrier = threading.Barrier(3, timeout=2)
+        controller = FakeController(hook=lambda step: step['id'] in (1, 2, 3) and barrier.wait())
+        executor = DagExecutor(controller, max_workers=3)
+        executor.load([action(1, outputs=["a"]), action(2, outputs=["b"]), action(3, outputs=["c"]),
+                       action(4, inputs=["a", "b", "c"])])
+        executor.run()
+        self.assertEqual(sorted(controller.ran[:3]), [1, 2, 3])
+        self.assertEqual(controller.ran[3], 4)
+        self.assertTrue(executor.finished)
+        self.assertEqual(controller.checkpoints, 4)
+
+    def test_dependencies_run_first(self):
+        controller = FakeController()
+        executor = DagExecutor(controller)
+        executor.load([action(1, outputs=["a"]), action(2, inputs=["a"], outputs=["b"]), action(3, inputs=["b"])])
+        executor.run()
+        self.assertEqual(controller.ran, [1, 2, 3])
+
+    def test_user_input_pauses_only_its_dependents(self):
+        controller = FakeController()
+        executor = DagExecutor(controller)
+        executor.load([question(1, outputs=["user_input"]), action(2, outputs=["code"]),
+                       action(3, inputs=["user_input", "code"])])
+        executor.run()
+        self.assertEqual(controller.asked, [1])
+        self.assertEqual(controller.ran, [2])
+        self.assertFalse(executor.finished)
+
+        executor.complete_user_input()
+        executor.run()
+        self.assertEqual(controller.ran, [2, 3])
+        self.assertTrue(executor.finished)
+
+    def test_one_question_at_a_time(self):
+        controller = FakeController()
+        executor = DagExecutor(controller)
+        executor.load([question(1, outputs=["first"]), question(2, outputs=["second"])])
+        executor.run()
+        self.assertEqual(controller.asked, [1])
+        executor.complete_user_input()
+        executor.run()
+        self.assertEqual(controller.asked, [1, 2])
+
+    def test_snapshot_and_restore(self):
+        steps = [action(1, outputs=["a"]), question(2, outputs=["user_input"]),
+                 action(3, inputs=["a", "user_input"])]
+        controller = FakeController()
+        executor = DagExecutor(controller)
+        executor.load(steps)
+        executor.run()
+        snapshot = executor.snapshot()
+        self.assertEqual(snapshot, {"completed": [1], "pending": [3], "waiting_step_id": 2})
+
+        resumed_controller = FakeController()
+        resumed = DagExecutor(resumed_controller)
+        resumed.load(steps)
+        resumed.restore(snapshot)
+        # the question is still open, so nothing can run until it's answered
+        resumed.run()
+        self.assertEqual(resumed_controller.ran, [])
+        resumed.complete_user_input()
+        resumed.run()
+        self.assertEqual(resumed_controller.ran, [3])
+        self.assertTrue(resumed.finished)
+
+    def test_steps_that_can_never_run_are_dropped(self):
+        controller = FakeController()
+        executor = DagExecutor(controller)
+        executor.load([action(1), action(2, depends_on=[9])])
+        executor.run()
+        self.assertEqual(controller.ran, [1])
+        self.assertTrue(executor.finished)
+
+    def test_step_errors_propagate(self):
+        def fail(step):
+            raise RuntimeError("step failed")
+
+        executor = DagExecutor(FakeController(hook=fail))
+        executor.load([action(1)])
+        with self.assertRaisesRegex(RuntimeError, "step failed"):
+            executor.run()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import random
+import unittest
+from unittest import mock
+
+from utils import diff_engine
+from utils.diff_engine import diff_opcodes, iter_hunks, iter_html
+
+
+def random_lines(rng: random.Random, count: int) -> list[str]:
+    # few distinct lines, so there are plenty of repeated lines and no unique anchors
+    return [f"line {rng.randint(0, 6)}" for _ in range(count)]
+
+
+def mutate(rng: random.Random, lines: list[str]) -> list[str]:
+    lines = list(lines)
+    for _ in range(rng.randint(0, 6)):
+        position = rng.randint(0, len(lines))
+        action = rng.choice(["insert", "delete", "replace"])
+        if action == "insert" or not lines:
+            lines[position:position] = random_lines(rng, rng.randint(1, 3))
+        elif action == "delete":
+            del lines[position:position + rng.randint(1, 3)]
+        else:
+            lines[position:position + 1] = random_lines(rng, 1)
+    return lines
+
+
+def apply_opcodes(a: list[str], b: list[str], opcodes) -> list[str]:
+    result = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal":
+            result.extend(a[i1:i2])
+        else:
+            result.extend(b[j1:j2])
+    return result
+
+
+def apply_hunks(a: list[str], hunks) -> list[str]:
+    result = []
+    position = 0
+    for hunk in hunks:
+        # an empty old range starts after the line it names
+        start = hunk["old_start"] - 1 if hunk["old_lines"] else hunk["old_start"]
+        result.extend(a[position:start])
+        position = start
+        for line in hunk["lines"]:
+            if line["op"] == " ":
+                assert a[position] == line["text"]
+                result.append(line["text"])
+                position += 1
+            elif line["op"] == "-":
+                assert a[position] == line["text"]
+                position += 1
+            else:
+                result.append(line["text"])
+    result.extend(a[position:])
+    return result
+
+
+class DiffEngineTest(unittest.TestCase):
+    def check_round_trip(self, a: list[str], b: list[str]) -> None:
+        opcodes = list(diff_opcodes(a, b))
+        self.assertEqual(apply_opcodes(a, b, opcodes), b)
+
+        # opcodes cover both sides contiguously, and adjacent opcodes are of different kinds
+        i = j = 0
+        for index, (tag, i1, i2, j1, j2) in enumerate(opcodes):
+            self.assertEqual((i1, j1), (i, j))
+            if tag == "equal":
+                self.assertEqual(a[i1:i2], b[j1:j2])
+            if index:
+                previous = opcodes[index - 1][0]
+                self.assertFalse(previous == tag or (previous != "equal" and tag != "equal"))
+            i, j = i2, j2
+        self.assertEqual((i, j), (len(a), len(b)))
+
+        for context in (0, 3):
+            self.assertEqual(apply_hunks(a, iter_hunks(a, b, context)), b)
+
+    def test_round_trip(self):
+        rng = random.Random(0)
+        for _ in range(500):
+            a = random_lines(rng, rng.randint(0, 40))
+            self.check_round_trip(a, mutate(rng, a))
+
+    def test_round_trip_of_unrelated_texts(self):
+        rng = random.Random(1)
+        for _ in range(100):
+            self.check_round_trip(random_lines(rng, rng.randint(0, 30)), random_lines(rng, rng.randint(0, 30)))
+
+    def test_myers_edit_script_is_minimal(self):
+        rng = random.Random(2)
+        for _ in range(300):
+            a = random_lines(rng, rng.randint(0, 25))
+            b = random_lines(rng, rng.randint(0, 25))
+            # length of the longest common subsequence
+            lengths = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+            for i in range(len(a) - 1, -1, -1):
+                for j in range(len(b) - 1, -1, -1):
+                    lengths[i][j] = lengths[i + 1][j + 1] + 1 if a[i] == b[j] else \
+                        max(lengths[i + 1][j], lengths[i][j + 1])
+            opcodes = list(diff_engine._myers(a, 0, len(a), b, 0, len(b)))
+            self.assertEqual(apply_opcodes(a, b, opcodes), b)
+            changed = sum(i2 - i1 + j2 - j1 for tag, i1, i2, j1, j2 in opcodes if tag != "equal")
+            self.assertEqual(changed, len(a) + len(b) - 2 * lengths[0][0])
+
+    def test_rewritten_region_is_one_replacement(self):
+        a = [f"old {i}" for i in range(50)]
+        b = [f"new {i}" for i in range(50)]
+        with mock.patch.object(diff_engine, "MAX_EDIT_DISTANCE", 10):
+            self.assertEqual(list(diff_opcodes(a, b)), [("replace", 0, 50, 0, 50)])
+            self.check_round_trip(a, b)
+
+    def test_identical_texts_have_no_hunks(self):
+        lines = ["a", "b", "c"]
+        self.assertEqual(list(diff_opcodes(lines, lines)), [("equal", 0, 3, 0, 3)])
+        self.assertEqual(list(iter_hunks(lines, lines)), [])
+
+    def test_unified_line_numbers(self):
+        hunk, = iter_hunks(["a", "b", "c"], ["a", "B", "c"], context=1)
+        self.assertEqual((hunk["old_start"], hunk["old_lines"], hunk["new_start"], hunk["new_lines"]), (1, 3, 1, 3))
+        self.assertEqual([line["op"] for line in hunk["lines"]], [" ", "-", "+", " "])
+
+    def test_html_is_escaped(self):
+        html = "".join(iter_html(["<a>"], ["<b>"]))
+        self.assertIn("-&lt;a&gt;", html)
+        self.assertIn("+&lt;b&gt;", html)
+        self.assertNotIn("<a>", html)
+
+
+if __name__ == "__main__":
+    unittest.main()
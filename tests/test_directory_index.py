@@ -0,0 +1,96 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from utils import directory_index
+from utils.directory_index import DirectoryIndex
+
+
+def names(listing: dict) -> list[str]:
+    return [child["name"] for child in listing["children"]]
+
+
+class DirectoryIndexTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        for name in ("b.py", "A.py", "notes.txt", "run.log"):
+            self.touch(name)
+        for name in ("src", "Docs", ".git", "__pycache__"):
+            os.mkdir(os.path.join(self.root, name))
+
+    def touch(self, name: str) -> None:
+        with open(os.path.join(self.root, name), "w") as f:
+            f.write("")
+
+    def index(self, inotify: bool = True) -> DirectoryIndex:
+        # any other platform checks listings by modification time
+        with mock.patch.object(directory_index.sys, "platform", "linux" if inotify else "darwin"):
+            return DirectoryIndex()
+
+    def wait_for(self, index: DirectoryIndex, expected: list[str]) -> list[str]:
+        """Lists the root until it matches, as inotify reports changes asynchronously."""
+        deadline = time.monotonic() + 2
+        while names(index.list_dir(self.root)) != expected and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return names(index.list_dir(self.root))
+
+    def test_one_level_folders_first(self):
+        listing = self.index().list_dir(self.root)
+        self.assertEqual(names(listing), ["Docs", "src", "A.py", "b.py"])
+        self.assertEqual((listing["name"], listing["type"], listing["total"], listing["has_more"]),
+                         (os.path.abspath(self.root), "folder", 4, False))
+        self.assertEqual([child["type"] for child in listing["children"]], ["folder", "folder", "file", "file"])
+        self.assertNotIn("children", listing["children"][0])
+
+    def test_pages(self):
+        index = self.index()
+        listing = index.list_dir(self.root, offset=1, limit=2)
+        self.assertEqual((names(listing), listing["offset"], listing["has_more"]), (["src", "A.py"], 1, True))
+        self.assertEqual(names(index.list_dir(self.root, offset=3, limit=2)), ["b.py"])
+        self.assertFalse(index.list_dir(self.root, offset=3, limit=2)["has_more"])
+
+    def test_listings_are_cached(self):
+        index = self.index()
+        with mock.patch.object(index, "_scan", wraps=index._scan) as scan:
+            index.list_dir(self.root)
+            index.list_dir(self.root, offset=2)
+        self.assertEqual(scan.call_count, 1)
+
+    def test_changes_invalidate_the_listing(self):
+        for inotify in (True, False):
+            index = self.index(inotify)
+            index.list_dir(self.root)
+            self.touch("c.py")
+            if not inotify:
+                # make sure the directory's modification time changes on coarse file system clocks
+                os.utime(self.root, ns=(0, os.stat(self.root).st_mtime_ns + 1_000_000_000))
+            self.assertEqual(self.wait_for(index, ["Docs", "src", "A.py", "b.py", "c.py"]),
+                             ["Docs", "src", "A.py", "b.py", "c.py"], f"inotify={inotify}")
+            os.remove(os.path.join(self.root, "c.py"))
+
+    def test_clear(self):
+        index = self.index()
+        index.list_dir(self.root)
+        index.clear()
+        with mock.patch.object(index, "_scan", wraps=index._scan) as scan:
+            index.list_dir(self.root)
+        self.assertEqual(scan.call_count, 1)
+
+    def test_least_recently_listed_directories_are_dropped(self):
+        with mock.patch.object(directory_index.sys, "platform", "darwin"):
+            index = DirectoryIndex(max_dirs=1)
+        src = os.path.join(self.root, "src")
+        index.list_dir(self.root)
+        index.list_dir(src)
+        with mock.patch.object(index, "_scan", wraps=index._scan) as scan:
+            index.list_dir(src)
+            index.list_dir(self.root)
+        self.assertEqual(scan.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import codecs
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from utils import file_cache
+from utils.file_cache import FileCache, decode_bytes, detect_encoding
+
+
+class DecodeTest(unittest.TestCase):
+    def test_byte_order_marks(self):
+        for bom, encoding in ((codecs.BOM_UTF8, "utf-8"), (codecs.BOM_UTF16_LE, "utf-16-le"),
+                              (codecs.BOM_UTF16_BE, "utf-16-be"), (codecs.BOM_UTF32_LE, "utf-32-le"),
+                              (codecs.BOM_UTF32_BE, "utf-32-be")):
+            data = bom + "héllo\n".encode(encoding)
+            self.assertEqual(detect_encoding(data), (encoding, len(bom)))
+            self.assertEqual(decode_bytes(data), "héllo\n")
+
+    def test_utf16_without_byte_order_mark(self):
+        self.assertEqual(detect_encoding("def f():\n".encode("utf-16-le")), ("utf-16-le", 0))
+        self.assertEqual(detect_encoding("def f():\n".encode("utf-16-be")), ("utf-16-be", 0))
+        self.assertEqual(decode_bytes("def f():\n".encode("utf-16-le")), "def f():\n")
+
+    def test_utf8_with_latin1_fallback(self):
+        self.assertEqual(detect_encoding(b"plain"), (None, 0))
+        self.assertEqual(decode_bytes("naïve".encode("utf-8")), "naïve")
+        self.assertEqual(decode_bytes("naïve".encode("latin-1")), "naïve")
+
+    def test_newlines_are_normalized(self):
+        self.assertEqual(decode_bytes(b"a\r\nb\rc\n"), "a\nb\nc\n")
+
+
+class FileCacheTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.mtime = 1_000_000
+
+    def write(self, name: str, content: bytes | str) -> str:
+        path = os.path.join(self.directory, name)
+        with open(path, "wb") as f:
+            f.write(content.encode("utf-8") if isinstance(content, str) else content)
+        # every write gets a new modification time, however coarse the file system's timestamps are
+        self.mtime += 1
+        os.utime(path, (self.mtime, self.mtime))
+        return path
+
+    def test_unchanged_files_are_read_once(self):
+        cache = FileCache()
+        path = self.write("a.py", "x = 1\n")
+        self.assertEqual(cache.read(path), "x = 1\n")
+        self.assertEqual(cache.read(path), "x = 1\n")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_changed_files_are_read_again(self):
+        cache = FileCache()
+        path = self.write("a.py", "x = 1\n")
+        cache.read(path)
+        self.write("a.py", "x = 2\n")
+        self.assertEqual(cache.read(path), "x = 2\n")
+        self.assertEqual(cache.misses, 2)
+
+    def test_invalidate(self):
+        cache = FileCache()
+        path = self.write("a.py", "x = 1\n")
+        cache.read(path)
+        cache.invalidate(path)
+        cache.read(path)
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+
+    def test_missing_file(self):
+        self.assertIsNone(FileCache().read(os.path.join(self.directory, "missing.py")))
+
+    def test_least_recently_read_files_are_dropped(self):
+        cache = FileCache(max_entries=2)
+        a, b, c = (self.write(name, name) for name in ("a", "b", "c"))
+        cache.read(a)
+        cache.read(b)
+        cache.read(a)
+        cache.read(c)
+        cache.hits = cache.misses = 0
+        cache.read(a)
+        cache.read(c)
+        cache.read(b)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_size_limit(self):
+        cache = FileCache(max_bytes=10)
+        small = self.write("small", "12345")
+        large = self.write("large", "12345678901")
+        cache.read(small)
+        cache.read(large)
+        cache.read(large)
+        # files larger than the limit are never kept, and don't push out the others
+        cache.read(small)
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+    def test_large_files_are_mapped(self):
+        path = self.write("big.py", codecs.BOM_UTF8 + b"x = 1\r\n" * 100)
+        with mock.patch.object(file_cache, "MMAP_THRESHOLD", 16):
+            self.assertEqual(FileCache().read(path), "x = 1\n" * 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import json
+import random
+import unittest
+
+from utils.json_stream import ANY, JsonStreamParser
+from utils.utils import extract_json
+
+DOCUMENT = {
+    "project_name": "braces {in} \"strings\" }",
+    "description": "ends with a backslash \\",
+    "file_structure": [{"path": f"pkg/module_{i}.py", "description": "unicode é and escapes \\\" {}"}
+                       for i in range(5)],
+    "component_schema": [{"name": "Widget", "type": "class", "weight": 1.5e3, "abstract": False, "parent": None,
+                          "dependencies": [], "methods": [{"name": "run", "description": "[not an array]"}]}],
+    "count": -12,
+}
+
+
+def feed_in_chunks(parser: JsonStreamParser, text: str, rng: random.Random) -> list:
+    events = []
+    i = 0
+    while i < len(text):
+        size = rng.randint(1, 8)
+        events.extend(parser.feed(text[i:i + size]))
+        i += size
+    return events
+
+
+class JsonStreamParserTest(unittest.TestCase):
+    def test_round_trip_in_random_chunks(self):
+        rng = random.Random(0)
+        for indent in (None, 2):
+            text = "Here is the architecture:\n```json\n" + json.dumps(DOCUMENT, indent=indent) + "\n```\n{trailing"
+            for _ in range(100):
+                parser = JsonStreamParser(paths=[("file_structure", ANY), ("component_schema", 0, "weight"),
+                                                 ("count",)])
+                events = feed_in_chunks(parser, text, rng)
+                self.assertTrue(parser.done)
+                self.assertEqual(parser.result, DOCUMENT)
+                self.assertEqual(events, [(("file_structure", i), entry)
+                                          for i, entry in enumerate(DOCUMENT["file_structure"])]
+                                 + [(("component_schema", 0, "weight"), 1500.0), (("count",), -12)])
+
+    def test_values_are_reported_before_the_object_closes(self):
+        text = json.dumps(DOCUMENT)
+        parser = JsonStreamParser(paths=[("file_structure", ANY)])
+        first_entry = json.dumps(DOCUMENT["file_structure"][0])
+        first_entry_end = text.index(first_entry) + len(first_entry)
+        events = parser.feed(text[:first_entry_end])
+        self.assertEqual(events, [(("file_structure", 0), DOCUMENT["file_structure"][0])])
+        self.assertFalse(parser.done)
+
+    def test_unfinished_object(self):
+        parser = JsonStreamParser()
+        parser.feed('prefix {"a": [1, 2')
+        self.assertTrue(parser.started)
+        self.assertFalse(parser.done)
+        self.assertIsNone(parser.result)
+
+    def test_input_after_the_object_is_ignored(self):
+        parser = JsonStreamParser()
+        parser.feed('{"a": 1} {"b": 2}')
+        self.assertEqual(parser.result, {"a": 1})
+        self.assertEqual(parser.feed('{"c": 3}'), [])
+
+
+class ExtractJsonTest(unittest.TestCase):
+    def test_braces_inside_strings(self):
+        self.assertEqual(extract_json('Result: {"code": "if (x) { y(); }", "quote": "\\"}"} done'),
+                         {"code": "if (x) { y(); }", "quote": "\"}"})
+
+    def test_no_object(self):
+        self.assertIsNone(extract_json("no json here"))
+
+    def test_invalid_object_is_returned_raw(self):
+        self.assertEqual(extract_json("x {not: json} y"), "{not: json}")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import random
+import unittest
+
+from tools.patch_tools import (DIVIDER_MARKER, REPLACE_MARKER, SEARCH_MARKER, PatchError, apply_edit, apply_edits,
+                               parse_edits)
+from utils.diff_engine import iter_hunks
+
+
+def search_replace_block(search: str, replace: str) -> str:
+    return f"{SEARCH_MARKER}\n{search}{DIVIDER_MARKER}\n{replace}{REPLACE_MARKER}\n"
+
+
+def unified_diff(a: list[str], b: list[str]) -> str:
+    text = "```diff\n--- a/file.py\n+++ b/file.py\n"
+    for hunk in iter_hunks(a, b, context=2):
+        text += f"@@ -{hunk['old_start']},{hunk['old_lines']} +{hunk['new_start']},{hunk['new_lines']} @@\n"
+        text += "".join(line["op"] + line["text"] + "\n" for line in hunk["lines"])
+    return text + "```\n"
+
+
+class PatchToolsTest(unittest.TestCase):
+    def test_search_replace_round_trip(self):
+        rng = random.Random(0)
+        for _ in range(200):
+            lines = [f"statement_{i}()\n" for i in range(rng.randint(1, 30))]
+            original = "".join(lines)
+
+            # non-overlapping edits, described from top to bottom
+            expected = list(lines)
+            blocks = []
+            position = 0
+            for _ in range(rng.randint(1, 3)):
+                if position >= len(lines):
+                    break
+                start = rng.randint(position, len(lines) - 1)
+                end = rng.randint(start + 1, min(len(lines), start + 4))
+                replacement = [f"changed_{start}_{k}()\n" for k in range(rng.randint(0, 3))]
+                blocks.append((start, end, replacement))
+                position = end
+            for start, end, replacement in reversed(blocks):
+                expected[start:end] = replacement
+
+            response = "Here are the edits:\n" + "".join(
+                search_replace_block("".join(lines[start:end]), "".join(replacement))
+                for start, end, replacement in blocks)
+            edits = parse_edits(response)
+            self.assertEqual(len(edits), len(blocks))
+            self.assertEqual(apply_edits(original, edits), "".join(expected))
+
+    def test_unified_diff_round_trip(self):
+        rng = random.Random(1)
+        for _ in range(200):
+            a = [f"value = {i}" for i in range(rng.randint(1, 30))]
+            b = list(a)
+            for _ in range(rng.randint(1, 3)):
+                position = rng.randint(0, len(b) - 1) if b else 0
+                b[position:position + rng.randint(0, 2)] = [f"new = {rng.random()}"]
+            if a == b:
+                continue
+            edits = parse_edits(unified_diff(a, b))
+            self.assertTrue(edits)
+            self.assertEqual(apply_edits("\n".join(a) + "\n", edits), "\n".join(b) + "\n")
+
+    def test_whitespace_insensitive_match_keeps_indentation(self):
+        original = "class A:\n    def f(self):\n        return 1\n"
+        modified = apply_edit(original, "def f(self):\n    return 1\n", "def f(self):\n    return 2\n")
+        self.assertEqual(modified, "class A:\n    def f(self):\n        return 2\n")
+
+    def test_fuzzy_match(self):
+        original = "def total(items):\n    return sum(item.price for item in items)\n"
+        modified = apply_edit(original, "def total(items):\n    return sum(item.prices for item in items)\n",
+                              "def total(items):\n    return sum(item.cost for item in items)\n")
+        self.assertEqual(modified, "def total(items):\n    return sum(item.cost for item in items)\n")
+
+    def test_ambiguous_search_is_rejected(self):
+        with self.assertRaises(PatchError):
+            apply_edit("x = 1\ny = 2\nx = 1\n", "x = 1\n", "x = 3\n")
+        with self.assertRaises(PatchError):
+            apply_edit("if a:\n    pass\nif b:\n  pass\n", "pass\n", "return\n")
+
+    def test_missing_search_is_rejected(self):
+        with self.assertRaises(PatchError):
+            apply_edit("a = 1\n", "completely different text\n", "b = 2\n")
+
+    def test_empty_search_appends(self):
+        self.assertEqual(apply_edit("a = 1", "", "b = 2\n"), "a = 1\nb = 2\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
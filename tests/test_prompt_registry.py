@@ -0,0 +1,102 @@
+import os
+import tempfile
+import unittest
+
+from utils.prompt_registry import PromptRegistry, PromptTemplate, get_prompt_registry
+from utils.utils import load_prompt
+
+PROMPTS = """\
+prompts:
+  review:
+    final_instruction: Respond with the review only.
+    instruction: |
+      Review {{ path }} for {{goal}}.
+    example_output: '{"review": "1. Rename x."}'
+  empty: {}
+"""
+
+
+class PromptTemplateTest(unittest.TestCase):
+    def test_render(self):
+        template = PromptTemplate('Review {{ path }} for {{goal}}, e.g. {"review": "..."}.', name="review")
+        self.assertEqual(template.variables, {"path", "goal"})
+        self.assertEqual(template.render(path="app.py", goal="bugs", unused=1),
+                         'Review app.py for bugs, e.g. {"review": "..."}.')
+
+    def test_missing_variable(self):
+        with self.assertRaisesRegex(KeyError, "review.*missing goal"):
+            PromptTemplate("Review {{ path }} for {{ goal }}.", name="review").render(path="app.py")
+
+    def test_text_without_variables(self):
+        template = PromptTemplate("Write {code}.")
+        self.assertEqual(template.variables, frozenset())
+        self.assertEqual(template.render(), "Write {code}.")
+
+    def test_tokens_count_the_literal_text_once(self):
+        counted = []
+
+        def counter(text: str) -> int:
+            counted.append(text)
+            return len(text.split())
+
+        template = PromptTemplate("Review {{ path }} carefully.")
+        self.assertEqual(template.tokens(counter), 2)
+        self.assertEqual(template.tokens(counter), 2)
+        self.assertEqual(counted, ["Review  carefully."])
+
+
+class PromptRegistryTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "prompts.yaml")
+        self.mtime = 1_000_000
+        self.write(PROMPTS)
+        self.registry = PromptRegistry(self.path)
+
+    def write(self, content: str) -> None:
+        with open(self.path, "w") as f:
+            f.write(content)
+        # every write gets a new modification time, however coarse the file system's timestamps are
+        self.mtime += 1
+        os.utime(self.path, (self.mtime, self.mtime))
+
+    def test_fields_are_joined_in_order(self):
+        self.assertEqual(self.registry.get("review").text,
+                         "<instruction> Review {{ path }} for {{goal}}. </instruction> "
+                         "<example> {\"review\": \"1. Rename x.\"} </example> "
+                         "<final_instruction> Respond with the review only. </final_instruction>")
+        self.assertEqual(sorted(self.registry.names()), ["empty", "review"])
+
+    def test_missing_prompts_are_empty(self):
+        self.assertEqual(self.registry.get("empty").text, "")
+        self.assertEqual(self.registry.get("missing").text, "")
+
+    def test_render(self):
+        self.assertTrue(self.registry.render("review", path="app.py", goal="bugs")
+                        .startswith("<instruction> Review app.py for bugs. </instruction>"))
+
+    def test_compiled_once_until_the_file_changes(self):
+        template = self.registry.get("review")
+        self.assertIs(self.registry.get("review"), template)
+
+        self.write(PROMPTS.replace("Review", "Check"))
+        self.assertIsNot(self.registry.get("review"), template)
+        self.assertIn("Check {{ path }}", self.registry.get("review").text)
+
+    def test_token_counters_per_model(self):
+        self.registry.set_token_counter("words", lambda text: len(text.split()))
+        self.assertEqual(self.registry.tokens("review", "words"), 18)
+        self.assertEqual(self.registry.tokens("review"), self.registry.get("review").tokens())
+
+    def test_missing_file(self):
+        with self.assertRaises(FileNotFoundError):
+            PromptRegistry(self.path + ".missing").get("review")
+
+    def test_shared_registries(self):
+        self.assertIs(get_prompt_registry(self.path), get_prompt_registry(os.path.relpath(self.path)))
+        self.assertEqual(load_prompt(yaml_file=self.path, prompt_name="review"), self.registry.get("review").text)
+
+
+if __name__ == "__main__":
+    unittest.main()
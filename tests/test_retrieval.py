@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+
+from utils.retrieval import ContextIndex, build_context, tokenize
+
+
+def function(name: str, words: str, body_lines: int = 5) -> str:
+    return f"def {name}():\n    \"\"\"{words}\"\"\"\n" + "".join(f"    x_{i} = {i}\n" for i in range(body_lines)) + "\n"
+
+
+class TokenizeTest(unittest.TestCase):
+    def test_identifiers_are_split(self):
+        self.assertEqual(tokenize("readFile(read_file, 42)"),
+                         ["readfile", "read", "file", "read_file", "read", "file", "42"])
+
+    def test_acronyms(self):
+        self.assertEqual(tokenize("HTTPServer"), ["httpserver", "http", "server"])
+
+
+class ContextIndexTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.index = ContextIndex(chunk_lines=8)
+
+    def write(self, name: str, content: str, mtime: int = 1_000_000) -> str:
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as f:
+            f.write(content)
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_most_relevant_chunks_in_file_order(self):
+        path = self.write("module.py", function("parse", "Parses the config file.") +
+                          function("render", "Renders the html page.") +
+                          function("save", "Saves the config file to disk."))
+        results = self.index.search("load the config", [path], top_k=2)
+        self.assertEqual([result.chunk.name for result in results], ["parse", "save"])
+        self.assertTrue(all(result.path == path for result in results))
+
+    def test_searches_across_files(self):
+        first = self.write("first.py", function("parse", "Parses the config file."))
+        second = self.write("second.py", function("render", "Renders the html page."))
+        result, = self.index.search("html page", [first, second], top_k=1)
+        self.assertEqual((result.path, result.chunk.name), (second, "render"))
+
+    def test_token_budget(self):
+        path = self.write("module.py", function("parse", "config", 5) + function("load", "config", 5))
+        self.assertEqual(len(self.index.search("config", [path], token_budget=10_000)), 2)
+        self.assertEqual(len(self.index.search("config", [path], token_budget=40)), 1)
+
+    def test_missing_file(self):
+        self.assertEqual(self.index.search("config", [os.path.join(self.directory, "missing.py")]), [])
+
+    def test_reindexes_changed_files(self):
+        path = self.write("module.py", function("parse", "Parses the config file."))
+        self.assertEqual(self.index.search("config", [path])[0].chunk.name, "parse")
+        first = self.index.search("config", [path])[0]
+        # unchanged files aren't chunked again
+        self.assertIs(self.index.search("config", [path])[0], first)
+
+        self.write("module.py", function("load", "Loads the config file."), mtime=2_000_000)
+        self.assertEqual(self.index.search("config", [path])[0].chunk.name, "load")
+
+
+class BuildContextTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "module.py")
+        with open(self.path, "w") as f:
+            f.write("".join(function(f"helper_{i}", "Does nothing.", 10) for i in range(20)) +
+                    function("parse_config", "Parses the config file.", 10))
+
+    def test_small_files_are_included_whole(self):
+        with open(self.path) as f:
+            self.assertEqual(build_context([self.path], "config", token_budget=100_000), f"{self.path} {f.read()} ")
+
+    def test_large_files_are_reduced_to_relevant_chunks(self):
+        context = build_context([self.path], "parse config", token_budget=100, top_k=1)
+        self.assertIn("def parse_config", context)
+        self.assertNotIn("def helper_", context)
+        self.assertTrue(context.startswith(f"{self.path} (lines "))
+
+
+if __name__ == "__main__":
+    unittest.main()
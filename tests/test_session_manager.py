@@ -0,0 +1,143 @@
+import threading
+import unittest
+
+from workflows.session_manager import Session, SessionManager
+
+
+class FakeController:
+    def __init__(self):
+        self.exited = threading.Event()
+
+    def exit_workflow(self) -> None:
+        self.exited.set()
+
+
+class SessionManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.setups = []
+        self.release = threading.Event()
+
+    def manager(self, setup=None, **limits) -> SessionManager:
+        def default_setup(session: Session) -> None:
+            self.setups.append(session.session_id)
+            session.controller = FakeController()
+
+        # an idle timeout of 0 disables the background sweep; evict_idle then closes every idle session
+        manager = SessionManager(setup or default_setup, idle_timeout=0, **limits)
+        self.addCleanup(manager.shutdown)
+        # let blocked tasks finish before the pool is shut down
+        self.addCleanup(self.release.set)
+        return manager
+
+    def wait_for(self, manager: SessionManager, session_id: str) -> None:
+        """Waits until the tasks queued for a session so far have run."""
+        done = threading.Event()
+        self.assertTrue(manager.submit(session_id, done.set))
+        self.assertTrue(done.wait(2))
+
+    def test_setup_runs_before_the_first_task(self):
+        manager = self.manager()
+        session = manager.open("a")
+        ran = []
+        manager.submit("a", lambda: ran.append(session.controller is not None))
+        self.wait_for(manager, "a")
+        self.assertEqual(self.setups, ["a"])
+        self.assertEqual(ran, [True])
+        self.assertIs(manager.open("a"), session)
+        self.assertEqual(self.setups, ["a"])
+
+    def test_tasks_of_a_session_run_in_order(self):
+        manager = self.manager(max_pending=10)
+        manager.open("a")
+        order = []
+        for i in range(5):
+            self.assertTrue(manager.submit("a", order.append, i))
+        self.wait_for(manager, "a")
+        self.assertEqual(order, [0, 1, 2, 3, 4])
+
+    def test_sessions_run_concurrently(self):
+        barrier = threading.Barrier(2, timeout=2)
+        passed = []
+        manager = self.manager(max_workers=2)
+        for session_id in ("a", "b"):
+            manager.open(session_id)
+            manager.submit(session_id, lambda: passed.append(barrier.wait() is not None))
+        self.wait_for(manager, "a")
+        self.wait_for(manager, "b")
+        self.assertEqual(passed, [True, True])
+
+    def test_busy_session_rejects_work(self):
+        manager = self.manager(max_pending=2)
+        manager.open("a")
+        self.wait_for(manager, "a")
+        done = threading.Event()
+        self.assertTrue(manager.submit("a", self.release.wait, 2))
+        self.assertTrue(manager.submit("a", done.set))
+        self.assertFalse(manager.submit("a", lambda: None))
+        self.release.set()
+        self.assertTrue(done.wait(2))
+
+    def test_full_pool_rejects_work(self):
+        manager = self.manager(max_workers=1, max_queued=1, max_pending=5)
+        manager.open("a")
+        manager.open("b")
+        self.wait_for(manager, "a")
+        self.wait_for(manager, "b")
+        done = threading.Event()
+        self.assertTrue(manager.submit("a", self.release.wait, 2))
+        self.assertTrue(manager.submit("b", done.set))
+        self.assertFalse(manager.submit("b", lambda: None))
+        self.release.set()
+        self.assertTrue(done.wait(2))
+
+    def test_session_limit(self):
+        manager = self.manager(max_sessions=1)
+        self.assertIsNotNone(manager.open("a"))
+        self.assertIsNone(manager.open("b"))
+        self.assertEqual(manager.session_count, 1)
+
+    def test_unknown_session(self):
+        self.assertFalse(self.manager().submit("missing", lambda: None))
+
+    def test_failed_setup_closes_the_session(self):
+        def setup(session: Session) -> None:
+            raise RuntimeError("no model")
+
+        manager = self.manager(setup=setup)
+        manager.open("a")
+        manager.submit("a", lambda: None)
+        manager.shutdown()
+        self.assertIsNone(manager.get("a"))
+        self.assertFalse(manager.submit("a", lambda: None))
+
+    def test_close_finishes_queued_work_first(self):
+        manager = self.manager()
+        session = manager.open("a")
+        self.wait_for(manager, "a")
+        finished = []
+        manager.submit("a", lambda: finished.append(self.release.wait(2)))
+        manager.close("a")
+        self.assertIsNone(manager.get("a"))
+        self.assertFalse(session.controller.exited.is_set())
+
+        self.release.set()
+        self.assertTrue(session.controller.exited.wait(2))
+        self.assertEqual(finished, [True])
+
+    def test_evict_idle(self):
+        manager = self.manager()
+        idle = manager.open("idle")
+        busy = manager.open("busy")
+        self.wait_for(manager, "idle")
+        self.wait_for(manager, "busy")
+        manager.submit("busy", self.release.wait, 2)
+
+        self.assertEqual(manager.evict_idle(), ["idle"])
+        self.assertTrue(idle.controller.exited.is_set())
+        self.assertIs(manager.get("busy"), busy)
+        # an evicted client gets a new session when it comes back
+        self.assertIsNot(manager.open("idle"), idle)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import stat
+import tempfile
+import unittest
+from unittest import mock
+
+from tools import file_tools
+from tools.file_tools import file_history, read_file, restore_file, write_file
+from utils.snapshot_store import SnapshotStore, atomic_write
+
+
+class SnapshotStoreTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.store = SnapshotStore(os.path.join(self.directory, ".snapshots"))
+        self.path = os.path.join(self.directory, "module.py")
+
+    def write(self, data: bytes) -> None:
+        with open(self.path, "wb") as f:
+            f.write(data)
+
+    def read(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def objects(self) -> list[str]:
+        return [name for _, _, names in os.walk(os.path.join(self.directory, ".snapshots", "objects"))
+                for name in names]
+
+    def test_atomic_write_keeps_permissions(self):
+        self.write(b"old")
+        os.chmod(self.path, 0o750)
+        atomic_write(self.path, b"new")
+        self.assertEqual(self.read(), b"new")
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o750)
+        self.assertEqual(os.listdir(self.directory), ["module.py"])
+
+    def test_contents_are_stored_once(self):
+        digest = self.store.store(b"x = 1\n")
+        self.assertEqual(self.store.store(b"x = 1\n"), digest)
+        self.assertEqual(self.store.load(digest), b"x = 1\n")
+        self.assertEqual(len(self.objects()), 1)
+        with self.assertRaises(FileNotFoundError):
+            self.store.load("0" * 64)
+
+    def test_history_is_newest_first_without_repeats(self):
+        self.assertIsNone(self.store.snapshot(self.path))
+        self.write(b"v1")
+        first = self.store.snapshot(self.path)
+        self.store.snapshot(self.path)
+        self.write(b"v2")
+        second = self.store.snapshot(self.path)
+        # going back to an earlier version adds to the history but not to the stored objects
+        self.write(b"v1")
+        self.store.snapshot(self.path)
+
+        self.assertEqual([entry["digest"] for entry in self.store.history(self.path)], [first, second, first])
+        self.assertEqual(self.store.history(self.path)[1]["size"], 2)
+        self.assertEqual(len(self.objects()), 2)
+
+    def test_restore(self):
+        self.write(b"v1")
+        first = self.store.snapshot(self.path)
+        self.write(b"v2")
+        self.store.snapshot(self.path)
+        self.write(b"v3")
+
+        self.assertTrue(self.store.restore(self.path, first[:8]))
+        self.assertEqual(self.read(), b"v1")
+        # the version that was replaced can be restored in turn
+        self.assertTrue(self.store.restore(self.path, 0))
+        self.assertEqual(self.read(), b"v3")
+
+        self.assertFalse(self.store.restore(self.path, 10))
+        self.assertFalse(self.store.restore(self.path, "f" * 8))
+
+
+class WriteFileTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        patcher = mock.patch.object(file_tools, "snapshot_store",
+                                    SnapshotStore(os.path.join(self.directory, ".snapshots")))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_writes_can_be_undone(self):
+        path = os.path.join(self.directory, "package", "module.py")
+        self.assertEqual(write_file(path, "x = 1\n"), "Successfully wrote file.")
+        self.assertEqual(file_history(path), [])
+        write_file(path, "x = 2\n")
+        self.assertEqual(read_file(path), "x = 2\n")
+        self.assertEqual(len(file_history(path)), 1)
+
+        self.assertEqual(restore_file(path), "Successfully restored file.")
+        self.assertEqual(read_file(path), "x = 1\n")
+        self.assertTrue(restore_file(path, 5).startswith("No version 5"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from workflows import workflow_controller
+from workflows.step_cache import StepCache
+from workflows.workflow_compiler import WorkflowRegistry
+from workflows.workflow_controller import WorkflowController
+
+WORKFLOW = {
+    "workflow_id": "edit",
+    "name": "Edit",
+    "description": "Reads a file and has an agent rewrite it.",
+    "steps": [
+        {"id": 1, "type": "user_input", "description": "Instructions", "input": {"prompt": "Instructions?"},
+         "output": ["filepath", "context_files", "user_input"], "next_step": 2},
+        {"id": 2, "type": "system_action", "agent": "file_read", "description": "Read the file",
+         "input": ["filepath", "context_files"], "output": ["code_to_modify", "context"], "next_step": 3},
+        {"id": 3, "type": "agent_action", "agent": "code_agent", "description": "Rewrite the file",
+         "input": ["code_to_modify", "user_input"], "output": ["modified_code"], "next_step": None},
+    ]
+}
+
+
+class UpperAgent:
+    def __init__(self):
+        self.fingerprint = "UpperAgent:model-a"
+        self.calls = 0
+
+    def run_agent(self, agent_input: dict) -> dict:
+        self.calls += 1
+        return {"modified_code": agent_input["code_to_modify"].upper()}
+
+
+class StepCacheTest(unittest.TestCase):
+    def test_get_and_put(self):
+        cache = StepCache()
+        self.assertIsNone(cache.get("flow", "key"))
+        cache.put("flow", "key", {"code": "x"})
+        self.assertEqual(cache.get("flow", "key"), {"code": "x"})
+        self.assertIsNone(cache.get("other", "key"))
+
+    def test_least_recently_used_entries_are_dropped(self):
+        cache = StepCache(max_entries=2)
+        cache.put("flow", "a", {})
+        cache.put("flow", "b", {})
+        cache.get("flow", "a")
+        cache.put("flow", "c", {})
+        self.assertIsNone(cache.get("flow", "b"))
+        self.assertIsNotNone(cache.get("flow", "a"))
+        self.assertIsNotNone(cache.get("flow", "c"))
+
+    def test_evict(self):
+        cache = StepCache()
+        cache.put("flow", "key", {})
+        cache.put("other", "key", {})
+        cache.evict("flow")
+        self.assertIsNone(cache.get("flow", "key"))
+        self.assertIsNotNone(cache.get("other", "key"))
+
+    def test_key_covers_step_inputs_files_and_agent(self):
+        step = {"id": 1, "type": "agent_action"}
+        key = StepCache.make_key(step, {"code": "x"}, {"a.py": (1.0, 10)}, agent="model-a")
+        self.assertEqual(key, StepCache.make_key(dict(step), {"code": "x"}, {"a.py": (1.0, 10)}, agent="model-a"))
+        self.assertNotEqual(key, StepCache.make_key({**step, "id": 2}, {"code": "x"}, {"a.py": (1.0, 10)},
+                                                    agent="model-a"))
+        self.assertNotEqual(key, StepCache.make_key(step, {"code": "y"}, {"a.py": (1.0, 10)}, agent="model-a"))
+        self.assertNotEqual(key, StepCache.make_key(step, {"code": "x"}, {"a.py": (2.0, 10)}, agent="model-a"))
+        self.assertNotEqual(key, StepCache.make_key(step, {"code": "x"}, {"a.py": (1.0, 10)}, agent="model-b"))
+
+
+class CachedStepsTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        workflows_dir = os.path.join(directory.name, "workflows")
+        os.makedirs(workflows_dir)
+        with open(os.path.join(workflows_dir, "edit.json"), "w") as f:
+            json.dump(WORKFLOW, f)
+        registry = mock.patch.object(workflow_controller, "workflow_registry", WorkflowRegistry(workflows_dir))
+        registry.start()
+        self.addCleanup(registry.stop)
+
+        read_file = mock.patch.object(workflow_controller, "read_file", wraps=workflow_controller.read_file)
+        self.read_file = read_file.start()
+        self.addCleanup(read_file.stop)
+
+        self.path = os.path.join(directory.name, "module.py")
+        self.mtime = 1_000_000
+        self.write("x = 1\n")
+
+        self.agent = UpperAgent()
+        self.controller = WorkflowController(lambda prompt: None, checkpoint_dir=None)
+        self.controller.set_agent(self.agent)
+        self.controller.load_workflow("edit")
+
+    def write(self, content: str) -> None:
+        with open(self.path, "w") as f:
+            f.write(content)
+        self.mtime += 1
+        os.utime(self.path, (self.mtime, self.mtime))
+
+    def run_workflow(self, instructions: str = "shout") -> dict:
+        self.read_file.reset_mock()
+        self.agent.calls = 0
+        self.controller.set_user_input({"filepath": self.path, "context_files": [], "user_input": instructions})
+        return self.controller._state
+
+    def test_unchanged_steps_are_not_run_again(self):
+        self.assertEqual(self.run_workflow()["modified_code"], "X = 1\n")
+        self.assertEqual((self.read_file.call_count, self.agent.calls), (1, 1))
+        self.assertEqual(self.run_workflow()["modified_code"], "X = 1\n")
+        self.assertEqual((self.read_file.call_count, self.agent.calls), (0, 0))
+
+    def test_changed_file_invalidates_the_read(self):
+        self.run_workflow()
+        self.write("y = 2\n")
+        self.assertEqual(self.run_workflow()["modified_code"], "Y = 2\n")
+        self.assertEqual((self.read_file.call_count, self.agent.calls), (1, 1))
+
+    def test_changed_agent_fingerprint_invalidates_the_agent_step(self):
+        self.run_workflow()
+        self.agent.fingerprint = "UpperAgent:model-b"
+        self.run_workflow()
+        self.assertEqual((self.read_file.call_count, self.agent.calls), (0, 1))
+
+    def test_changed_instructions_invalidate_the_steps(self):
+        self.run_workflow()
+        self.run_workflow("whisper")
+        # the read depends on the instructions too, which rank the chunks of the context files
+        self.assertEqual((self.read_file.call_count, self.agent.calls), (1, 1))
+
+    def test_exit_evicts_the_workflow_cache(self):
+        self.run_workflow()
+        self.controller.exit_workflow()
+        self.controller.load_workflow("edit")
+        self.run_workflow()
+        self.assertEqual((self.read_file.call_count, self.agent.calls), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from utils import symbol_index
+from utils.symbol_index import SymbolIndex, parse_symbols
+
+MODELS = '''\
+class Task:
+    def done(self) -> bool:
+        return False
+
+
+def load_tasks(path: str) -> list[Task]:
+    return []
+'''
+
+SERVICE = '''\
+from models import Task, load_tasks
+
+
+def pending(path: str) -> list[Task]:
+    return [task for task in load_tasks(path) if not task.done()]
+'''
+
+
+class ParseSymbolsTest(unittest.TestCase):
+    def test_definitions_imports_and_references(self):
+        symbols = parse_symbols(MODELS + "\n\n" + SERVICE)
+        self.assertEqual([(d["qualname"], d["kind"], d["signature"]) for d in symbols["definitions"]], [
+            ("Task", "class", "class Task"),
+            ("Task.done", "function", "def done(self) -> bool"),
+            ("load_tasks", "function", "def load_tasks(path: str) -> list[Task]"),
+            ("pending", "function", "def pending(path: str) -> list[Task]"),
+        ])
+        self.assertEqual(symbols["imports"], [{"module": "models", "name": "Task", "alias": "Task"},
+                                              {"module": "models", "name": "load_tasks", "alias": "load_tasks"}])
+        self.assertEqual(symbols["references"], ["Task", "bool", "done", "list", "load_tasks", "str"])
+
+    def test_decorated_definitions_start_at_the_decorator(self):
+        definition, = parse_symbols("@cache\ndef f():\n    pass\n")["definitions"]
+        self.assertEqual((definition["lineno"], definition["end_lineno"]), (1, 3))
+
+    def test_invalid_source(self):
+        self.assertEqual(parse_symbols("def (:"), {"definitions": [], "imports": [], "references": []})
+
+
+class SymbolIndexTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        self.mtime = 1_000_000
+        self.write("models.py", MODELS)
+        self.write("service.py", SERVICE)
+
+    def write(self, name: str, content: str) -> str:
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+        # every write gets a new modification time, however coarse the file system's timestamps are
+        self.mtime += 1
+        os.utime(path, (self.mtime, self.mtime))
+        return path
+
+    def test_refresh_is_incremental(self):
+        index = SymbolIndex(self.root)
+        self.assertEqual(index.refresh(), 2)
+        self.assertEqual(index.refresh(), 0)
+
+        # a new modification time with the same content is re-read but not re-parsed
+        self.write("models.py", MODELS)
+        self.assertEqual(index.refresh(), 0)
+
+        self.write("models.py", MODELS + "\n\ndef save_tasks(path: str) -> None:\n    pass\n")
+        self.assertEqual(index.refresh(), 1)
+        self.assertEqual(len(index.find_definitions("save_tasks")), 1)
+
+        os.remove(os.path.join(self.root, "models.py"))
+        self.assertEqual(index.refresh(), 0)
+        self.assertEqual(index.find_definitions("Task"), [])
+
+    def test_skips_hidden_and_excluded_directories(self):
+        self.write(".hidden/secret.py", "def secret():\n    pass\n")
+        self.write("__pycache__/cached.py", "def cached():\n    pass\n")
+        index = SymbolIndex(self.root)
+        index.refresh()
+        self.assertEqual(index.find_definitions("secret"), [])
+        self.assertEqual(index.find_definitions("cached"), [])
+
+    def test_index_is_persisted(self):
+        SymbolIndex(self.root).refresh()
+        index = SymbolIndex(self.root)
+        self.assertEqual(len(index.find_definitions("load_tasks")), 1)
+        self.assertEqual(index.refresh(), 0)
+
+    def test_parallel_refresh(self):
+        for i in range(4):
+            self.write(f"module_{i}.py", f"def function_{i}():\n    pass\n")
+        index = SymbolIndex(self.root)
+        with mock.patch.object(symbol_index, "PARALLEL_THRESHOLD", 2):
+            self.assertEqual(index.refresh(), 6)
+        self.assertEqual([path for path, _ in index.find_definitions("function_3")],
+                         [os.path.join(self.root, "module_3.py")])
+
+    def test_refresh_if_stale(self):
+        index = SymbolIndex(self.root, refresh_interval=60)
+        self.assertEqual(index.refresh_if_stale(), 2)
+        self.write("other.py", "def other():\n    pass\n")
+        self.assertEqual(index.refresh_if_stale(), 0)
+        self.assertEqual(index.refresh(), 1)
+
+    def test_resolve_references(self):
+        index = SymbolIndex(self.root)
+        index.refresh()
+        service = os.path.join(self.root, "service.py")
+        resolved = index.resolve_references(SERVICE, exclude_path=service)
+        self.assertEqual([(os.path.basename(path), definition["qualname"]) for path, definition in resolved],
+                         [("models.py", "Task"), ("models.py", "load_tasks")])
+
+        # the file's own definitions are left out
+        self.assertEqual(index.resolve_references("pending('tasks.json')", exclude_path=service), [])
+        self.assertEqual(len(index.resolve_references("pending('tasks.json')")), 1)
+
+    def test_ambiguous_references_are_not_resolved(self):
+        self.write("other.py", "def load_tasks():\n    pass\n")
+        index = SymbolIndex(self.root)
+        index.refresh()
+        self.assertEqual(index.resolve_references("load_tasks()"), [])
+
+    def test_context_for(self):
+        index = SymbolIndex(self.root)
+        context = index.context_for(SERVICE, exclude_path=os.path.join(self.root, "service.py"))
+        self.assertIn("models.py (lines 1-3) class Task:", context)
+        self.assertIn("def load_tasks(path: str) -> list[Task]:\n    return []", context)
+
+        # definitions that don't fit the budget are reduced to their signature
+        context = index.context_for(SERVICE, exclude_path=os.path.join(self.root, "service.py"), token_budget=15)
+        self.assertIn("models.py: class Task", context)
+        self.assertNotIn("return False", context)
+
+
+if __name__ == "__main__":
+    unittest.main()
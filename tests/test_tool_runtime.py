@@ -0,0 +1,106 @@
+import threading
+import time
+import unittest
+
+from tools.tool_runtime import TRUNCATED_MARKER, Tool, ToolError, ToolRegistry, ToolRuntime
+
+_TEXT = {"type": "object", "properties": {"text": {"type": "string"}}, "required": ["text"]}
+
+
+class ToolRuntimeTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = ToolRegistry()
+        self.runtime = ToolRuntime(self.registry, max_workers=4)
+        self.release = threading.Event()
+        self.addCleanup(self.runtime.shutdown)
+        # unblock tools that are still running when a test gives up on them
+        self.addCleanup(self.release.set)
+
+    def register(self, name: str, func, **limits) -> Tool:
+        return self.registry.register(Tool(name=name, func=func, description=name, input_schema=_TEXT, **limits))
+
+    def test_call_returns_the_output(self):
+        self.register("echo", lambda text: text)
+        self.assertEqual(self.runtime.call("echo", {"text": "hello"}), "hello")
+
+    def test_input_is_validated(self):
+        self.register("echo", lambda text: text)
+        with self.assertRaisesRegex(ToolError, "Missing input"):
+            self.runtime.call("echo", {})
+        with self.assertRaisesRegex(ToolError, "must be of type string"):
+            self.runtime.call("echo", {"text": 1})
+        with self.assertRaisesRegex(ToolError, "Unexpected input"):
+            self.runtime.call("echo", {"text": "a", "other": "b"})
+        with self.assertRaisesRegex(ToolError, "Unknown tool"):
+            self.runtime.call("missing", {"text": "a"})
+
+    def test_arguments_are_renamed(self):
+        self.register("echo", lambda message: message, arguments={"text": "message"})
+        self.assertEqual(self.runtime.call("echo", {"text": "hello"}), "hello")
+
+    def test_output_is_capped(self):
+        self.register("echo", lambda text: text * 100, max_output=10)
+        self.assertEqual(self.runtime.call("echo", {"text": "ab"}), "ab" * 5 + TRUNCATED_MARKER)
+
+    def test_timeout(self):
+        self.register("slow", lambda text: self.release.wait(5) and text, timeout=0.1)
+        start = time.monotonic()
+        with self.assertRaisesRegex(ToolError, "timed out"):
+            self.runtime.call("slow", {"text": "a"})
+        self.assertLess(time.monotonic() - start, 2)
+
+    def test_failure_is_reported(self):
+        def fail(text):
+            raise ValueError(text)
+
+        self.register("fail", fail)
+        with self.assertRaisesRegex(ToolError, "fail failed: ValueError: boom"):
+            self.runtime.call("fail", {"text": "boom"})
+        self.assertEqual(self.runtime.call_safely("fail", {"text": "boom"}), "Error: fail failed: ValueError: boom")
+
+    def test_call_many_runs_in_parallel_and_keeps_the_order(self):
+        barrier = threading.Barrier(3, timeout=2)
+
+        def wait_for_others(text):
+            barrier.wait()
+            return text
+
+        self.register("wait", wait_for_others)
+        self.register("echo", lambda text: text)
+        results = self.runtime.call_many([("wait", {"text": "a"}), ("wait", {"text": "b"}),
+                                          ("echo", {"text": "c"}), ("wait", {"text": "d"})])
+        self.assertEqual(results, ["a", "b", "c", "d"])
+
+    def test_call_many_reports_failures_in_place(self):
+        self.register("echo", lambda text: text)
+        self.register("slow", lambda text: self.release.wait(5) and text, timeout=0.1)
+        results = self.runtime.call_many([("echo", {"text": "a"}), ("missing", {"text": "b"}),
+                                          ("slow", {"text": "c"}), ("echo", {"text": "d"})])
+        self.assertEqual(results[0], "a")
+        self.assertTrue(results[1].startswith("Error: Unknown tool"))
+        self.assertTrue(results[2].startswith("Error: slow timed out"))
+        self.assertEqual(results[3], "d")
+
+    def test_concurrency_limit(self):
+        running = 0
+        most_running = 0
+        lock = threading.Lock()
+
+        def count(text):
+            nonlocal running, most_running
+            with lock:
+                running += 1
+                most_running = max(most_running, running)
+            time.sleep(0.02)
+            with lock:
+                running -= 1
+            return text
+
+        self.register("serial", count, max_concurrency=1)
+        results = self.runtime.call_many([("serial", {"text": str(i)}) for i in range(4)])
+        self.assertEqual(results, ["0", "1", "2", "3"])
+        self.assertEqual(most_running, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from utils import tracing
+from utils.tracing import Tracer, critical_path, record_usage, trace_model_call
+
+
+class FakeModel:
+    model_name = "fake"
+
+    def __init__(self, usage: list[tuple[int, int]] | None = None):
+        self.usage = usage or []
+
+    @trace_model_call
+    def send_message(self, contents: str) -> str:
+        for prompt_tokens, completion_tokens in self.usage:
+            record_usage(prompt_tokens, completion_tokens)
+        return "x" * 40
+
+    @trace_model_call
+    def send_structured_message(self, contents: str, schema: dict) -> str:
+        return self.send_message(contents)
+
+
+def event(span_id: int, parent_id: int | None, ts: int, dur: int, name: str = "") -> dict:
+    return {"name": name or f"span {span_id}", "cat": "step", "ts": ts, "dur": dur,
+            "args": {"span_id": span_id, "parent_id": parent_id}}
+
+
+class TracerTest(unittest.TestCase):
+    def setUp(self):
+        self.tracer = Tracer()
+        self.tracer.enable()
+
+    def test_disabled_tracer_records_nothing(self):
+        tracer = Tracer()
+        with tracer.span("workflow", "workflow") as span:
+            self.assertIsNone(span)
+            self.assertIsNone(tracer.current())
+            tracer.annotate(cache_hit=True)
+        self.assertEqual(tracer.events(), [])
+
+    def test_spans_nest_on_a_thread(self):
+        with self.tracer.span("workflow", "workflow") as workflow:
+            with self.tracer.span("step 1", "step", type="agent_action") as step:
+                self.assertEqual(self.tracer.current(), step.span_id)
+                self.tracer.annotate(cache_hit=True)
+        self.assertIsNone(self.tracer.current())
+
+        step_event, workflow_event = self.tracer.events()
+        self.assertEqual(step_event["args"], {"type": "agent_action", "cache_hit": True,
+                                              "span_id": step.span_id, "parent_id": workflow.span_id})
+        self.assertIsNone(workflow_event["args"]["parent_id"])
+        self.assertEqual((step_event["ph"], step_event["cat"]), ("X", "step"))
+        self.assertGreaterEqual(workflow_event["dur"], step_event["dur"])
+
+    def test_work_on_other_threads_nests_under_the_given_parent(self):
+        with self.tracer.span("loop", "step") as loop:
+            def run_item():
+                with self.tracer.span("item", "step", parent=loop.span_id):
+                    pass
+
+            thread = threading.Thread(target=run_item)
+            thread.start()
+            thread.join()
+        item_event = next(e for e in self.tracer.events() if e["name"] == "item")
+        self.assertEqual(item_event["args"]["parent_id"], loop.span_id)
+        self.assertNotEqual(item_event["tid"], threading.get_ident())
+
+    def test_oldest_spans_are_dropped(self):
+        tracer = Tracer(max_spans=2)
+        tracer.enable()
+        for name in ("a", "b", "c"):
+            with tracer.span(name, "step"):
+                pass
+        self.assertEqual([e["name"] for e in tracer.events()], ["b", "c"])
+
+    def test_export(self):
+        with self.tracer.span("workflow", "workflow"):
+            pass
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace.json")
+            self.tracer.export(path)
+            with open(path) as f:
+                trace = json.load(f)
+        self.assertEqual([e["name"] for e in trace["traceEvents"]], ["workflow"])
+
+
+class ModelCallTest(unittest.TestCase):
+    def setUp(self):
+        self.tracer = Tracer()
+        self.tracer.enable()
+        patcher = mock.patch.object(tracing, "tracer", self.tracer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_estimated_tokens(self):
+        FakeModel().send_message("y" * 80)
+        model_event, = self.tracer.events()
+        self.assertEqual(model_event["name"], "fake.send_message")
+        self.assertEqual(model_event["args"]["prompt_tokens"], 21)
+        self.assertEqual(model_event["args"]["completion_tokens"], 11)
+        self.assertTrue(model_event["args"]["estimated_tokens"])
+
+    def test_reported_usage_replaces_estimates_and_adds_up(self):
+        FakeModel(usage=[(100, 10), (120, 5)]).send_message("prompt")
+        model_event, = self.tracer.events()
+        self.assertEqual((model_event["args"]["prompt_tokens"], model_event["args"]["completion_tokens"]), (220, 15))
+        self.assertFalse(model_event["args"]["estimated_tokens"])
+
+    def test_nested_sends_are_recorded_once(self):
+        with self.tracer.span("agent", "agent"):
+            FakeModel(usage=[(50, 5)]).send_structured_message("prompt", {})
+        model_event, agent_event = self.tracer.events()
+        self.assertEqual(model_event["name"], "fake.send_structured_message")
+        self.assertEqual(model_event["args"]["parent_id"], agent_event["args"]["span_id"])
+        self.assertEqual(model_event["args"]["prompt_tokens"], 50)
+
+    def test_usage_outside_a_model_call_is_ignored(self):
+        with self.tracer.span("step", "step"):
+            record_usage(10, 10)
+        self.assertNotIn("prompt_tokens", self.tracer.events()[0]["args"])
+
+
+class CriticalPathTest(unittest.TestCase):
+    def test_follows_the_child_that_ended_last(self):
+        events = [
+            event(1, None, 0, 100),
+            event(2, 1, 0, 60),
+            event(3, 1, 10, 85),
+            event(4, 3, 10, 30),
+            event(5, 3, 20, 70),
+            event(6, None, 200, 10),
+        ]
+        self.assertEqual([e["args"]["span_id"] for e in critical_path(events)], [1, 3, 5])
+
+    def test_empty_trace(self):
+        self.assertEqual(critical_path([]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+import json
+import os
+import tempfile
+import unittest
+
+from workflows.workflow_compiler import WorkflowRegistry, compile_workflow
+
+WORKFLOWS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "workflows")
+
+
+def step(step_id, step_type="system_action", **fields) -> dict:
+    fields.setdefault("description", f"step {step_id}")
+    if step_type in ("agent_action", "system_action"):
+        fields.setdefault("agent", "file_read")
+    fields.setdefault("next_step", None)
+    return {"id": step_id, "type": step_type, **fields}
+
+
+class CompileWorkflowTest(unittest.TestCase):
+    def test_shipped_workflows_compile(self):
+        registry = WorkflowRegistry(WORKFLOWS_DIR)
+        for name in sorted(os.listdir(WORKFLOWS_DIR)):
+            if name.endswith(".json"):
+                compiled = registry.get(name[:-len(".json")])
+                self.assertEqual(compiled.errors, [], name)
+
+    def test_write_step_reads_the_modified_code(self):
+        compiled = WorkflowRegistry(WORKFLOWS_DIR).get("write_code")
+        write_step = next(s for s in compiled.steps_by_id.values() if s.get("agent") == "file_write")
+        self.assertIn("modified_code", write_step["input"])
+
+    def test_valid_workflow(self):
+        compiled = compile_workflow("ok", {"steps": [
+            step(1, output=["code"], next_step=2),
+            step(2, input=["code"]),
+        ]})
+        self.assertTrue(compiled.valid)
+        self.assertEqual(compiled.warnings, [])
+        self.assertEqual(compiled.first_step["id"], 1)
+        self.assertEqual(compiled.get_step(2)["input"], ["code"])
+
+    def test_no_steps(self):
+        self.assertEqual(compile_workflow("empty", {"steps": []}).errors, ["Workflow has no steps."])
+        self.assertFalse(compile_workflow("missing", {}).valid)
+
+    def test_link_to_missing_step(self):
+        compiled = compile_workflow("bad_link", {"steps": [
+            step(1, next_step={"on_success": 2, "on_failure": 5}),
+            step(2),
+        ]})
+        self.assertEqual(compiled.errors, ["Step 1 links to missing step 5."])
+
+    def test_input_no_step_produces(self):
+        compiled = compile_workflow("missing_input", {"steps": [
+            step(1, output=["code"], next_step=2),
+            step(2, input=["code", "context"]),
+        ]})
+        self.assertEqual(compiled.errors, ["Step 2 reads 'context' which no step produces."])
+
+    def test_loop_variable_is_an_input(self):
+        compiled = compile_workflow("loop", {"steps": [
+            step(1, output=["files"], next_step=2),
+            step(2, "loop", loop_over="files.filepath", **{"sub-steps": [step(3, input=["filepath"])]}),
+        ]})
+        self.assertEqual(compiled.errors, [])
+        self.assertEqual(compiled.parent_by_id, {3: 2})
+
+    def test_invalid_steps(self):
+        compiled = compile_workflow("invalid", {"steps": [
+            step(1, next_step=2),
+            step(1, next_step=3),
+            step(2, "unknown", next_step=3),
+            step(3, "loop", loop_over="files", next_step=4),
+            step(4, "agent_action", agent=""),
+        ]})
+        self.assertEqual(compiled.errors, [
+            "Duplicate step id 1.",
+            "Step 2 has unknown type 'unknown'.",
+            "Loop step 3 has no sub-steps.",
+            "Loop step 3 needs 'loop_over' in the form 'list.item'.",
+            "Step 4 has no agent.",
+        ])
+
+    def test_parallel_loop_cant_wait_for_the_user(self):
+        compiled = compile_workflow("parallel", {"steps": [
+            step(1, output=["files"], next_step=2),
+            step(2, "loop", loop_over="files.filepath", mode="parallel", max_concurrency=0,
+                 **{"sub-steps": [step(3, "user_input")]}),
+        ]})
+        self.assertEqual(compiled.errors, ["Parallel loop step 2 can't contain user_input steps.",
+                                           "Loop step 2 needs a positive integer max_concurrency."])
+
+    def test_warnings(self):
+        first = step(1)
+        del first["next_step"]
+        compiled = compile_workflow("warnings", {"steps": [first, step(2)]})
+        self.assertTrue(compiled.valid)
+        self.assertEqual(compiled.warnings, [
+            "Step 1 has no next_step; use \"next_step\": null to end the workflow there.",
+            "Step 2 can never be reached.",
+        ])
+
+
+class WorkflowRegistryTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.registry = WorkflowRegistry(self.directory)
+
+    def write(self, name: str, content: str) -> None:
+        path = os.path.join(self.directory, f"{name}.json")
+        with open(path, "w") as f:
+            f.write(content)
+        # make sure the change is visible even on file systems with coarse timestamps
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def test_missing_workflow(self):
+        self.assertIsNone(self.registry.get("missing"))
+
+    def test_recompiles_only_on_change(self):
+        self.write("flow", json.dumps({"steps": [step(1)]}))
+        compiled = self.registry.get("flow")
+        self.assertTrue(compiled.valid)
+        self.assertIs(self.registry.get("flow"), compiled)
+
+        self.write("flow", json.dumps({"steps": [step(1, next_step=9)]}))
+        recompiled = self.registry.get("flow")
+        self.assertIsNot(recompiled, compiled)
+        self.assertEqual(recompiled.errors, ["Step 1 links to missing step 9."])
+
+    def test_invalid_json(self):
+        self.write("broken", "{")
+        compiled = self.registry.get("broken")
+        self.assertFalse(compiled.valid)
+        self.assertTrue(compiled.errors[0].startswith("Invalid JSON"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,32 +1,39 @@
 import os
 import shutil
-from difflib import HtmlDiff, unified_diff
+import tempfile
+from difflib import unified_diff
+
+from utils.diff_engine import iter_html, iter_hunks
+from utils.file_cache import file_cache
+from utils.file_utils import iter_directory_files
+from utils.snapshot_store import atomic_write, snapshot_store
 
 
 def read_file(filename: str) -> str:
     """
-    Reads the contents of a file.
+    Reads the contents of a file.  The encoding is detected from the file's bytes, and the contents are
+    cached until the file changes.
 
     :param filename: The path to the file.
-    :return: The contents of the file, or an error message if the file cannot be opened.
+    :return: The contents of the file, or an empty string if the file cannot be read.
     """
-    if not os.path.exists(filename):
-        return ""
-
-    encodings = ['utf-8', 'latin-1', 'ascii', 'utf-16', 'windows-1252']
+    return file_cache.read(filename) or ""
 
-    for enc in encodings:
-        try:
-            with open(filename, 'r', encoding=enc) as file:
-                content = file.read()
-            print(f"Successfully read with {enc} encoding")
-            return content
-        except UnicodeDecodeError:
-            print(f"Failed to read with {enc} encoding")
+def _process_content(content: str) -> str:
+    """Unescapes content written by a model and converts its line endings to the platform's."""
+    processed_content = (
+        content.replace('\\n', '\n')
+        .replace('\\"', '"')
+        .replace("\\'", "'")
+    )
+    if os.linesep != '\n':
+        processed_content = processed_content.replace('\n', os.linesep)
+    return processed_content
 
 def write_file(filename: str, content: str) -> str:
     """
-    Writes content to a file.
+    Writes content to a file.  The previous version of the file is kept in the snapshot store, and the
+    file is replaced atomically so it's never left half written.
 
     :param filename: The path to the file.
     :param content: The content to write to the file.
@@ -36,116 +43,202 @@ def write_file(filename: str, content: str) -> str:
 
     # Check if the target file exists
     if os.path.exists(filename):
-        # Create a backup by copying the existing file
-        backup_filename = f"{filename}.backup"
-        shutil.copy2(filename, backup_filename)
+        # keep the current version so the write can be undone
+        snapshot_store.snapshot(filename)
     else:
         directory = os.path.dirname(filename)
         if directory and not os.path.exists(directory):
             os.makedirs(directory)
 
-    processed_content = (
-        content.replace('\\n', '\n')
-        .replace('\\"', '"')
-        .replace("\\'", "'")
-    )
+    try:
+        atomic_write(filename, _process_content(content).encode('utf-8'))
+    except (OSError, UnicodeEncodeError):
+        print("Error writing file.")
+        return "Error writing file."
+    file_cache.invalidate(filename)
+    return "Successfully wrote file."
+
+class StreamingFileWriter:
+    """
+    Writes a file while its content is still being generated.
 
-    encodings = ['utf-8', 'latin-1', 'ascii', 'utf-16', 'windows-1252']
-    for enc in encodings:
+    The content is written to a temporary file next to the target as it arrives.  commit() then only
+    has to rename it into place when the final content is what was streamed, and otherwise falls back
+    to write_file.  Until then the target file is untouched.
+    """
+
+    def __init__(self, filename: str):
+        """
+        :param filename: The path to the file.
+        """
+        self.filename = filename
+        self._streamed: list[str] = []
+        self._temp_path: str | None = None
+        self._file = None
+
+    def write(self, content: str) -> None:
+        """Appends streamed content.  Content should be whole lines, so escapes aren't split."""
+        if not content:
+            return
         try:
-            with open(f"{filename}", 'w', encoding=enc) as file:
-                file.write(processed_content)
-            return "Successfully wrote file."
-        except UnicodeDecodeError:
-            print(f"Failed to write with {enc} encoding")
-        except IOError:
-            print("Error writing file.")
+            if self._file is None:
+                directory = os.path.dirname(os.path.abspath(self.filename))
+                os.makedirs(directory, exist_ok=True)
+                fd, self._temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp",
+                                                       prefix=f".{os.path.basename(self.filename)}.")
+                self._file = os.fdopen(fd, 'wb')
+            self._file.write(_process_content(content).encode('utf-8'))
+            self._streamed.append(content)
+        except (OSError, UnicodeEncodeError) as e:
+            # streaming is only a head start; commit() writes the file the usual way
+            print(f"Unable to stream {self.filename}: {e}")
+            self.discard()
+
+    def commit(self, content: str) -> str:
+        """
+        Writes the final content to the file.
+
+        :param content: The complete content.
+        :return: A message indicating success or failure.
+        """
+        if self._file is None or "".join(self._streamed) != content:
+            self.discard()
+            return write_file(self.filename, content)
+
+        print("Writing filename: ", self.filename)
+        try:
+            self._file.close()
+            self._file = None
+            if os.path.exists(self.filename):
+                # keep the current version so the write can be undone
+                snapshot_store.snapshot(self.filename)
+                shutil.copymode(self.filename, self._temp_path)
+            os.replace(self._temp_path, self.filename)
+            self._temp_path = None
+        except OSError:
+            self.discard()
+            return write_file(self.filename, content)
+        file_cache.invalidate(self.filename)
+        return "Successfully wrote file."
+
+    def discard(self) -> None:
+        """Drops the streamed content, leaving the target file untouched."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._temp_path and os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+        self._temp_path = None
+        self._streamed = []
+
+def file_history(filename: str) -> list[dict]:
+    """
+    Lists the earlier versions of a file kept by write_file, newest first.
+
+    :param filename: The path to the file.
+    :return: Entries with the 'digest', 'size' and 'time' of each version.
+    """
+    return snapshot_store.history(filename)
+
+def restore_file(filename: str, version: str | int = 0) -> str:
+    """
+    Restores an earlier version of a file.
+
+    :param filename: The path to the file.
+    :param version: A digest (or its prefix) from file_history, or an index into it; 0 undoes the last write.
+    :return: A message indicating success or failure.
+    """
+    if not snapshot_store.restore(filename, version):
+        return f"No version {version} of {filename} found."
+    file_cache.invalidate(filename)
+    return "Successfully restored file."
 
 def get_diff(text1: str, text2: str) -> str:
-    diff = unified_diff(a=text1.splitlines(), b=text2.splitlines(), n=5)
-    diff_string = '\n'.join(diff)
-    # Wrap the diff string in basic HTML structure
-    html_diff = f"""
-    <style>
-        .diff-add {{ color: green; }}
-        .diff-del {{ color: red; }}
-        .diff-info {{ color: grey; }}
-    </style>
-    <pre>
-    """
-
-    # Process each line of the unified diff and add HTML classes
-    for line in diff_string.splitlines():
-        if line.startswith('+') and not line.startswith('+++'):
-            html_diff += f'<span class="diff-add">{line}</span>\n'
-        elif line.startswith('-') and not line.startswith('---'):
-            html_diff += f'<span class="diff-del">{line}</span>\n'
-        else:
-            html_diff += f'<span class="diff-info">{line}</span>\n'
+    """
+    Builds an HTML unified diff of two texts.
 
-    html_diff += """
-    </pre>
+    :param text1: The original text.
+    :param text2: The modified text.
+    :return: The diff as escaped HTML.
     """
+    return "".join(iter_html(a=text1.splitlines(), b=text2.splitlines(), context=5))
 
-    return html_diff
-    # html_obj = HtmlDiff()
-    # html_diff = html_obj.make_file(fromlines=text1.splitlines(), tolines=text2.splitlines(), context=True, numlines=5)
-    # return html_diff
+def iter_diff_html(text1: str, text2: str):
+    """
+    Builds the same HTML as get_diff, yielding it hunk by hunk so it can be streamed while the rest is
+    still being computed.
+    """
+    return iter_html(a=text1.splitlines(), b=text2.splitlines(), context=5)
 
-def process_tool_call(tool_name, tool_input):
+def get_diff_hunks(text1: str, text2: str, context: int = 5) -> list[dict]:
     """
-    Processes a tool call.
+    Diffs two texts into JSON serializable unified diff hunks.
 
-    :param tool_name: The name of the tool to call.
-    :param tool_input: The input to the tool.
-    :return: The result of the tool call.
+    :param text1: The original text.
+    :param text2: The modified text.
+    :param context: Number of unchanged lines around each change.
+    :return: Hunks with 'old_start', 'old_lines', 'new_start', 'new_lines' and 'lines'.
     """
-    print(f"process_tool_call({tool_name}, {tool_input})")
-    if tool_name == "read_file":
-        return read_file(filename=tool_input["filepath"])
-    elif tool_name == "write_file":
-        return write_file(filename=tool_input["filepath"],
-                          content=tool_input["content"])
+    return list(iter_hunks(a=text1.splitlines(), b=text2.splitlines(), context=context))
 
+def summarize_diff(text1: str, text2: str) -> str:
+    """
+    Builds a short, human readable summary of the changes between two texts without calling an LLM.
 
-import os
+    :param text1: The original text.
+    :param text2: The modified text.
+    :return: A summary listing the number of changed regions and lines added/removed.
+    """
+    if not text1:
+        return f"Created new content with {len(text2.splitlines())} lines."
+
+    added = 0
+    removed = 0
+    hunks = []
+    for line in unified_diff(a=text1.splitlines(), b=text2.splitlines(), n=0, lineterm=''):
+        if line.startswith('@@'):
+            hunks.append(line.strip('@ '))
+        elif line.startswith('+') and not line.startswith('+++'):
+            added += 1
+        elif line.startswith('-') and not line.startswith('---'):
+            removed += 1
+
+    if not hunks:
+        return "No changes were made."
+
+    summary = f"Changed {len(hunks)} region(s): {added} line(s) added, {removed} line(s) removed."
+    summary += " Affected ranges: " + ", ".join(hunks[:10])
+    if len(hunks) > 10:
+        summary += f" and {len(hunks) - 10} more"
+    return summary + "."
 
 
-def combine_directory_files(directory, output_file, exclude_dirs=None, exclude_extensions=None):
+def combine_directory_files(directory, output_file, exclude_dirs=None, exclude_extensions=None,
+                            max_file_bytes: int = 256 * 1024, max_total_bytes: int = 4 * 1024 * 1024):
     """
     Combines all files in a directory into a single output file, with file path headers.
+    Binary files and files ignored by .gitignore are skipped; use utils.file_utils.iter_combined to get
+    the same content without writing a file.
 
     :param directory: The path to the directory containing the files to combine.
     :param output_file: The path to the output file where the combined content will be written.
     :param exclude_dirs: A list of directory names to exclude from the combination.
     :param exclude_extensions: A list of file extensions to exclude from the combination.
+    :param max_file_bytes: Maximum bytes included from a single file.
+    :param max_total_bytes: Maximum bytes included across all files.
     """
-    print("exclude_extensions: ", exclude_extensions)
-    print("exclude_dirs: ", exclude_dirs)
-    if exclude_extensions is None:
-        exclude_extensions = []
-    if exclude_dirs is None:
-        exclude_dirs = []
+    output_path = os.path.abspath(output_file)
     with open(output_file, 'w') as out_file:
-        for root, dirs, files in os.walk(directory):
-            # Exclude directories
-            dirs[:] = [d for d in dirs if d not in exclude_dirs]
-
-            for file in files:
-                # Exclude files with specified extensions
-                _, ext = os.path.splitext(file)
-                print(f"file {file} has extension {ext}")
-                if ext in exclude_extensions:
-                    continue
-
-                file_path = os.path.join(root, file)
-                print("Adding file ", file_path)
-
-                # Add a heading for the file
-                out_file.write(f" [{file_path}] ")
-
-                # Write the file contents to the output file
-                with open(file_path, 'r') as in_file:
-                    out_file.write(in_file.read())
+        for file_path, text in iter_directory_files(directory, exclude_dirs=exclude_dirs,
+                                                    exclude_extensions=exclude_extensions,
+                                                    max_file_bytes=max_file_bytes,
+                                                    max_total_bytes=max_total_bytes):
+            # don't include the output file in itself
+            if os.path.abspath(file_path) == output_path:
+                continue
+
+            # Add a heading for the file
+            out_file.write(f" [{file_path}] ")
+            out_file.write(text)
 
     print(f"Combined files written to: {output_file}")
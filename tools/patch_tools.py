@@ -0,0 +1,186 @@
+import re
+from difflib import SequenceMatcher
+
+SEARCH_MARKER = "<<<<<<< SEARCH"
+DIVIDER_MARKER = "======="
+REPLACE_MARKER = ">>>>>>> REPLACE"
+
+# minimum similarity for a fuzzy match of a search block against the original text
+FUZZY_THRESHOLD = 0.85
+
+
+class PatchError(Exception):
+    """Raised when an edit cannot be applied to the original text."""
+    pass
+
+
+def parse_search_replace(text: str) -> list[tuple[str, str]]:
+    """
+    Parses SEARCH/REPLACE blocks from model output.
+
+    :param text: The model output.
+    :return: A list of (search, replace) pairs in the order they appear.
+    """
+    pattern = (re.escape(SEARCH_MARKER) + r"[^\n]*\n(.*?)^" + re.escape(DIVIDER_MARKER) + r"[^\n]*\n(.*?)^"
+               + re.escape(REPLACE_MARKER))
+    return [(search, replace) for search, replace in re.findall(pattern, text, re.DOTALL | re.MULTILINE)]
+
+
+def parse_unified_diff(text: str) -> list[tuple[str, str]]:
+    """
+    Parses unified diff hunks from model output and converts each hunk to a (search, replace) pair.
+
+    :param text: The model output.
+    :return: A list of (search, replace) pairs in the order they appear.
+    """
+    edits = []
+    search: list[str] | None = None
+    replace: list[str] = []
+    for line in text.splitlines():
+        if line.startswith("@@"):
+            if search is not None:
+                edits.append(("".join(search), "".join(replace)))
+            search, replace = [], []
+        elif search is None or line.startswith(("---", "+++")):
+            continue
+        elif line.startswith("```"):
+            edits.append(("".join(search), "".join(replace)))
+            search = None
+        elif line.startswith("-"):
+            search.append(line[1:] + "\n")
+        elif line.startswith("+"):
+            replace.append(line[1:] + "\n")
+        else:
+            context = (line[1:] if line.startswith(" ") else line) + "\n"
+            search.append(context)
+            replace.append(context)
+
+    if search is not None:
+        edits.append(("".join(search), "".join(replace)))
+
+    return [(search, replace) for search, replace in edits if search or replace]
+
+
+def parse_edits(text: str) -> list[tuple[str, str]]:
+    """
+    Parses edits in either SEARCH/REPLACE or unified diff format.
+
+    :param text: The model output.
+    :return: A list of (search, replace) pairs, empty if the output contains no edits.
+    """
+    edits = parse_search_replace(text)
+    if edits:
+        return edits
+    if re.search(r"^@@.*@@", text, re.MULTILINE):
+        return parse_unified_diff(text)
+    return []
+
+
+def _find_fuzzy(lines: list[str], search_lines: list[str]) -> tuple[int, int] | None:
+    """
+    Finds the block of lines that best matches search_lines.
+
+    Lines are first compared ignoring surrounding whitespace; failing that, the most similar window
+    above FUZZY_THRESHOLD is used.
+
+    :return: The (start, end) line range of the match, or None.
+    :raises PatchError: If the lines match in more than one place, ignoring whitespace.
+    """
+    size = len(search_lines)
+    if not size or size > len(lines):
+        return None
+
+    stripped_search = [line.strip() for line in search_lines]
+    stripped_lines = [line.strip() for line in lines]
+    matches = [start for start in range(len(lines) - size + 1)
+               if stripped_lines[start:start + size] == stripped_search]
+    if len(matches) > 1:
+        raise PatchError(f"The text to replace appears {len(matches)} times:\n{''.join(search_lines)}")
+    if matches:
+        return matches[0], matches[0] + size
+
+    target = "\n".join(stripped_search)
+    best_ratio, best_start = 0.0, None
+    for start in range(len(lines) - size + 1):
+        matcher = SequenceMatcher(None, "\n".join(stripped_lines[start:start + size]), target, autojunk=False)
+        if matcher.real_quick_ratio() < FUZZY_THRESHOLD or matcher.quick_ratio() < FUZZY_THRESHOLD:
+            continue
+        ratio = matcher.ratio()
+        if ratio > best_ratio:
+            best_ratio, best_start = ratio, start
+
+    if best_start is not None and best_ratio >= FUZZY_THRESHOLD:
+        return best_start, best_start + size
+    return None
+
+
+def _reindent(replace_lines: list[str], search_lines: list[str], matched_lines: list[str]) -> list[str]:
+    """
+    Shifts the replacement by the indentation difference between the search block and the matched lines.
+    """
+    def indent(line: str) -> str:
+        return line[:len(line) - len(line.lstrip())]
+
+    search_first = next((line for line in search_lines if line.strip()), "")
+    matched_first = next((line for line in matched_lines if line.strip()), "")
+    search_indent, matched_indent = indent(search_first), indent(matched_first)
+    if search_indent == matched_indent:
+        return replace_lines
+
+    adjusted = []
+    for line in replace_lines:
+        if line.strip() and line.startswith(search_indent):
+            line = matched_indent + line[len(search_indent):]
+        adjusted.append(line)
+    return adjusted
+
+
+def apply_edit(original: str, search: str, replace: str) -> str:
+    """
+    Applies a single search/replace edit, falling back to whitespace-insensitive and fuzzy matching.
+
+    :param original: The text to modify.
+    :param search: The text to find.  An empty search appends the replacement.
+    :param replace: The text to put in its place.
+    :return: The modified text.
+    :raises PatchError: If the search text cannot be located, or appears more than once.
+    """
+    if not search.strip():
+        separator = "" if not original or original.endswith("\n") else "\n"
+        return original + separator + replace
+
+    occurrences = original.count(search)
+    if occurrences > 1:
+        # editing the first one could change the wrong place
+        raise PatchError(f"The text to replace appears {occurrences} times:\n{search}")
+    if occurrences:
+        return original.replace(search, replace, 1)
+
+    lines = original.splitlines(keepends=True)
+    search_lines = search.splitlines(keepends=True)
+    match = _find_fuzzy(lines, search_lines)
+    if match is None:
+        raise PatchError(f"Could not find the text to replace:\n{search}")
+
+    start, end = match
+    replace_lines = _reindent(replace.splitlines(keepends=True), search_lines, lines[start:end])
+    if replace_lines and end == len(lines) and not lines[-1].endswith("\n"):
+        replace_lines[-1] = replace_lines[-1].rstrip("\n")
+    elif replace_lines and not replace_lines[-1].endswith("\n") and end < len(lines):
+        replace_lines[-1] += "\n"
+    return "".join(lines[:start] + replace_lines + lines[end:])
+
+
+def apply_edits(original: str, edits: list[tuple[str, str]]) -> str:
+    """
+    Applies a list of search/replace edits in order.
+
+    :param original: The text to modify.
+    :param edits: The (search, replace) pairs to apply.
+    :return: The modified text.
+    :raises PatchError: If any edit cannot be applied.
+    """
+    modified = original
+    for search, replace in edits:
+        modified = apply_edit(modified, search, replace)
+    return modified
@@ -0,0 +1,302 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import Callable
+
+from tools.file_tools import read_file, write_file
+from utils.tracing import tracer
+
+TRUNCATED_MARKER = "\n... [output truncated]"
+
+# JSON schema types accepted for each Python type of a tool input
+_SCHEMA_TYPES = {
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+    "array": list,
+    "object": dict,
+}
+
+
+class ToolError(Exception):
+    """Raised when a tool call can't be run: unknown tool, invalid input, timeout or failure."""
+    pass
+
+
+@dataclass
+class Tool:
+    """A function the model can call, with the schema of its input and the limits it runs under."""
+    name: str
+    func: Callable[..., str]
+    description: str
+    input_schema: dict
+    # maps input properties to the function's keyword arguments, when they're named differently
+    arguments: dict[str, str] | None = None
+    timeout: float = 30.0
+    max_output: int = 64 * 1024
+    max_concurrency: int = 4
+    # run in a separate process that is killed on timeout; the function must be importable
+    sandbox: bool = False
+
+    def kwargs(self, tool_input: dict) -> dict:
+        arguments = self.arguments or {}
+        return {arguments.get(key, key): value for key, value in tool_input.items()}
+
+
+class ToolRegistry:
+    """
+    The tools the model can call, by name.
+    """
+
+    def __init__(self):
+        self._tools: dict[str, Tool] = {}
+
+    def register(self, tool: Tool) -> Tool:
+        """Registers a tool, replacing any tool with the same name."""
+        self._tools[tool.name] = tool
+        return tool
+
+    def get(self, name: str) -> Tool:
+        """
+        :raises ToolError: If no tool has that name.
+        """
+        tool = self._tools.get(name)
+        if not tool:
+            raise ToolError(f"Unknown tool {name}")
+        return tool
+
+    def names(self) -> list[str]:
+        return list(self._tools)
+
+    def schemas(self) -> list[dict]:
+        """Returns the tools in the format of the Anthropic messages API's tools parameter."""
+        return [{"name": tool.name, "description": tool.description, "input_schema": tool.input_schema}
+                for tool in self._tools.values()]
+
+    def validate(self, name: str, tool_input: dict) -> Tool:
+        """
+        Checks a tool call's input against the tool's schema: required properties must be present,
+        and properties must have the declared type.
+
+        :return: The tool.
+        :raises ToolError: If the tool doesn't exist or the input doesn't match.
+        """
+        tool = self.get(name)
+        if not isinstance(tool_input, dict):
+            raise ToolError(f"Input of {name} must be an object")
+        properties = tool.input_schema.get("properties", {})
+        missing = [key for key in tool.input_schema.get("required", []) if key not in tool_input]
+        if missing:
+            raise ToolError(f"Missing input of {name}: {', '.join(missing)}")
+        for key, value in tool_input.items():
+            if key not in properties:
+                raise ToolError(f"Unexpected input of {name}: {key}")
+            expected = _SCHEMA_TYPES.get(properties[key].get("type"))
+            if expected and (not isinstance(value, expected) or
+                             (isinstance(value, bool) and properties[key]["type"] != "boolean")):
+                raise ToolError(f"Input {key} of {name} must be of type {properties[key]['type']}")
+        return tool
+
+
+def _sandbox_main(connection, func, kwargs) -> None:
+    try:
+        connection.send((True, func(**kwargs)))
+    except Exception as e:
+        connection.send((False, f"{type(e).__name__}: {e}"))
+    finally:
+        connection.close()
+
+
+class ToolRuntime:
+    """
+    Runs tool calls on a worker pool so a slow tool can't stall the thread streaming the model's
+    response.
+
+    Every call is validated against the tool's schema and bounded by the tool's timeout, output size
+    and concurrency limit.  A thread that times out can't be stopped and keeps its worker until the tool
+    returns, so tools that may run away should be registered with sandbox=True: they run in their own
+    process, which is killed on timeout.
+    """
+
+    def __init__(self, registry: ToolRegistry, max_workers: int = 8):
+        """
+        :param registry: The tools that can be called.
+        :param max_workers: Maximum number of tool calls running at the same time.
+        """
+        self._registry = registry
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+        self._slots: dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _slot(self, tool: Tool) -> threading.BoundedSemaphore:
+        with self._lock:
+            slot = self._slots.get(tool.name)
+            if not slot:
+                slot = self._slots[tool.name] = threading.BoundedSemaphore(max(1, tool.max_concurrency))
+            return slot
+
+    def _run_sandboxed(self, tool: Tool, kwargs: dict) -> str:
+        context = multiprocessing.get_context("spawn")
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_sandbox_main, args=(sender, tool.func, kwargs), daemon=True)
+        process.start()
+        sender.close()
+        try:
+            if not receiver.poll(tool.timeout):
+                raise ToolError(f"{tool.name} timed out after {tool.timeout}s")
+            ok, result = receiver.recv()
+        except EOFError:
+            raise ToolError(f"{tool.name} exited without a result")
+        finally:
+            receiver.close()
+            if process.is_alive():
+                process.kill()
+            process.join()
+        if not ok:
+            raise ToolError(f"{tool.name} failed: {result}")
+        return result
+
+    def _run(self, tool: Tool, tool_input: dict, parent: int | None) -> str:
+        with tracer.span(f"tool {tool.name}", "tool", parent=parent, sandbox=tool.sandbox):
+            if tool.sandbox:
+                return self._run_sandboxed(tool, tool.kwargs(tool_input))
+            return tool.func(**tool.kwargs(tool_input))
+
+    def call(self, name: str, tool_input: dict) -> str:
+        """
+        Runs a tool call and waits for its result.
+
+        :param name: The name of the tool.
+        :param tool_input: The tool's input, matching its schema.
+        :return: The tool's output, truncated to the tool's max_output characters.
+        :raises ToolError: If the tool doesn't exist, the input is invalid, or the tool fails or times out.
+        """
+        return self._call(name, tool_input, tracer.current())
+
+    def _call(self, name: str, tool_input: dict, parent: int | None) -> str:
+        return self._result(*self._submit(name, tool_input, parent))
+
+    def _submit(self, name: str, tool_input: dict, parent: int | None) -> tuple[Tool, Future, float]:
+        """
+        Validates a tool call and submits it to the worker pool once the tool has a free slot.
+
+        :return: The tool, the future of its output, and the deadline of the call.
+        """
+        tool = self._registry.validate(name, tool_input)
+        deadline = time.monotonic() + tool.timeout
+        slot = self._slot(tool)
+        if not slot.acquire(timeout=tool.timeout):
+            raise ToolError(f"{name} is busy, too many calls are running")
+
+        future = self._executor.submit(self._run, tool, tool_input, parent)
+        # the slot is held until the tool really finishes, even if the caller gives up waiting first
+        future.add_done_callback(lambda _: slot.release())
+        return tool, future, deadline
+
+    def _result(self, tool: Tool, future: Future, deadline: float) -> str:
+        """
+        Waits for a submitted tool call until its deadline.
+
+        :return: The tool's output, truncated to the tool's max_output characters.
+        """
+        try:
+            result = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            raise ToolError(f"{tool.name} timed out after {tool.timeout}s")
+        except ToolError:
+            raise
+        except Exception as e:
+            raise ToolError(f"{tool.name} failed: {type(e).__name__}: {e}")
+
+        result = "" if result is None else str(result)
+        if len(result) > tool.max_output:
+            result = result[:tool.max_output] + TRUNCATED_MARKER
+        return result
+
+    def call_many(self, calls: list[tuple[str, dict]]) -> list[str]:
+        """
+        Runs independent tool calls in parallel on the worker pool, within each tool's concurrency
+        limit.  A call that fails doesn't fail the others; its result is the error message instead.
+
+        :param calls: (name, input) pairs.
+        :return: The results, in the order of the calls.
+        """
+        parent = tracer.current()
+        submitted: list[tuple[Tool, Future, float] | ToolError] = []
+        for name, tool_input in calls:
+            try:
+                submitted.append(self._submit(name, tool_input, parent))
+            except ToolError as e:
+                submitted.append(e)
+
+        results = []
+        for call in submitted:
+            try:
+                if isinstance(call, ToolError):
+                    raise call
+                results.append(self._result(*call))
+            except ToolError as e:
+                print(f"Tool call failed: {e}")
+                results.append(f"Error: {e}")
+        return results
+
+    def call_safely(self, name: str, tool_input: dict) -> str:
+        """Runs a tool call, returning the error message instead of raising if it fails."""
+        return self._call_safely(name, tool_input, tracer.current())
+
+    def _call_safely(self, name: str, tool_input: dict, parent: int | None) -> str:
+        try:
+            return self._call(name, tool_input, parent)
+        except ToolError as e:
+            print(f"Tool call failed: {e}")
+            return f"Error: {e}"
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# tools the models can call, and the runtime shared by every model
+tool_registry = ToolRegistry()
+tool_runtime = ToolRuntime(tool_registry)
+
+_FILEPATH = {"filepath": {"type": "string", "description": "The path to the file."}}
+
+tool_registry.register(Tool(
+    name="read_file",
+    func=read_file,
+    description="Reads the contents of a file.",
+    input_schema={"type": "object", "properties": _FILEPATH, "required": ["filepath"]},
+    arguments={"filepath": "filename"},
+    timeout=10.0,
+    max_output=256 * 1024,
+    max_concurrency=8
+))
+
+tool_registry.register(Tool(
+    name="write_file",
+    func=write_file,
+    description="Writes content to a file, replacing its contents.",
+    input_schema={"type": "object",
+                  "properties": {**_FILEPATH, "content": {"type": "string", "description": "The new contents."}},
+                  "required": ["filepath", "content"]},
+    arguments={"filepath": "filename"},
+    timeout=10.0,
+    max_output=1024,
+    # writes to the same file mustn't interleave
+    max_concurrency=1
+))
+
+
+def process_tool_call(tool_name, tool_input):
+    """
+    Processes a tool call on the tool runtime's worker pool.
+
+    :param tool_name: The name of the tool to call.
+    :param tool_input: The input to the tool.
+    :return: The result of the tool call, or an error message if it failed or timed out.
+    """
+    print(f"process_tool_call({tool_name}, {tool_input})")
+    return tool_runtime.call_safely(tool_name, tool_input)
@@ -0,0 +1,119 @@
+import ast
+from dataclasses import dataclass
+
+
+@dataclass
+class CodeChunk:
+    start_line: int
+    end_line: int
+    text: str
+    name: str = ""
+
+
+def _node_start(node: ast.AST) -> int:
+    """
+    Returns the first line of a node, including any decorators.
+    """
+    decorators = getattr(node, "decorator_list", [])
+    return min([node.lineno] + [decorator.lineno for decorator in decorators])
+
+
+def _line_chunks(lines: list[str], start: int, end: int, max_lines: int, name: str = "") -> list[CodeChunk]:
+    """
+    Splits lines[start - 1:end] into chunks of at most max_lines lines.
+    """
+    chunks = []
+    for chunk_start in range(start, end + 1, max_lines):
+        chunk_end = min(chunk_start + max_lines - 1, end)
+        chunks.append(CodeChunk(start_line=chunk_start, end_line=chunk_end,
+                                text="".join(lines[chunk_start - 1:chunk_end]), name=name))
+    return chunks
+
+
+def _group_nodes(body: list[ast.stmt], start: int, end: int, lines: list[str], max_lines: int) -> list[CodeChunk]:
+    """
+    Groups consecutive statements covering lines start..end into chunks of at most max_lines lines.
+    Statements larger than max_lines are split on their own.
+    """
+    chunks: list[CodeChunk] = []
+    group_start = start
+    group_end = start - 1
+    group_names: list[str] = []
+
+    def flush():
+        text = "".join(lines[group_start - 1:group_end])
+        if group_end >= group_start and text.strip():
+            chunks.append(CodeChunk(start_line=group_start, end_line=group_end, text=text,
+                                    name=", ".join(group_names)))
+
+    for node in body:
+        node_start = _node_start(node)
+        node_end = node.end_lineno
+
+        if node_end - node_start + 1 > max_lines:
+            # flush what precedes the large statement, then split it on its own
+            group_end = node_start - 1
+            flush()
+            chunks.extend(_split_node(node, lines, max_lines))
+            group_start, group_end, group_names = node_end + 1, node_end, []
+            continue
+
+        if group_end >= group_start and node_end - group_start + 1 > max_lines:
+            group_end = node_start - 1
+            flush()
+            group_start, group_names = node_start, []
+
+        group_end = node_end
+        if getattr(node, "name", ""):
+            group_names.append(node.name)
+
+    group_end = end
+    flush()
+    return chunks
+
+
+def _split_node(node: ast.stmt, lines: list[str], max_lines: int) -> list[CodeChunk]:
+    """
+    Splits a statement that is larger than max_lines, class bodies along their methods.
+    """
+    start = _node_start(node)
+    name = getattr(node, "name", "")
+    if not isinstance(node, ast.ClassDef) or not node.body:
+        return _line_chunks(lines, start, node.end_lineno, max_lines, name=name)
+
+    header_end = _node_start(node.body[0]) - 1
+    header = "".join(lines[start - 1:header_end])
+    chunks = _group_nodes(node.body, start, node.end_lineno, lines, max_lines)
+    for chunk in chunks:
+        chunk.name = ", ".join(f"{name}.{member}" for member in chunk.name.split(", ") if member) or name
+        # keep the class line so each chunk of members knows where it lives
+        if chunk.start_line > header_end:
+            chunk.text = header + "    ...\n" + chunk.text
+    return chunks
+
+
+def chunk_source(source: str, max_lines: int = 200) -> list[CodeChunk]:
+    """
+    Splits source code into chunks along class and function boundaries.
+
+    Consecutive top level statements are grouped until a chunk would exceed max_lines; definitions
+    larger than max_lines are split further (classes along their methods).  Source that is not valid
+    Python is split into fixed size line chunks.
+
+    Args:
+        source (str): The source code to split.
+        max_lines (int): The preferred maximum number of lines in a chunk.
+
+    Returns:
+        list[CodeChunk]: The chunks in file order.
+    """
+    lines = source.splitlines(keepends=True)
+    if not lines:
+        return []
+
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return _line_chunks(lines, 1, len(lines), max_lines)
+
+    return _group_nodes(tree.body, 1, len(lines), lines, max_lines)
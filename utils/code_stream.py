@@ -0,0 +1,87 @@
+import re
+
+from utils.utils import CLOSING_FENCE, OPENING_FENCE_PATTERN, extract_content
+
+_OPENING_FENCE = re.compile(OPENING_FENCE_PATTERN)
+
+
+class CodeBlockStream:
+    """
+    Follows the first fenced code block of a response while the response is being streamed.
+
+    feed() returns the code that became available with each chunk, a whole line at a time, so the code
+    can be shown or written before the response is complete.  The fence is parsed like
+    utils.extract_content does, so once the block is closed the streamed code is exactly what
+    extract_content (and finish()) return for the whole response.
+    """
+
+    def __init__(self):
+        self._chunks: list[str] = []
+        self._line = ""
+        self._code: list[str] = []
+        self.language: str | None = None
+        self.opened = False
+        self.closed = False
+        # whitespace after the opening fence is skipped up to the first code
+        self._skipping = False
+
+    def feed(self, text: str) -> str:
+        """
+        Consumes the next chunk of the response.
+
+        :param text: The chunk.
+        :return: The lines of code completed by the chunk, or an empty string.
+        """
+        self._chunks.append(text)
+        if self.closed:
+            return ""
+
+        lines = (self._line + text).split('\n')
+        # the last line may still be growing, e.g. into a closing fence
+        self._line = lines.pop()
+        new_code = []
+        for line in lines:
+            if not self.opened:
+                match = _OPENING_FENCE.match(line)
+                if match:
+                    self.opened = True
+                    self._skipping = True
+                    self.language = match.group(1)
+                    rest = line[match.end():].lstrip()
+                    if rest:
+                        self._skipping = False
+                        new_code.append(rest + '\n')
+            elif line.startswith(CLOSING_FENCE):
+                self.closed = True
+                break
+            elif self._skipping:
+                line = line.lstrip()
+                if line:
+                    self._skipping = False
+                    new_code.append(line + '\n')
+            else:
+                new_code.append(line + '\n')
+
+        code = "".join(new_code)
+        if code:
+            self._code.append(code)
+        return code
+
+    @property
+    def code(self) -> str:
+        """The code streamed so far."""
+        return "".join(self._code)
+
+    @property
+    def text(self) -> str:
+        """The response streamed so far."""
+        return "".join(self._chunks)
+
+    def finish(self, text: str | None = None) -> str:
+        """
+        Returns the code of the complete response.
+
+        :param text: The complete response, if it differs from the chunks that were fed.
+        :return: The contents of the first code block, or the whole response if it has none.
+        """
+        return extract_content(self.text if text is None else text)
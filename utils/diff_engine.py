@@ -0,0 +1,289 @@
+import html
+from typing import Iterator
+
+# regions whose Myers edit distance exceeds this are reported as a single replacement, which bounds the
+# time spent on files that were rewritten rather than edited
+MAX_EDIT_DISTANCE = 1000
+
+Opcode = tuple[str, int, int, int, int]
+
+
+def _intern_lines(a: list[str], b: list[str]) -> tuple[list[int], list[int]]:
+    """Replaces every line by an integer id so lines are compared by hash once, then as integers."""
+    ids: dict[str, int] = {}
+    return ([ids.setdefault(line, len(ids)) for line in a],
+            [ids.setdefault(line, len(ids)) for line in b])
+
+
+def _middle_snake(a: list[int], alo: int, ahi: int, b: list[int], blo: int, bhi: int,
+                  max_d: int) -> tuple[int, int, int, int, int] | None:
+    """
+    Finds the middle snake of the shortest edit script of a[alo:ahi] and b[blo:bhi] by running Myers'
+    search from both corners until the paths meet, keeping only the furthest point of each diagonal.
+
+    :return: (edit distance, x, y, u, v) where the snake goes from (x, y) to (u, v) relative to (alo, blo),
+             or None if the edit distance exceeds max_d.
+    """
+    n, m = ahi - alo, bhi - blo
+    delta = n - m
+    odd = delta % 2 == 1
+    forward = {1: 0}
+    backward = {1: 0}  # furthest x on each diagonal, counted from the end of both sequences
+    for d in range(min(n + m, max_d) // 2 + 2):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and forward[k - 1] < forward[k + 1]):
+                x = forward[k + 1]
+            else:
+                x = forward[k - 1] + 1
+            y = x - k
+            start_x, start_y = x, y
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x += 1
+                y += 1
+            forward[k] = x
+            if odd and -d < delta - k < d and x + backward[delta - k] >= n:
+                return (2 * d - 1, start_x, start_y, x, y) if 2 * d - 1 <= max_d else None
+
+        for c in range(-d, d + 1, 2):
+            if c == -d or (c != d and backward[c - 1] < backward[c + 1]):
+                x = backward[c + 1]
+            else:
+                x = backward[c - 1] + 1
+            y = x - c
+            start_x, start_y = x, y
+            while x < n and y < m and a[ahi - 1 - x] == b[bhi - 1 - y]:
+                x += 1
+                y += 1
+            backward[c] = x
+            if not odd and -d <= delta - c <= d and x + forward[delta - c] >= n:
+                return (2 * d, n - x, m - y, n - start_x, m - start_y) if 2 * d <= max_d else None
+    return None
+
+
+def _myers(a: list[int], alo: int, ahi: int, b: list[int], blo: int, bhi: int) -> Iterator[Opcode]:
+    """
+    Diffs a[alo:ahi] against b[blo:bhi] with Myers' O(ND) algorithm in linear space: the middle snake
+    splits the region in two, which are diffed recursively.
+    """
+    start = 0
+    while alo + start < ahi and blo + start < bhi and a[alo + start] == b[blo + start]:
+        start += 1
+    if start:
+        yield 'equal', alo, alo + start, blo, blo + start
+        alo += start
+        blo += start
+    end = 0
+    while ahi - end > alo and bhi - end > blo and a[ahi - end - 1] == b[bhi - end - 1]:
+        end += 1
+    ahi -= end
+    bhi -= end
+
+    if alo == ahi and blo == bhi:
+        pass
+    elif alo == ahi:
+        yield 'insert', alo, alo, blo, bhi
+    elif blo == bhi:
+        yield 'delete', alo, ahi, blo, blo
+    else:
+        # both ends differ, so the distance is at least 2 and each half has fewer edits than the region
+        snake = _middle_snake(a, alo, ahi, b, blo, bhi, MAX_EDIT_DISTANCE)
+        if snake is None:
+            # too many differences to be worth aligning
+            yield 'replace', alo, ahi, blo, bhi
+        else:
+            _, x, y, u, v = snake
+            yield from _myers(a, alo, alo + x, b, blo, blo + y)
+            if u > x:
+                yield 'equal', alo + x, alo + u, blo + y, blo + v
+            yield from _myers(a, alo + u, ahi, b, blo + v, bhi)
+
+    if end:
+        yield 'equal', ahi, ahi + end, bhi, bhi + end
+
+
+def _longest_increasing(pairs: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """Returns the longest subsequence of (i, j) pairs, sorted by i, whose j also increase."""
+    tails: list[int] = []  # index into pairs of the smallest tail of each subsequence length
+    previous = [-1] * len(pairs)
+    for index, (_, j) in enumerate(pairs):
+        low, high = 0, len(tails)
+        while low < high:
+            mid = (low + high) // 2
+            if pairs[tails[mid]][1] < j:
+                low = mid + 1
+            else:
+                high = mid
+        if low:
+            previous[index] = tails[low - 1]
+        if low == len(tails):
+            tails.append(index)
+        else:
+            tails[low] = index
+
+    result = []
+    index = tails[-1] if tails else -1
+    while index != -1:
+        result.append(pairs[index])
+        index = previous[index]
+    return result[::-1]
+
+
+def _patience(a: list[int], alo: int, ahi: int, b: list[int], blo: int, bhi: int) -> Iterator[Opcode]:
+    """
+    Diffs a[alo:ahi] against b[blo:bhi] with patience diff: lines that occur exactly once on both sides
+    anchor the alignment, and the regions between anchors are diffed recursively.  Regions without such
+    lines fall back to Myers.  Opcodes are yielded in order as soon as each region is done.
+    """
+    # common prefix and suffix
+    start = 0
+    while alo + start < ahi and blo + start < bhi and a[alo + start] == b[blo + start]:
+        start += 1
+    if start:
+        yield 'equal', alo, alo + start, blo, blo + start
+        alo += start
+        blo += start
+    end = 0
+    while ahi - end > alo and bhi - end > blo and a[ahi - end - 1] == b[bhi - end - 1]:
+        end += 1
+    ahi -= end
+    bhi -= end
+
+    if alo == ahi and blo == bhi:
+        pass
+    elif alo == ahi:
+        yield 'insert', alo, alo, blo, bhi
+    elif blo == bhi:
+        yield 'delete', alo, ahi, blo, blo
+    else:
+        counts: dict[int, list] = {}
+        for i in range(alo, ahi):
+            entry = counts.setdefault(a[i], [0, 0, i, 0])
+            entry[0] += 1
+        for j in range(blo, bhi):
+            entry = counts.get(b[j])
+            if entry:
+                entry[1] += 1
+                entry[3] = j
+        anchors = _longest_increasing(sorted((i, j) for count_a, count_b, i, j in counts.values()
+                                             if count_a == 1 and count_b == 1))
+        if not anchors:
+            yield from _myers(a, alo, ahi, b, blo, bhi)
+        else:
+            i, j = alo, blo
+            for anchor_i, anchor_j in anchors:
+                yield from _patience(a, i, anchor_i, b, j, anchor_j)
+                yield 'equal', anchor_i, anchor_i + 1, anchor_j, anchor_j + 1
+                i, j = anchor_i + 1, anchor_j + 1
+            yield from _patience(a, i, ahi, b, j, bhi)
+
+    if end:
+        yield 'equal', ahi, ahi + end, bhi, bhi + end
+
+
+def diff_opcodes(a: list[str], b: list[str]) -> Iterator[Opcode]:
+    """
+    Diffs two lists of lines, yielding difflib-style opcodes (tag, i1, i2, j1, j2) where tag is one of
+    'equal', 'delete', 'insert' or 'replace'.  Adjacent opcodes of the same kind are merged.
+    """
+    ids_a, ids_b = _intern_lines(a, b)
+    pending: list | None = None
+    for tag, i1, i2, j1, j2 in _patience(ids_a, 0, len(ids_a), ids_b, 0, len(ids_b)):
+        if pending:
+            same = pending[0] == tag
+            changes = pending[0] != 'equal' and tag != 'equal'
+            if same or changes:
+                if not same:
+                    pending[0] = 'replace'
+                pending[2], pending[4] = i2, j2
+                continue
+            yield tuple(pending)
+        pending = [tag, i1, i2, j1, j2]
+    if pending:
+        yield tuple(pending)
+
+
+def iter_hunks(a: list[str], b: list[str], context: int = 3) -> Iterator[dict]:
+    """
+    Diffs two lists of lines, yielding unified-diff hunks as they're found.
+
+    :param a: The original lines.
+    :param b: The modified lines.
+    :param context: Number of unchanged lines around each change.
+    :return: Hunks with 'old_start', 'old_lines', 'new_start', 'new_lines' and 'lines', a list of
+             {'op': ' ' | '-' | '+', 'text': line}.
+    """
+    group: list[Opcode] = []
+    lead: Opcode | None = None
+    for opcode in diff_opcodes(a, b):
+        tag, i1, i2, j1, j2 = opcode
+        if tag == 'equal':
+            if not group:
+                lead = ('equal', max(i1, i2 - context), i2, max(j1, j2 - context), j2)
+            elif i2 - i1 > 2 * context:
+                group.append(('equal', i1, i1 + context, j1, j1 + context))
+                yield _hunk(group, a, b)
+                group = []
+                lead = ('equal', i2 - context, i2, j2 - context, j2)
+            else:
+                group.append(opcode)
+        else:
+            if not group and lead and lead[2] > lead[1]:
+                group.append(lead)
+            lead = None
+            group.append(opcode)
+
+    if group:
+        tag, i1, i2, j1, j2 = group[-1]
+        if tag == 'equal':
+            group[-1] = ('equal', i1, min(i2, i1 + context), j1, min(j2, j1 + context))
+        yield _hunk(group, a, b)
+
+
+def _hunk(group: list[Opcode], a: list[str], b: list[str]) -> dict:
+    old_start, new_start = group[0][1], group[0][3]
+    old_lines, new_lines = group[-1][2] - old_start, group[-1][4] - new_start
+    lines = []
+    for tag, i1, i2, j1, j2 in group:
+        if tag == 'equal':
+            lines.extend({'op': ' ', 'text': line} for line in a[i1:i2])
+            continue
+        if tag in ('delete', 'replace'):
+            lines.extend({'op': '-', 'text': line} for line in a[i1:i2])
+        if tag in ('insert', 'replace'):
+            lines.extend({'op': '+', 'text': line} for line in b[j1:j2])
+    return {
+        # unified diff numbers lines from 1, except that an empty range starts at the line before it
+        'old_start': old_start + 1 if old_lines else old_start,
+        'old_lines': old_lines,
+        'new_start': new_start + 1 if new_lines else new_start,
+        'new_lines': new_lines,
+        'lines': lines
+    }
+
+
+_HTML_CLASSES = {' ': 'diff-info', '-': 'diff-del', '+': 'diff-add'}
+
+
+def iter_html(a: list[str], b: list[str], context: int = 3) -> Iterator[str]:
+    """
+    Renders a unified diff as escaped HTML, yielding one chunk per hunk so it can be streamed.
+    """
+    yield """
+    <style>
+        .diff-add { color: green; }
+        .diff-del { color: red; }
+        .diff-info { color: grey; }
+    </style>
+    <pre>
+    """
+    for index, hunk in enumerate(iter_hunks(a, b, context)):
+        header = f"@@ -{hunk['old_start']},{hunk['old_lines']} +{hunk['new_start']},{hunk['new_lines']} @@"
+        chunk = [f'<span class="diff-info">{header}</span>\n']
+        if index == 0:
+            chunk.insert(0, '<span class="diff-info">--- </span>\n<span class="diff-info">+++ </span>\n')
+        chunk.extend(f'<span class="{_HTML_CLASSES[line["op"]]}">{html.escape(line["op"] + line["text"])}</span>\n'
+                     for line in hunk['lines'])
+        yield "".join(chunk)
+    yield """
+    </pre>
+    """
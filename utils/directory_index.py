@@ -0,0 +1,202 @@
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+import threading
+from collections import OrderedDict
+
+# inotify event masks (see inotify(7))
+IN_MODIFY_ENTRIES = 0x00000100 | 0x00000200 | 0x00000040 | 0x00000080  # IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+IN_DIR_GONE = 0x00000400 | 0x00000800  # IN_DELETE_SELF | IN_MOVE_SELF
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+class _Inotify:
+    """
+    Minimal inotify binding through libc, reporting changes to watched directories on a daemon thread.
+    """
+
+    def __init__(self, on_change, on_overflow):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self._fd = libc.inotify_init1(IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self._on_change = on_change
+        self._on_overflow = on_overflow
+        self._paths: dict[int, str] = {}
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, name="directory-index-inotify", daemon=True).start()
+
+    def watch(self, path: str) -> int | None:
+        wd = self._add_watch(self._fd, os.fsencode(path), IN_MODIFY_ENTRIES | IN_DIR_GONE | IN_ONLYDIR)
+        if wd < 0:
+            # out of watches or the directory is gone; callers fall back to checking mtimes
+            return None
+        with self._lock:
+            self._paths[wd] = path
+        return wd
+
+    def unwatch(self, wd: int) -> None:
+        with self._lock:
+            if self._paths.pop(wd, None) is None:
+                return
+        self._rm_watch(self._fd, wd)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except OSError:
+                return
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size + length
+                if mask & IN_Q_OVERFLOW:
+                    self._on_overflow()
+                    continue
+                unwatched = bool(mask & IN_IGNORED)
+                with self._lock:
+                    path = self._paths.pop(wd, None) if unwatched else self._paths.get(wd)
+                if path:
+                    self._on_change(path, unwatched)
+
+
+class DirectoryIndex:
+    """
+    Lists directories one level at a time, caching each listing until the directory changes.
+
+    On Linux, listings are invalidated by inotify as entries are created, deleted or renamed, so a cached
+    listing costs nothing to serve.  Elsewhere (or when inotify is unavailable) a listing is revalidated
+    against the directory's modification time.
+    """
+
+    EXCLUDE_DIRS = {'__pycache__', 'node_modules'}
+    EXCLUDE_EXTENSIONS = ('.txt', '.log')
+
+    def __init__(self, max_dirs: int = 2048):
+        """
+        :param max_dirs: Maximum number of directory listings kept (and watched).
+        """
+        self._max_dirs = max_dirs
+        # path -> [mtime, entries or None once stale, watch descriptor or None, generation]
+        self._listings: OrderedDict[str, list] = OrderedDict()
+        self._lock = threading.Lock()
+        self._inotify: _Inotify | None = None
+        if sys.platform.startswith('linux'):
+            try:
+                self._inotify = _Inotify(self._invalidate, self.clear)
+            except (OSError, AttributeError) as e:
+                print(f"inotify unavailable, directory listings will be checked by mtime: {e}")
+
+    def _scan(self, path: str) -> list[dict]:
+        folders = []
+        files = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            if not entry.name.startswith('.') and entry.name not in self.EXCLUDE_DIRS:
+                                folders.append({'name': entry.name, 'type': 'folder', 'path': entry.path})
+                        elif entry.is_file() and not entry.name.endswith(self.EXCLUDE_EXTENSIONS):
+                            files.append({'name': entry.name, 'type': 'file', 'path': entry.path})
+                    except OSError:
+                        continue
+        except PermissionError:
+            return [{'name': 'Permission Denied', 'type': 'error', 'path': path}]
+
+        folders.sort(key=lambda item: item['name'].lower())
+        files.sort(key=lambda item: item['name'].lower())
+        return folders + files
+
+    def _entries(self, path: str) -> list[dict]:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+
+        with self._lock:
+            listing = self._listings.get(path)
+            if listing is None:
+                listing = self._listings[path] = [None, None, None, 0]
+            self._listings.move_to_end(path)
+            # a watched listing is current until inotify says otherwise
+            if listing[1] is not None and (listing[2] is not None or listing[0] == mtime):
+                return listing[1]
+            generation = listing[3]
+            needs_watch = self._inotify is not None and listing[2] is None
+
+        # watch before scanning so a change made during the scan isn't missed
+        wd = self._inotify.watch(path) if needs_watch else None
+        entries = self._scan(path)
+        with self._lock:
+            listing = self._listings.get(path)
+            if listing is None:
+                listing = self._listings[path] = [None, None, None, generation]
+            if wd is not None:
+                listing[2] = wd
+            # only cache the scan if nothing changed while it ran
+            if listing[3] == generation:
+                listing[0], listing[1] = mtime, entries
+            while len(self._listings) > self._max_dirs:
+                _, evicted = self._listings.popitem(last=False)
+                if evicted[2] is not None:
+                    self._inotify.unwatch(evicted[2])
+        return entries
+
+    def list_dir(self, path: str, offset: int = 0, limit: int = 200) -> dict:
+        """
+        Lists one level of a directory, folders first.
+
+        :param path: The directory.
+        :param offset: Index of the first entry returned.
+        :param limit: Maximum number of entries returned.
+        :return: The directory as a folder node, named by its absolute path, whose 'children' holds the requested page, with the
+                 'total' number of entries and whether there are more ('has_more').  Child folders have
+                 no 'children'; list them to expand them.
+        """
+        path = os.path.abspath(path)
+        offset = max(0, offset)
+        entries = self._entries(path)
+        page = entries[offset:offset + max(0, limit)]
+        return {
+            'name': path,
+            'type': 'folder',
+            'path': path,
+            'children': page,
+            'offset': offset,
+            'total': len(entries),
+            'has_more': offset + len(page) < len(entries)
+        }
+
+    def _invalidate(self, path: str, unwatched: bool = False) -> None:
+        with self._lock:
+            listing = self._listings.get(path)
+            if listing:
+                listing[1] = None
+                listing[3] += 1
+                if unwatched:
+                    listing[2] = None
+
+    def clear(self) -> None:
+        """Drops every cached listing (the watches are kept)."""
+        with self._lock:
+            for listing in self._listings.values():
+                listing[1] = None
+                listing[3] += 1
+
+
+# index shared by the file browser
+directory_index = DirectoryIndex()
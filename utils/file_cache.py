@@ -0,0 +1,141 @@
+import codecs
+import mmap
+import os
+import threading
+from collections import OrderedDict
+
+# files at least this large are mapped into memory instead of copied into a buffer
+MMAP_THRESHOLD = 1024 * 1024
+
+# byte order marks, longest first so UTF-32 LE isn't mistaken for UTF-16 LE
+_BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+]
+
+# bytes sniffed for NULs when there's no byte order mark
+_SNIFF_BYTES = 4096
+
+
+def detect_encoding(data) -> tuple[str | None, int]:
+    """
+    Detects the encoding of a file's bytes from a byte order mark or, without one, from NUL bytes in
+    every other position of the first few KB (UTF-16 without a BOM).
+
+    :param data: The file's bytes (bytes or mmap).
+    :return: The encoding, or None if the bytes should be decoded as UTF-8 with a latin-1 fallback,
+             and the length of the byte order mark to skip.
+    """
+    head = bytes(data[:4])
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding, len(bom)
+
+    sample = bytes(data[:_SNIFF_BYTES])
+    if len(sample) >= 2 and b'\x00' in sample:
+        half = len(sample) // 2
+        even_nuls = sample[0::2].count(0)
+        odd_nuls = sample[1::2].count(0)
+        if odd_nuls > half * 0.9 and even_nuls < half * 0.1:
+            return 'utf-16-le', 0
+        if even_nuls > half * 0.9 and odd_nuls < half * 0.1:
+            return 'utf-16-be', 0
+    return None, 0
+
+
+def decode_bytes(data) -> str:
+    """
+    Decodes a file's bytes in a single pass, normalizing newlines like Python's text mode does.
+    Bytes that aren't valid UTF-8 are decoded as latin-1, which accepts anything.
+    """
+    encoding, skip = detect_encoding(data)
+    view = memoryview(data)[skip:]
+    try:
+        text = str(view, encoding or 'utf-8')
+    except UnicodeDecodeError:
+        text = str(view, 'latin-1')
+    finally:
+        view.release()
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+
+class FileCache:
+    """
+    Reads and decodes text files, keeping the most recently read files in memory.
+
+    Entries are keyed by path and validated against the file's modification time and size, so a
+    changed file is read again while repeated reads of an unchanged one only cost a stat().
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024):
+        """
+        :param max_entries: Maximum number of files kept.
+        :param max_bytes: Maximum total size of the files kept; larger files are never cached.
+        """
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[int, int, str]] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def read(self, path: str) -> str | None:
+        """
+        Returns the decoded contents of a file.
+
+        :param path: The path to the file.
+        :return: The contents, or None if the file doesn't exist or can't be read.
+        """
+        key = os.path.abspath(path)
+        try:
+            stat = os.stat(key)
+        except OSError:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        try:
+            with open(key, 'rb') as f:
+                if stat.st_size >= MMAP_THRESHOLD:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                        text = decode_bytes(mapped)
+                else:
+                    text = decode_bytes(f.read())
+        except (OSError, ValueError) as e:
+            print(f"Unable to read {path}: {e}")
+            return None
+
+        if stat.st_size <= self._max_bytes:
+            with self._lock:
+                old = self._entries.pop(key, None)
+                if old:
+                    self._size -= old[1]
+                self._entries[key] = (stat.st_mtime_ns, stat.st_size, text)
+                self._size += stat.st_size
+                while len(self._entries) > self._max_entries or self._size > self._max_bytes:
+                    _, (_, size, _) = self._entries.popitem(last=False)
+                    self._size -= size
+        return text
+
+    def invalidate(self, path: str) -> None:
+        """Drops a file from the cache, e.g. after writing it."""
+        with self._lock:
+            entry = self._entries.pop(os.path.abspath(path), None)
+            if entry:
+                self._size -= entry[1]
+
+
+# cache shared by every reader of files in the workspace
+file_cache = FileCache()
@@ -0,0 +1,230 @@
+import os
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+
+from utils.file_cache import decode_bytes
+
+# bytes sniffed to decide whether a file is binary
+_SNIFF_BYTES = 8192
+
+# control characters that don't appear in text files
+_BINARY_BYTES = bytes(set(range(32)) - {7, 8, 9, 10, 12, 13, 27})
+
+TRUNCATED_MARKER = "\n... [truncated]\n"
+
+
+def is_binary(sample: bytes) -> bool:
+    """
+    Returns True if the first bytes of a file look binary: NUL bytes (unless it's UTF-16 text), or more
+    than 10% control characters that text doesn't contain.
+    """
+    if not sample:
+        return False
+    if sample.startswith((b'\xff\xfe', b'\xfe\xff')):
+        return False
+    if b'\x00' in sample:
+        return True
+    return len(sample.translate(None, _BINARY_BYTES)) < len(sample) * 0.9
+
+
+def _cut_utf8(data: bytes, limit: int) -> bytes:
+    """Cuts bytes to at most limit without splitting a UTF-8 character in two."""
+    data = data[:limit]
+    i = len(data) - 1
+    while i >= 0 and len(data) - i <= 4 and data[i] & 0xC0 == 0x80:
+        i -= 1
+    if i >= 0 and data[i] >= 0xC0:
+        data = data[:i]
+    return data
+
+
+def _translate_pattern(pattern: str) -> str:
+    """Translates a gitignore glob to a regular expression (without anchors)."""
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            regex += '(?:.*/)?'
+            i += 3
+        elif pattern.startswith('/**', i) and i + 3 == len(pattern):
+            regex += '/.*'
+            i += 3
+        elif pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+        elif pattern[i] == '*':
+            regex += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            regex += '[^/]'
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 1:]:
+            end = pattern.index(']', i + 1)
+            regex += '[' + pattern[i + 1:end].replace('!', '^', 1) + ']'
+            i = end + 1
+        elif pattern[i] == '\\' and i + 1 < len(pattern):
+            regex += re.escape(pattern[i + 1])
+            i += 2
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return regex
+
+
+class GitIgnore:
+    """
+    The rules of the .gitignore files of a directory tree.  Rules of a .gitignore apply to paths under
+    its directory, deeper files override shallower ones and the last matching rule wins.
+    """
+
+    def __init__(self):
+        self._rules: dict[str, list[tuple[re.Pattern, bool, bool]]] = {}
+
+    def load(self, directory: str, relative_dir: str) -> None:
+        """
+        Reads the .gitignore of a directory, if it has one.
+
+        :param directory: The directory's path.
+        :param relative_dir: The directory relative to the tree's root ('' for the root).
+        """
+        try:
+            with open(os.path.join(directory, '.gitignore'), 'r', encoding='utf-8', errors='replace') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return
+
+        rules = []
+        for line in lines:
+            line = line.rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            if not line:
+                continue
+            # a slash anywhere but the end anchors the pattern to the .gitignore's directory
+            if '/' in line:
+                regex = '^' + _translate_pattern(line.lstrip('/')) + '$'
+            else:
+                regex = '(?:^|/)' + _translate_pattern(line) + '$'
+            rules.append((re.compile(regex), negate, dir_only))
+        if rules:
+            self._rules[relative_dir] = rules
+
+    def ignored(self, relative_path: str, is_dir: bool) -> bool:
+        """
+        Returns True if a path, relative to the tree's root and with '/' separators, is ignored.
+        """
+        result = False
+        parts = relative_path.split('/')
+        for depth in range(len(parts)):
+            base = '/'.join(parts[:depth])
+            rules = self._rules.get(base)
+            if not rules:
+                continue
+            path = '/'.join(parts[depth:])
+            for regex, negate, dir_only in rules:
+                if dir_only and not is_dir:
+                    continue
+                if regex.search(path):
+                    result = not negate
+        return result
+
+
+def iter_directory_files(directory: str, exclude_dirs: list[str] | None = None,
+                         exclude_extensions: list[str] | None = None, max_file_bytes: int = 256 * 1024,
+                         max_total_bytes: int = 4 * 1024 * 1024, max_workers: int = 8,
+                         use_gitignore: bool = True, skip_hidden: bool = False) -> Iterator[tuple[str, str]]:
+    """
+    Yields the text files of a directory tree, in a stable order, while reading ahead on a thread pool.
+
+    Binary files and files matched by .gitignore are skipped.  Files larger than
+    max_file_bytes are truncated, and once max_total_bytes have been yielded the remaining files are
+    dropped.
+
+    :param directory: The root of the tree.
+    :param exclude_dirs: Directory names to skip.
+    :param exclude_extensions: File extensions (with the dot) to skip.
+    :param max_file_bytes: Maximum bytes read from a single file.
+    :param max_total_bytes: Maximum bytes read across all files.
+    :param max_workers: Number of files read at the same time.
+    :param use_gitignore: Whether to honor .gitignore files.
+    :param skip_hidden: Whether to skip directories whose name starts with a dot.
+    :return: (path, text) pairs.
+    """
+    exclude_dirs = set(exclude_dirs or [])
+    exclude_extensions = set(exclude_extensions or [])
+    ignore = GitIgnore()
+
+    def paths() -> Iterator[str]:
+        for root, dirs, files in os.walk(directory):
+            relative_root = os.path.relpath(root, directory).replace(os.sep, '/')
+            relative_root = '' if relative_root == '.' else relative_root
+            if use_gitignore:
+                ignore.load(root, relative_root)
+
+            def relative(name: str) -> str:
+                return f"{relative_root}/{name}" if relative_root else name
+
+            dirs[:] = sorted(d for d in dirs if not (skip_hidden and d.startswith('.')) and d not in exclude_dirs
+                             and not (use_gitignore and ignore.ignored(relative(d), is_dir=True)))
+            for name in sorted(files):
+                if os.path.splitext(name)[1] in exclude_extensions:
+                    continue
+                if use_gitignore and ignore.ignored(relative(name), is_dir=False):
+                    continue
+                yield os.path.join(root, name)
+
+    def read(path: str) -> bytes | None:
+        try:
+            with open(path, 'rb') as f:
+                data = f.read(max_file_bytes + 1)
+        except OSError:
+            return None
+        return None if is_binary(data[:_SNIFF_BYTES]) else data
+
+    remaining = max_total_bytes
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        # read a bounded number of files ahead of the consumer
+        pending = deque()
+        path_iter = paths()
+        for path in path_iter:
+            pending.append((path, executor.submit(read, path)))
+            if len(pending) >= max_workers * 2:
+                break
+
+        while pending:
+            path, future = pending.popleft()
+            next_path = next(path_iter, None)
+            if next_path:
+                pending.append((next_path, executor.submit(read, next_path)))
+
+            data = future.result()
+            if data is None:
+                continue
+            limit = min(max_file_bytes, remaining)
+            truncated = len(data) > limit
+            if truncated:
+                data = _cut_utf8(data, limit)
+            remaining -= len(data)
+            text = decode_bytes(data)
+            yield path, text + TRUNCATED_MARKER if truncated else text
+            if remaining <= 0:
+                for _, future in pending:
+                    future.cancel()
+                break
+
+
+def iter_combined(directory: str, **kwargs) -> Iterator[str]:
+    """
+    Yields the text files of a directory tree, each preceded by a header with its path, ready to be
+    joined into a prompt.  Takes the same keyword arguments as iter_directory_files.
+    """
+    for path, text in iter_directory_files(directory, **kwargs):
+        yield f" [{path}] "
+        yield text
@@ -0,0 +1,185 @@
+import json
+from typing import Any, Iterable
+
+Path = tuple[str | int, ...]
+
+# marks a path element that matches any key or index
+ANY = "*"
+
+_WHITESPACE = " \t\r\n"
+
+
+class _Container:
+    """An object or array being parsed."""
+    __slots__ = ("is_object", "start", "path", "key", "index", "expect_key")
+
+    def __init__(self, is_object: bool, start: int, path: Path):
+        self.is_object = is_object
+        self.start = start
+        self.path = path
+        self.key: str | None = None
+        self.index = 0
+        self.expect_key = is_object
+
+    def child_path(self) -> Path:
+        return self.path + ((self.key,) if self.is_object else (self.index,))
+
+
+class JsonStreamParser:
+    """
+    Parses the first JSON object in text that arrives in chunks, e.g. tokens streamed by a model.
+
+    Text before the object (such as a code fence) is skipped.  Strings are tracked with their escapes,
+    so braces inside strings don't end the object early.  Values at the watched paths are reported as
+    soon as they are complete, so consumers can start on e.g. the first entries of an array while the
+    rest is still being generated.
+
+    Usage:
+        parser = JsonStreamParser(paths=[("file_structure", ANY)])
+        for chunk in chunks:
+            for path, value in parser.feed(chunk):
+                ...
+        parser.result  # the whole object, once parser.done
+    """
+
+    def __init__(self, paths: Iterable[Path] = ()):
+        """
+        :param paths: Paths of the values to report, from the top-level object: keys for objects and
+                      indices for arrays, or ANY to match any key or index.
+        """
+        self._paths = [tuple(path) for path in paths]
+        self._buffer = ""
+        self._pos = 0
+        self._start = -1
+        self._stack: list[_Container] = []
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._scalar_start = -1
+        self.done = False
+        self.text: str | None = None
+        self.result: Any = None
+
+    def _watched(self, path: Path) -> bool:
+        for pattern in self._paths:
+            if len(pattern) == len(path) and all(p == ANY or p == q for p, q in zip(pattern, path)):
+                return True
+        return False
+
+    def _value_done(self, container: _Container, path: Path, start: int, end: int, events: list) -> None:
+        """Reports a completed value of a container if it's watched."""
+        if self._watched(path):
+            try:
+                events.append((path, json.loads(self._buffer[start:end])))
+            except json.JSONDecodeError:
+                pass
+        container.expect_key = False
+
+    def _end_scalar(self, end: int, events: list) -> None:
+        if self._scalar_start >= 0:
+            container = self._stack[-1]
+            self._value_done(container, container.child_path(), self._scalar_start, end, events)
+            self._scalar_start = -1
+
+    def feed(self, text: str) -> list[tuple[Path, Any]]:
+        """
+        Parses the next chunk of text.
+
+        :param text: The chunk.
+        :return: (path, value) for each watched value completed by the chunk, in order.
+        """
+        if self.done or not text:
+            return []
+
+        self._buffer += text
+        buffer = self._buffer
+        events = []
+        i = self._pos
+        n = len(buffer)
+
+        if self._start < 0:
+            i = buffer.find("{", i)
+            if i < 0:
+                self._pos = n
+                return events
+            self._start = i
+            self._stack.append(_Container(True, i, ()))
+            i += 1
+
+        while i < n:
+            if self._in_string:
+                # jump to the next quote or backslash
+                while i < n and not self._escaped:
+                    c = buffer[i]
+                    if c == '"':
+                        break
+                    if c == "\\":
+                        self._escaped = True
+                    i += 1
+                if i >= n:
+                    break
+                if self._escaped:
+                    self._escaped = False
+                    i += 1
+                    continue
+                # closing quote
+                self._in_string = False
+                container = self._stack[-1]
+                if container.is_object and container.expect_key:
+                    try:
+                        container.key = json.loads(buffer[self._string_start:i + 1])
+                    except json.JSONDecodeError:
+                        container.key = buffer[self._string_start + 1:i]
+                else:
+                    self._value_done(container, container.child_path(), self._string_start, i + 1, events)
+                i += 1
+                continue
+
+            c = buffer[i]
+            if c == '"':
+                self._end_scalar(i, events)
+                self._in_string = True
+                self._string_start = i
+            elif c == "{" or c == "[":
+                self._end_scalar(i, events)
+                parent = self._stack[-1]
+                self._stack.append(_Container(c == "{", i, parent.child_path()))
+            elif c == "}" or c == "]":
+                self._end_scalar(i, events)
+                container = self._stack.pop()
+                if not self._stack:
+                    self._finish(i + 1)
+                    self._pos = i + 1
+                    return events
+                self._value_done(self._stack[-1], container.path, container.start, i + 1, events)
+            elif c == ",":
+                self._end_scalar(i, events)
+                container = self._stack[-1]
+                if container.is_object:
+                    container.expect_key = True
+                else:
+                    container.index += 1
+            elif c == ":":
+                self._stack[-1].expect_key = False
+            elif c in _WHITESPACE:
+                self._end_scalar(i, events)
+            elif self._scalar_start < 0:
+                # a number, true, false or null
+                self._scalar_start = i
+            i += 1
+
+        self._pos = n
+        return events
+
+    def _finish(self, end: int) -> None:
+        self.done = True
+        self.text = self._buffer[self._start:end]
+        try:
+            self.result = json.loads(self.text)
+        except json.JSONDecodeError:
+            self.result = None
+
+    @property
+    def started(self) -> bool:
+        """True once the start of the object has been seen."""
+        return self._start >= 0
@@ -0,0 +1,162 @@
+import os
+import re
+import threading
+from typing import Callable
+
+import yaml
+
+from utils.retrieval import estimate_tokens
+
+# {{ name }} marks a variable; single braces are left alone since prompts contain JSON examples
+_VARIABLE = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+
+# the fields of a prompt in prompts.yaml, in the order they're joined, and the tags they're wrapped in
+FIELD_ORDER = [
+    ('instruction', 'instruction'),
+    ('output_format', 'output_format'),
+    ('additional_instructions', 'additional_instructions'),
+    ('example_output', 'example'),
+    ('final_instruction', 'final_instruction')
+]
+
+
+class PromptTemplate:
+    """
+    A prompt compiled once into its literal text and variables, so rendering it is a single join.
+    """
+
+    def __init__(self, text: str, name: str = ""):
+        """
+        :param text: The template, with variables written as {{ name }}.
+        :param name: The name of the prompt, for error messages.
+        """
+        self.name = name
+        self.text = text
+        # literals at even positions, variable names at odd positions
+        self._parts = _VARIABLE.split(text)
+        self.variables = frozenset(self._parts[1::2])
+        self._static_text = "".join(self._parts[0::2])
+        self._tokens: dict[Callable[[str], int], int] = {}
+
+    def render(self, **variables) -> str:
+        """
+        Substitutes the variables.
+
+        :raises KeyError: If a variable of the template isn't given.
+        """
+        if not self.variables:
+            return self.text
+        missing = self.variables - variables.keys()
+        if missing:
+            raise KeyError(f"Prompt {self.name or self.text[:40]!r} is missing {', '.join(sorted(missing))}")
+        parts = self._parts[:]
+        for i in range(1, len(parts), 2):
+            parts[i] = str(variables[parts[i]])
+        return "".join(parts)
+
+    def tokens(self, counter: Callable[[str], int] = estimate_tokens) -> int:
+        """
+        Returns the number of tokens of the template's literal text, counted once per counter.
+
+        :param counter: Counts the tokens of a text, e.g. with a model's tokenizer.
+        """
+        count = self._tokens.get(counter)
+        if count is None:
+            count = self._tokens[counter] = counter(self._static_text)
+        return count
+
+
+class PromptRegistry:
+    """
+    Loads and compiles the prompts of a prompts.yaml once, and again only when the file changes.
+    """
+
+    def __init__(self, yaml_file: str = "prompts.yaml"):
+        """
+        :param yaml_file: The YAML file with a 'prompts' mapping of prompt names to their fields.
+        """
+        self._yaml_file = yaml_file
+        self._version: tuple[int, int] | None = None
+        self._prompts: dict[str, PromptTemplate] = {}
+        self._token_counters: dict[str, Callable[[str], int]] = {}
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict[str, PromptTemplate]:
+        """
+        :raises FileNotFoundError: If the prompt file doesn't exist.
+        """
+        stat = os.stat(self._yaml_file)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if version == self._version:
+                return self._prompts
+
+            with open(self._yaml_file, 'r') as file:
+                # the version of what is actually read, in case the file changed since the stat above
+                stat = os.fstat(file.fileno())
+                prompts = yaml.safe_load(file) or {}
+            version = (stat.st_mtime_ns, stat.st_size)
+
+            compiled = {}
+            for name, prompt_data in (prompts.get('prompts') or {}).items():
+                prompt_parts = []
+                for field, tag in FIELD_ORDER:
+                    if field in prompt_data:
+                        content = prompt_data[field].strip()
+                        prompt_parts.append(f"<{tag}> {content} </{tag}>")
+                compiled[name] = PromptTemplate(" ".join(prompt_parts), name=name)
+
+            self._prompts = compiled
+            self._version = version
+            return compiled
+
+    def get(self, name: str) -> PromptTemplate:
+        """
+        Returns a compiled prompt.  A prompt that doesn't exist is empty.
+
+        :param name: The name of the prompt.
+        :raises FileNotFoundError: If the prompt file doesn't exist.
+        """
+        prompt = self._load().get(name)
+        return prompt if prompt else PromptTemplate("", name=name)
+
+    def render(self, name: str, /, **variables) -> str:
+        """Renders a prompt with its variables."""
+        return self.get(name).render(**variables)
+
+    def names(self) -> list[str]:
+        return list(self._load())
+
+    def set_token_counter(self, model_name: str, counter: Callable[[str], int]) -> None:
+        """
+        Sets how the tokens of prompts sent to a model are counted, e.g. with the model's tokenizer.
+        Models without a counter use an estimate.
+        """
+        self._token_counters[model_name] = counter
+
+    def tokens(self, name: str, model_name: str | None = None) -> int:
+        """
+        Returns the number of tokens of a prompt's literal text for a model, counted once.
+
+        :param name: The name of the prompt.
+        :param model_name: The model, or None for an estimate.
+        """
+        return self.get(name).tokens(self._token_counters.get(model_name, estimate_tokens))
+
+
+_registries: dict[str, PromptRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_prompt_registry(yaml_file: str = "prompts.yaml") -> PromptRegistry:
+    """Returns the registry of a prompt file, shared by every caller."""
+    key = os.path.abspath(yaml_file)
+    with _registries_lock:
+        registry = _registries.get(key)
+        if not registry:
+            registry = _registries[key] = PromptRegistry(key)
+        return registry
+
+
+# registry of the application's prompts
+prompt_registry = get_prompt_registry()
@@ -0,0 +1,68 @@
+import functools
+import threading
+import time
+import weakref
+
+from models.base_model import BaseModel
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter that spaces out LLM calls to stay under a provider's requests-per-minute limit.
+    """
+
+    def __init__(self, requests_per_minute: int = 0):
+        """
+        :param requests_per_minute: Maximum number of calls per minute, or 0 for no limit.
+        """
+        self._interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._next_call = 0.0
+        self._lock = threading.Lock()
+        self._throttled: weakref.WeakSet = weakref.WeakSet()
+
+    def acquire(self) -> None:
+        """
+        Blocks until the next call is allowed.
+        """
+        if not self._interval:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            call_time = max(now, self._next_call)
+            self._next_call = call_time + self._interval
+
+        if call_time > now:
+            time.sleep(call_time - now)
+
+    def throttle(self, model: BaseModel) -> BaseModel:
+        """
+        Makes every message the model sends wait for the limiter, however it's sent: agents' retries
+        and follow-up requests are counted as well.  A send that calls another send of the same model
+        (e.g. send_structured_message calling send_message) is counted once.
+
+        :param model: The model; throttling it again does nothing.
+        :return: The model.
+        """
+        if not self._interval or model in self._throttled:
+            return model
+
+        local = threading.local()
+        for name in ("send_message", "send_structured_message"):
+            send = getattr(model, name)
+
+            @functools.wraps(send)
+            def throttled(*args, send=send, **kwargs):
+                depth = getattr(local, "depth", 0)
+                if not depth:
+                    self.acquire()
+                local.depth = depth + 1
+                try:
+                    return send(*args, **kwargs)
+                finally:
+                    local.depth = depth
+
+            setattr(model, name, throttled)
+
+        self._throttled.add(model)
+        return model
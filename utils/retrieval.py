@@ -0,0 +1,175 @@
+import math
+import os
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+
+from tools.file_tools import read_file
+from utils.code_chunker import CodeChunk, chunk_source
+
+# BM25 tuning parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# rough number of characters per token, used to stay within a token budget without a tokenizer
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of tokens in a piece of text.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: The estimated number of tokens.
+    """
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Splits text into lower case search terms.  Identifiers are also split into their
+    camelCase and snake_case parts so 'read_file' matches 'file' and 'readFile'.
+
+    Args:
+        text (str): The text to tokenize.
+
+    Returns:
+        list[str]: The terms.
+    """
+    terms = []
+    for word in re.findall(r'[A-Za-z_][A-Za-z0-9_]*|\d+', text):
+        lower = word.lower()
+        terms.append(lower)
+        parts = [part.lower() for part in re.findall(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+', word)]
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part != lower)
+    return terms
+
+
+@dataclass
+class IndexedChunk:
+    path: str
+    chunk: CodeChunk
+    terms: Counter = field(default_factory=Counter)
+    length: int = 0
+
+
+class ContextIndex:
+    """
+    Lexical BM25 index over chunks of files.  Files are chunked and indexed lazily the first time they
+    are searched and re-indexed only when their modification time or size changes.
+    """
+
+    def __init__(self, chunk_lines: int = 60):
+        """
+        :param chunk_lines: The preferred maximum number of lines per chunk.
+        """
+        self._chunk_lines = chunk_lines
+        self._files: dict[str, tuple[tuple[float, int], list[IndexedChunk]]] = {}
+        self._lock = threading.Lock()
+
+    def _file_chunks(self, path: str) -> list[IndexedChunk]:
+        """
+        Returns the indexed chunks of a file, (re)building them if the file changed.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return []
+
+        key = (stat.st_mtime, stat.st_size)
+        with self._lock:
+            cached = self._files.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+
+        chunks = []
+        for chunk in chunk_source(read_file(path) or "", max_lines=self._chunk_lines):
+            terms = Counter(tokenize(chunk.text))
+            chunks.append(IndexedChunk(path=path, chunk=chunk, terms=terms, length=sum(terms.values())))
+
+        with self._lock:
+            self._files[path] = (key, chunks)
+        return chunks
+
+    def search(self, query: str, paths: list[str], top_k: int = 8, token_budget: int = 4000) -> list[IndexedChunk]:
+        """
+        Returns the chunks of the given files most relevant to the query.
+
+        Args:
+            query (str): The text to search for, typically the user's instruction.
+            paths (list[str]): The files to search.
+            top_k (int): The maximum number of chunks to return.
+            token_budget (int): The maximum estimated number of tokens across the returned chunks.
+
+        Returns:
+            list[IndexedChunk]: The selected chunks, in file and line order.
+        """
+        chunks = [chunk for path in paths for chunk in self._file_chunks(path)]
+        query_terms = set(tokenize(query))
+        if not chunks:
+            return []
+
+        average_length = sum(chunk.length for chunk in chunks) / len(chunks) or 1
+        document_frequency = Counter(term for chunk in chunks for term in query_terms if term in chunk.terms)
+
+        def score(chunk: IndexedChunk) -> float:
+            total = 0.0
+            for term in query_terms:
+                frequency = chunk.terms.get(term, 0)
+                if not frequency:
+                    continue
+                idf = math.log(1 + (len(chunks) - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+                total += idf * frequency * (BM25_K1 + 1) / (
+                    frequency + BM25_K1 * (1 - BM25_B + BM25_B * chunk.length / average_length))
+            return total
+
+        scored = sorted(((score(chunk), i) for i, chunk in enumerate(chunks)), reverse=True)
+
+        selected = []
+        used_tokens = 0
+        for chunk_score, i in scored:
+            if len(selected) >= top_k:
+                break
+            if chunk_score <= 0 and selected:
+                break
+            tokens = estimate_tokens(chunks[i].chunk.text)
+            if used_tokens + tokens > token_budget:
+                continue
+            selected.append(i)
+            used_tokens += tokens
+
+        return [chunks[i] for i in sorted(selected)]
+
+
+# index shared by every caller so files are only chunked once per modification
+context_index = ContextIndex()
+
+
+def build_context(paths: list[str], query: str, token_budget: int = 4000, top_k: int = 8) -> str:
+    """
+    Builds the context for a prompt from a set of files.  If the files fit within the token budget they
+    are included whole, otherwise only the chunks most relevant to the query are included.
+
+    Args:
+        paths (list[str]): The context files.
+        query (str): The user's instruction, used to rank chunks.
+        token_budget (int): The maximum estimated number of tokens of context.
+        top_k (int): The maximum number of chunks included when the files do not fit.
+
+    Returns:
+        str: The context.
+    """
+    total_size = sum(os.path.getsize(path) for path in paths if os.path.isfile(path))
+    if total_size // CHARS_PER_TOKEN <= token_budget:
+        return "".join(f"{path} {read_file(path)} " for path in paths)
+
+    context = ""
+    for indexed in context_index.search(query, paths, top_k=top_k, token_budget=token_budget):
+        chunk = indexed.chunk
+        context += f"{indexed.path} (lines {chunk.start_line}-{chunk.end_line}) {chunk.text} "
+    return context
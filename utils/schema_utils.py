@@ -0,0 +1,193 @@
+import json
+import re
+from functools import lru_cache
+
+# Primitive rules shared by every compiled grammar (based on llama.cpp's json.gbnf)
+GBNF_PRIMITIVES = {
+    "ws": '| " " | "\\n" [ \\t]{0,20}',
+    "string": '"\\"" ( [^"\\\\\\x7F\\x00-\\x1F] | "\\\\" ( ["\\\\bfnrt/] | "u" [0-9a-fA-F]{4} ) )* "\\""',
+    "number": '"-"? ( [0-9] | [1-9] [0-9]{0,15} ) ( "." [0-9]+ )? ( [eE] [-+]? [0-9]+ )?',
+    "integer": '"-"? ( [0-9] | [1-9] [0-9]{0,15} )',
+    "boolean": '"true" | "false"',
+    "null": '"null"',
+    "value": 'object | array | string | number | boolean | null',
+    "object": '"{" ws ( string ws ":" ws value ws ( "," ws string ws ":" ws value ws )* )? "}"',
+    "array": '"[" ws ( value ws ( "," ws value ws )* )? "]"',
+}
+
+# Keywords understood by Gemini's response_schema (a subset of the OpenAPI schema object)
+GEMINI_SCHEMA_KEYS = {"type", "format", "description", "nullable", "enum", "properties", "required", "items"}
+
+
+def _gbnf_literal(value) -> str:
+    """
+    Returns a GBNF literal that matches the JSON encoding of value.
+    """
+    return json.dumps(json.dumps(value))
+
+
+class _GbnfCompiler:
+    """
+    Compiles a JSON schema into a set of GBNF rules.
+    """
+
+    def __init__(self):
+        self._rules: dict[str, str] = {}
+        self._used_primitives: set[str] = {"ws"}
+
+    def compile(self, schema: dict) -> str:
+        root = self._visit(schema, "root")
+        if root != "root":
+            self._rules["root"] = root
+
+        rules = dict(self._rules)
+        # pull in every primitive rule that is referenced, including transitive references
+        pending = list(self._used_primitives)
+        while pending:
+            name = pending.pop()
+            if name in rules:
+                continue
+            rules[name] = GBNF_PRIMITIVES[name]
+            for ref in re.findall(r'\b[a-z]+\b', re.sub(r'"(\\.|[^"\\])*"|\[(\\.|[^\]\\])*\]', '', rules[name])):
+                if ref in GBNF_PRIMITIVES and ref not in rules:
+                    pending.append(ref)
+
+        return "\n".join(f"{name} ::= {body}" for name, body in rules.items())
+
+    def _add_rule(self, name: str, body: str) -> str:
+        name = re.sub(r'[^a-zA-Z0-9-]+', '-', name).strip('-') or "rule"
+        # reuse an identical rule rather than emitting a duplicate
+        for existing, existing_body in self._rules.items():
+            if existing_body == body:
+                return existing
+
+        unique = name
+        index = 1
+        while unique in self._rules or unique in GBNF_PRIMITIVES:
+            unique = f"{name}{index}"
+            index += 1
+        self._rules[unique] = body
+        return unique
+
+    def _primitive(self, name: str) -> str:
+        self._used_primitives.add(name)
+        return name
+
+    def _visit(self, schema: dict, name: str) -> str:
+        if not isinstance(schema, dict) or not schema:
+            return self._primitive("value")
+
+        if "const" in schema:
+            return self._add_rule(name, _gbnf_literal(schema["const"]))
+
+        if "enum" in schema:
+            return self._add_rule(name, " | ".join(_gbnf_literal(value) for value in schema["enum"]))
+
+        for keyword in ("anyOf", "oneOf"):
+            if keyword in schema:
+                options = [self._visit(option, f"{name}-{i}") for i, option in enumerate(schema[keyword])]
+                return self._add_rule(name, " | ".join(options))
+
+        schema_type = schema.get("type")
+        if isinstance(schema_type, list):
+            options = [self._visit({**schema, "type": option}, f"{name}-{option}") for option in schema_type]
+            return self._add_rule(name, " | ".join(options))
+
+        if schema_type == "object":
+            return self._visit_object(schema, name)
+        if schema_type == "array":
+            return self._visit_array(schema, name)
+        if schema_type in ("string", "number", "integer", "boolean", "null"):
+            return self._primitive(schema_type)
+
+        return self._primitive("value")
+
+    def _visit_object(self, schema: dict, name: str) -> str:
+        properties = schema.get("properties", {})
+        if not properties:
+            return self._primitive("object")
+
+        required = [prop for prop in schema.get("required", []) if prop in properties]
+        optional = [prop for prop in properties if prop not in required]
+
+        pairs = {}
+        for prop in required + optional:
+            value_rule = self._visit(properties[prop], f"{name}-{prop}")
+            pairs[prop] = f'{_gbnf_literal(prop)} ws ":" ws {value_rule} ws'
+
+        if required:
+            body = " \",\" ws ".join(pairs[prop] for prop in required)
+            body += "".join(f' ( "," ws {pairs[prop]} )?' for prop in optional)
+            return self._add_rule(name, f'"{{" ws {body} "}}"')
+
+        # no required properties: any optional property may come first
+        alternatives = []
+        for i, prop in enumerate(optional):
+            alternative = pairs[prop] + "".join(f' ( "," ws {pairs[later]} )?' for later in optional[i + 1:])
+            alternatives.append(f"( {alternative} )")
+        return self._add_rule(name, f'"{{" ws ( {" | ".join(alternatives)} )? "}}"')
+
+    def _visit_array(self, schema: dict, name: str) -> str:
+        item_rule = self._visit(schema.get("items", {}), f"{name}-item")
+        items = f'{item_rule} ws ( "," ws {item_rule} ws )*'
+        if schema.get("minItems", 0) > 0:
+            return self._add_rule(name, f'"[" ws {items} "]"')
+        return self._add_rule(name, f'"[" ws ( {items} )? "]"')
+
+
+@lru_cache(maxsize=32)
+def _compile_gbnf(schema_json: str) -> str:
+    return _GbnfCompiler().compile(json.loads(schema_json))
+
+
+def schema_to_gbnf(schema: dict) -> str:
+    """
+    Compiles a JSON schema into a llama.cpp GBNF grammar so local models can only produce valid output.
+
+    Args:
+        schema (dict): The JSON schema describing the expected output.
+
+    Returns:
+        str: The GBNF grammar with a 'root' rule matching the schema.
+    """
+    return _compile_gbnf(json.dumps(schema, sort_keys=True))
+
+
+def schema_to_gemini(schema: dict) -> dict:
+    """
+    Converts a JSON schema into the subset accepted by Gemini's response_schema.
+
+    Args:
+        schema (dict): The JSON schema describing the expected output.
+
+    Returns:
+        dict: A copy of the schema with unsupported keywords removed.
+    """
+    if not isinstance(schema, dict):
+        return schema
+
+    converted = {}
+    for key, value in schema.items():
+        if key not in GEMINI_SCHEMA_KEYS:
+            continue
+        if key == "properties":
+            converted[key] = {prop: schema_to_gemini(sub_schema) for prop, sub_schema in value.items()}
+        elif key == "items":
+            converted[key] = schema_to_gemini(value)
+        else:
+            converted[key] = value
+
+    return converted
+
+
+def schema_to_tool_input(schema: dict) -> dict:
+    """
+    Converts a JSON schema into an input_schema for a forced Anthropic tool call.
+
+    Args:
+        schema (dict): The JSON schema describing the expected output.
+
+    Returns:
+        dict: A copy of the schema without the top level '$schema' keyword.
+    """
+    return {key: value for key, value in schema.items() if key != "$schema"}
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+import zlib
+
+
+def atomic_write(path: str, data: bytes) -> None:
+    """
+    Writes a file by writing a temporary file next to it and renaming it into place, so readers never
+    see a partially written file.  The permissions of the file being replaced are kept.
+
+    :param path: The file to write.
+    :param data: The new contents.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        try:
+            os.chmod(temp_path, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            pass
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class SnapshotStore:
+    """
+    Keeps earlier versions of files so edits can be undone.
+
+    Each version is stored once, compressed and named by the SHA-256 of its contents, so saving a
+    version that already exists (e.g. after reverting an edit) costs nothing.  Every file has an
+    append-only history of the versions it had.
+    """
+
+    def __init__(self, root: str = ".snapshots"):
+        """
+        :param root: The directory the snapshots are kept in.
+        """
+        self._root = root
+        self._lock = threading.Lock()
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self._root, "objects", digest[:2], digest[2:])
+
+    def _history_path(self, path: str) -> str:
+        key = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()
+        return os.path.join(self._root, "history", f"{key}.jsonl")
+
+    def store(self, data: bytes) -> str:
+        """
+        Stores contents, if not already stored.
+
+        :return: The digest identifying the contents.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            atomic_write(object_path, zlib.compress(data))
+        return digest
+
+    def load(self, digest: str) -> bytes:
+        """
+        Returns stored contents.
+
+        :raises FileNotFoundError: If no contents with that digest are stored.
+        """
+        with open(self._object_path(digest), 'rb') as f:
+            return zlib.decompress(f.read())
+
+    def snapshot(self, path: str) -> str | None:
+        """
+        Records the current version of a file in its history.
+
+        :param path: The file to snapshot.
+        :return: The digest of the version, or None if the file doesn't exist.
+        """
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        digest = self.store(data)
+        with self._lock:
+            history = self.history(path)
+            if history and history[0]['digest'] == digest:
+                return digest
+            history_path = self._history_path(path)
+            os.makedirs(os.path.dirname(history_path), exist_ok=True)
+            with open(history_path, 'a') as f:
+                f.write(json.dumps({'path': os.path.abspath(path), 'digest': digest,
+                                    'size': len(data), 'time': time.time()}) + "\n")
+        return digest
+
+    def history(self, path: str) -> list[dict]:
+        """
+        Returns the recorded versions of a file, newest first.
+
+        :param path: The file.
+        :return: Entries with 'digest', 'size' and 'time' (seconds since the epoch).
+        """
+        try:
+            with open(self._history_path(path), 'r') as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+        return entries[::-1]
+
+    def restore(self, path: str, version: str | int = 0) -> bool:
+        """
+        Restores an earlier version of a file.  The current version is recorded first, so a restore can
+        itself be undone.
+
+        :param path: The file to restore.
+        :param version: A digest from history(), or an index into it (0 is the latest recorded version).
+        :return: True if the version was found and restored.
+        """
+        history = self.history(path)
+        if isinstance(version, int):
+            if not 0 <= version < len(history):
+                return False
+            digest = history[version]['digest']
+        else:
+            digest = next((entry['digest'] for entry in history if entry['digest'].startswith(version)), None)
+            if not digest:
+                return False
+
+        try:
+            data = self.load(digest)
+        except FileNotFoundError:
+            print(f"Snapshot {digest} of {path} is missing")
+            return False
+
+        self.snapshot(path)
+        atomic_write(path, data)
+        return True
+
+
+# store shared by every file write
+snapshot_store = SnapshotStore()
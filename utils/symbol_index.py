@@ -0,0 +1,316 @@
+import ast
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.retrieval import estimate_tokens
+
+# directories never indexed
+EXCLUDE_DIRS = {"__pycache__", "node_modules", "venv", ".venv", "env", "local_models", "conversations"}
+
+# below this many changed files, parsing in worker processes costs more than it saves
+PARALLEL_THRESHOLD = 64
+
+
+def _signature(node: ast.AST) -> str:
+    """
+    Returns a one line signature for a function or class definition.
+    """
+    if isinstance(node, ast.ClassDef):
+        bases = ", ".join(ast.unparse(base) for base in node.bases)
+        return f"class {node.name}({bases})" if bases else f"class {node.name}"
+
+    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+    returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+    return f"{prefix} {node.name}({ast.unparse(node.args)}){returns}"
+
+
+def parse_symbols(source: str) -> dict:
+    """
+    Extracts the definitions, imports and referenced names of a Python module.
+
+    Args:
+        source (str): The source code of the module.
+
+    Returns:
+        dict: 'definitions' (name, qualname, kind, signature and line range), 'imports' (module, name, alias)
+              and 'references' (names called, subclassed or used in annotations).
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return {"definitions": [], "imports": [], "references": []}
+
+    definitions = []
+
+    def visit(body: list[ast.stmt], prefix: str = "") -> None:
+        for node in body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                start = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+                definitions.append({
+                    "name": node.name,
+                    "qualname": f"{prefix}{node.name}",
+                    "kind": "class" if isinstance(node, ast.ClassDef) else "function",
+                    "signature": _signature(node),
+                    "lineno": start,
+                    "end_lineno": node.end_lineno,
+                })
+                if isinstance(node, ast.ClassDef):
+                    visit(node.body, prefix=f"{prefix}{node.name}.")
+
+    visit(tree.body)
+
+    imports = []
+    references = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imports.extend({"module": alias.name, "name": "", "alias": alias.asname or alias.name}
+                           for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            imports.extend({"module": node.module or "", "name": alias.name, "alias": alias.asname or alias.name}
+                           for alias in node.names)
+        elif isinstance(node, ast.Call):
+            if isinstance(node.func, ast.Name):
+                references.add(node.func.id)
+            elif isinstance(node.func, ast.Attribute):
+                references.add(node.func.attr)
+        elif isinstance(node, ast.ClassDef):
+            references.update(base.id for base in node.bases if isinstance(base, ast.Name))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.returns is not None:
+            references.update(name.id for name in ast.walk(node.returns) if isinstance(name, ast.Name))
+        elif isinstance(node, (ast.arg, ast.AnnAssign)) and node.annotation is not None:
+            references.update(name.id for name in ast.walk(node.annotation) if isinstance(name, ast.Name))
+
+    return {"definitions": definitions, "imports": imports, "references": sorted(references)}
+
+
+def _index_file(args: tuple[str, str]) -> tuple[str, dict | None]:
+    """
+    Parses a file for the index, skipping the parse if its content hash is unchanged.
+
+    :param args: The file path and the content hash recorded for it, if any.
+    :return: The path and its index entry, or None if the content has not changed.
+    """
+    path, previous_hash = args
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return path, {}
+
+    content_hash = hashlib.sha1(data).hexdigest()
+    if content_hash == previous_hash:
+        return path, None
+
+    entry = parse_symbols(data.decode('utf-8', errors='replace'))
+    entry["hash"] = content_hash
+    return path, entry
+
+
+class SymbolIndex:
+    """
+    Persistent index of the definitions, imports and references of the Python files under a directory.
+
+    The index is stored in a JSON file and refreshed incrementally: only files whose modification time
+    or size changed are re-read, only files whose content changed are re-parsed, and large refreshes are
+    parsed in parallel across processes.  Lookups for prompt context refresh it at most once every
+    refresh_interval seconds, so they don't walk the directory on every call.
+    """
+
+    def __init__(self, root: str, index_file: str | None = None, refresh_interval: float = 5.0):
+        """
+        :param root: The directory to index.
+        :param index_file: Where to store the index, defaults to '.symbol_index.json' under root.
+        :param refresh_interval: Seconds for which context_for trusts the index without refreshing it.
+        """
+        self._root = os.path.abspath(root)
+        self._index_file = index_file or os.path.join(self._root, ".symbol_index.json")
+        self._files: dict[str, dict] = {}
+        self._by_name: dict[str, list[tuple[str, dict]]] = {}
+        self._lock = threading.Lock()
+        self._refresh_interval = refresh_interval
+        self._refreshed_at: float | None = None
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self._index_file, 'r') as f:
+                self._files = json.load(f).get("files", {})
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._files = {}
+        self._rebuild_lookup()
+
+    def _save(self) -> None:
+        temp_path = f"{self._index_file}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump({"root": self._root, "files": self._files}, f)
+            os.replace(temp_path, self._index_file)
+        except OSError as e:
+            print(f"Unable to save symbol index: {e}")
+
+    def _rebuild_lookup(self) -> None:
+        by_name: dict[str, list[tuple[str, dict]]] = {}
+        for path, entry in self._files.items():
+            for definition in entry.get("definitions", []):
+                by_name.setdefault(definition["name"], []).append((path, definition))
+        self._by_name = by_name
+
+    def _python_files(self) -> dict[str, os.stat_result]:
+        files = {}
+        for root, dirs, filenames in os.walk(self._root):
+            dirs[:] = [d for d in dirs if not d.startswith('.') and d not in EXCLUDE_DIRS]
+            for filename in filenames:
+                if filename.endswith(".py"):
+                    path = os.path.join(root, filename)
+                    try:
+                        files[path] = os.stat(path)
+                    except OSError:
+                        continue
+        return files
+
+    def refresh(self) -> int:
+        """
+        Brings the index up to date with the files on disk.
+
+        :return: The number of files that were re-parsed.
+        """
+        with self._lock:
+            self._refreshed_at = time.monotonic()
+            current = self._python_files()
+            changed = []
+            for path, stat in current.items():
+                entry = self._files.get(path)
+                if not entry or entry.get("mtime") != stat.st_mtime or entry.get("size") != stat.st_size:
+                    changed.append((path, entry.get("hash") if entry else None))
+
+            removed = [path for path in self._files if path not in current]
+            for path in removed:
+                del self._files[path]
+
+            if len(changed) >= PARALLEL_THRESHOLD:
+                # spawned, not forked: forking the threaded server would copy its locks in whatever state
+                # other threads hold them
+                with ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn")) as executor:
+                    results = list(executor.map(_index_file, changed, chunksize=32))
+            else:
+                results = [_index_file(args) for args in changed]
+
+            parsed = 0
+            for path, entry in results:
+                stat = current[path]
+                if entry is None:
+                    entry = self._files[path]
+                else:
+                    parsed += 1
+                entry["mtime"] = stat.st_mtime
+                entry["size"] = stat.st_size
+                self._files[path] = entry
+
+            if changed or removed:
+                self._rebuild_lookup()
+                self._save()
+
+            return parsed
+
+    def refresh_if_stale(self) -> int:
+        """
+        Refreshes the index unless it was refreshed less than refresh_interval seconds ago.
+
+        :return: The number of files that were re-parsed.
+        """
+        refreshed_at = self._refreshed_at
+        if refreshed_at is not None and time.monotonic() - refreshed_at < self._refresh_interval:
+            return 0
+        return self.refresh()
+
+    def find_definitions(self, name: str) -> list[tuple[str, dict]]:
+        """
+        Returns every definition of a name as (path, definition) pairs.
+        """
+        return list(self._by_name.get(name, []))
+
+    def _module_path(self, module: str) -> str:
+        return os.path.join(self._root, *module.split(".")) + ".py"
+
+    def resolve_references(self, source: str, exclude_path: str | None = None) -> list[tuple[str, dict]]:
+        """
+        Resolves the names a piece of source code imports or references to their definitions.
+
+        Imported names are resolved to the module they are imported from when it is indexed;
+        other referenced names are resolved only when the definition is unambiguous.
+
+        :param source: The source code to resolve references for.
+        :param exclude_path: A file whose own definitions should be ignored, typically the source's file.
+        :return: The referenced (path, definition) pairs, imports first.
+        """
+        symbols = parse_symbols(source)
+        exclude_path = os.path.abspath(exclude_path) if exclude_path else None
+        resolved = []
+        seen = set()
+
+        def add(path: str, definition: dict) -> None:
+            key = (path, definition["qualname"])
+            if path != exclude_path and key not in seen:
+                seen.add(key)
+                resolved.append((path, definition))
+
+        imported = set()
+        for item in symbols["imports"]:
+            if not item["name"]:
+                continue
+            imported.add(item["alias"])
+            module_path = self._module_path(item["module"])
+            matches = [(path, definition) for path, definition in self.find_definitions(item["name"])
+                       if path == module_path] or self.find_definitions(item["name"])[:1]
+            for path, definition in matches:
+                add(path, definition)
+
+        for name in symbols["references"]:
+            if name in imported:
+                continue
+            matches = [(path, definition) for path, definition in self.find_definitions(name)
+                       if "." not in definition["qualname"] or definition["kind"] == "class"]
+            if len(matches) == 1:
+                add(*matches[0])
+
+        return resolved
+
+    def context_for(self, source: str, exclude_path: str | None = None, token_budget: int = 2000) -> str:
+        """
+        Builds prompt context holding the definitions referenced by a piece of source code.
+        Definitions are included whole while they fit the budget, then only by signature.
+
+        :param source: The source code that needs context.
+        :param exclude_path: The file the source belongs to, if any.
+        :param token_budget: The maximum estimated number of tokens of context.
+        :return: The context.
+        """
+        self.refresh_if_stale()
+
+        context = ""
+        used_tokens = 0
+        file_lines: dict[str, list[str]] = {}
+        for path, definition in self.resolve_references(source, exclude_path=exclude_path):
+            if path not in file_lines:
+                try:
+                    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                        file_lines[path] = f.readlines()
+                except OSError:
+                    file_lines[path] = []
+
+            relative_path = os.path.relpath(path, self._root)
+            body = "".join(file_lines[path][definition["lineno"] - 1:definition["end_lineno"]])
+            text = f"{relative_path} (lines {definition['lineno']}-{definition['end_lineno']}) {body} "
+            if used_tokens + estimate_tokens(text) > token_budget:
+                text = f"{relative_path}: {definition['signature']} "
+                if used_tokens + estimate_tokens(text) > token_budget:
+                    break
+            context += text
+            used_tokens += estimate_tokens(text)
+
+        return context
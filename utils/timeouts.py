@@ -0,0 +1,73 @@
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable
+
+
+class TimeoutHandle:
+    """
+    Handle for a scheduled timeout that can be cancelled before it fires.
+    """
+
+    def __init__(self, deadline: float, callback: Callable[[], None]):
+        self.deadline = deadline
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+class TimeoutScheduler:
+    """
+    Runs callbacks after a delay using a single background thread, however many timeouts are pending.
+    """
+
+    def __init__(self):
+        self._heap: list[tuple[float, int, TimeoutHandle]] = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    def schedule(self, delay: float, callback: Callable[[], None]) -> TimeoutHandle:
+        """
+        Schedules a callback to run after a delay.
+
+        :param delay: The delay in seconds.
+        :param callback: The function to call when the delay expires.
+        :return: A handle that can be used to cancel the timeout.
+        """
+        handle = TimeoutHandle(time.monotonic() + delay, callback)
+        with self._condition:
+            heapq.heappush(self._heap, (handle.deadline, next(self._counter), handle))
+            if not self._thread:
+                self._thread = threading.Thread(target=self._run, name="timeout-scheduler", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return handle
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                # drop cancelled timeouts so they don't hold the thread awake
+                while self._heap and self._heap[0][2].cancelled:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                delay = self._heap[0][0] - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(timeout=delay)
+                    continue
+                _, _, handle = heapq.heappop(self._heap)
+
+            if not handle.cancelled:
+                try:
+                    handle.callback()
+                except Exception as e:
+                    print(f"Timeout callback failed: {e}")
+
+
+# scheduler shared by every waiting agent
+timeout_scheduler = TimeoutScheduler()
@@ -0,0 +1,226 @@
+import argparse
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from utils.retrieval import estimate_tokens
+
+
+class Span:
+    """
+    A timed operation.  Extra details, such as token counts or cache hits, go in args.
+    """
+
+    def __init__(self, span_id: int, parent_id: int | None, name: str, category: str, args: dict):
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = time.perf_counter()
+        self.end: float | None = None
+        self.thread_id = threading.get_ident()
+
+
+class Tracer:
+    """
+    Records nested spans (workflow -> step -> agent -> model -> tool) and exports them in Chrome's
+    trace event format, which chrome://tracing and Perfetto can open.
+
+    Spans nest under the span that is open on the same thread.  Work handed to another thread can
+    nest under the span that submitted it by passing that span's id as parent.  While disabled,
+    spans cost no more than a function call.
+    """
+
+    def __init__(self, max_spans: int = 100000):
+        """
+        :param max_spans: Maximum number of finished spans kept; older spans are dropped first.
+        """
+        self.enabled = False
+        self._max_spans = max_spans
+        self._spans: list[Span] = []
+        self._ids = itertools.count(1)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def _stack(self) -> list[Span]:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def current(self) -> int | None:
+        """The id of the span open on this thread, to pass as parent to work run on other threads."""
+        stack = self._stack() if self.enabled else None
+        return stack[-1].span_id if stack else None
+
+    @contextmanager
+    def span(self, name: str, category: str, parent: int | None = None, **args):
+        """
+        Times the body of a with block as a span.
+
+        :param name: The span name, e.g. "step 3".
+        :param category: One of workflow, step, agent, model or tool.
+        :param parent: The id of the parent span if it's open on another thread.
+        :param args: Details recorded with the span.
+        """
+        if not self.enabled:
+            yield None
+            return
+
+        stack = self._stack()
+        parent_id = stack[-1].span_id if stack else parent
+        span = Span(next(self._ids), parent_id, name, category, args)
+        stack.append(span)
+        try:
+            yield span
+        finally:
+            span.end = time.perf_counter()
+            stack.pop()
+            with self._lock:
+                self._spans.append(span)
+                if len(self._spans) > self._max_spans:
+                    del self._spans[:len(self._spans) - self._max_spans]
+
+    def current_span(self) -> Span | None:
+        """The innermost span open on this thread."""
+        stack = self._stack() if self.enabled else None
+        return stack[-1] if stack else None
+
+    def annotate(self, **args) -> None:
+        """Adds details to the span open on this thread."""
+        stack = self._stack() if self.enabled else None
+        if stack:
+            stack[-1].args.update(args)
+
+    def events(self) -> list[dict]:
+        """Returns the finished spans as Chrome trace events."""
+        with self._lock:
+            spans = list(self._spans)
+        return [{
+            'name': span.name,
+            'cat': span.category,
+            'ph': 'X',
+            'ts': round((span.start - self._origin) * 1e6),
+            'dur': round((span.end - span.start) * 1e6),
+            'pid': os.getpid(),
+            'tid': span.thread_id,
+            'args': {**span.args, 'span_id': span.span_id, 'parent_id': span.parent_id}
+        } for span in spans]
+
+    def export(self, path: str) -> None:
+        """
+        Writes the finished spans to a trace file.
+
+        :param path: The trace file to write.
+        """
+        if not self.enabled:
+            return
+        try:
+            with open(path, 'w') as f:
+                json.dump({'traceEvents': self.events(), 'displayTimeUnit': 'ms'}, f, default=str)
+        except OSError as e:
+            print(f"Unable to write trace {path}: {e}")
+
+
+# tracer shared by the workflow controller, agents and models
+tracer = Tracer()
+
+
+def trace_model_call(func):
+    """
+    Decorates a model's send method so each call is recorded as a model span with its prompt and
+    completion token counts: the counts the provider reported through record_usage, or estimates.
+    A send that calls another decorated send (e.g. send_structured_message calling send_message) is
+    recorded once, by the outer one.
+    """
+    @functools.wraps(func)
+    def wrapper(self, contents, *args, **kwargs):
+        current = tracer.current_span()
+        if not tracer.enabled or (current and current.category == "model"):
+            return func(self, contents, *args, **kwargs)
+        with tracer.span(f"{self.model_name}.{func.__name__}", "model",
+                         prompt_tokens=estimate_tokens(str(contents)), estimated_tokens=True) as span:
+            response = func(self, contents, *args, **kwargs)
+            if span.args["estimated_tokens"]:
+                span.args["completion_tokens"] = estimate_tokens(str(response or ""))
+            return response
+    return wrapper
+
+
+def record_usage(prompt_tokens: int, completion_tokens: int) -> None:
+    """
+    Records the token counts a provider reported for a request of the model call open on this thread,
+    replacing the estimates.  The counts of several requests made by one call add up.
+    """
+    span = tracer.current_span()
+    if not span or span.category != "model":
+        return
+    if span.args.get("estimated_tokens"):
+        span.args.update(prompt_tokens=0, completion_tokens=0, estimated_tokens=False)
+    span.args["prompt_tokens"] += prompt_tokens or 0
+    span.args["completion_tokens"] += completion_tokens or 0
+
+
+def critical_path(events: list[dict]) -> list[dict]:
+    """
+    Returns the chain of spans that determined how long the run took: starting from the longest root
+    span (a run paused for user input has one root per resumption), repeatedly the child that ended last.
+    """
+    children: dict = {}
+    roots = []
+    for event in events:
+        parent_id = event['args'].get('parent_id')
+        if parent_id is None:
+            roots.append(event)
+        else:
+            children.setdefault(parent_id, []).append(event)
+
+    if not roots:
+        return []
+    path = [max(roots, key=lambda e: e['dur'])]
+    candidates = children.get(path[0]['args']['span_id'], [])
+    while candidates:
+        event = max(candidates, key=lambda e: e['ts'] + e['dur'])
+        path.append(event)
+        candidates = children.get(event['args']['span_id'], [])
+    return path
+
+
+def print_report(events: list[dict], top: int = 10) -> None:
+    """Prints the critical path and the slowest steps of a trace."""
+    print("Critical path:")
+    for depth, event in enumerate(critical_path(events)):
+        print(f"  {'  ' * depth}{event['name']} [{event['cat']}] {event['dur'] / 1000:.1f} ms")
+
+    steps = sorted((e for e in events if e['cat'] == 'step'), key=lambda e: e['dur'], reverse=True)
+    print("\nSlowest steps:")
+    for event in steps[:top]:
+        cached = " (cached)" if event['args'].get('cache_hit') else ""
+        print(f"  {event['name']}: {event['dur'] / 1000:.1f} ms{cached}")
+
+    models = [e for e in events if e['cat'] == 'model']
+    if models:
+        prompt_tokens = sum(e['args'].get('prompt_tokens', 0) for e in models)
+        completion_tokens = sum(e['args'].get('completion_tokens', 0) for e in models)
+        approx = "~" if any(e['args'].get('estimated_tokens', True) for e in models) else ""
+        print(f"\nModel calls: {len(models)}, {approx}{prompt_tokens} prompt tokens, "
+              f"{approx}{completion_tokens} completion tokens, "
+              f"{sum(e['dur'] for e in models) / 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the critical path and slowest steps of a workflow trace.")
+    parser.add_argument("trace_file", help="Trace file written with --trace")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest steps to list")
+    args = parser.parse_args()
+
+    with open(args.trace_file, 'r') as f:
+        print_report(json.load(f)['traceEvents'], top=args.top)
@@ -1,6 +1,16 @@
 import json
 import re
-import yaml
+
+from utils.json_stream import JsonStreamParser
+from utils.prompt_registry import get_prompt_registry
+
+
+# a fenced code block: the opening fence with an optional language, then the code up to a line that starts
+# with the closing fence.  Whitespace after the opening fence, including blank lines and the indentation
+# of the first line of code, isn't part of the code.
+OPENING_FENCE_PATTERN = r'^\s*```(\w+)?'
+CLOSING_FENCE = '```'
+CODE_BLOCK_PATTERN = r'(?m)' + OPENING_FENCE_PATTERN + r'\s*(.*?)^' + CLOSING_FENCE
 
 
 def json_from_str(input: str) -> (bool, dict):
@@ -26,7 +36,8 @@ def json_from_str(input: str) -> (bool, dict):
 
 def extract_json(string) -> dict:
     """
-    Extracts the first JSON object from a string.
+    Extracts the first JSON object from a string.  Braces inside strings are ignored; use
+    utils.json_stream.JsonStreamParser to extract it while the string is still being streamed.
 
     Args:
         string (str): The string to extract JSON from.
@@ -34,35 +45,15 @@ def extract_json(string) -> dict:
     Returns:
         dict: The extracted JSON object, or None if no valid JSON object is found.
     """
-    # Find the index of the first '{'
-    start = string.find('{')
-    if start == -1:
+    parser = JsonStreamParser()
+    parser.feed(string)
+    if not parser.started:
         return None  # No JSON object found
+    if not parser.done:
+        return string[string.find('{'):]  # The object never closes
 
-    # Initialize the bracket counter and end position
-    bracket_count = 0
-    end = start
-
-    # Iterate through the string starting from the first '{'
-    for i in range(start, len(string)):
-        if string[i] == '{':
-            bracket_count += 1
-        elif string[i] == '}':
-            bracket_count -= 1
-
-        # If bracket_count is 0, we've found the end of the JSON object
-        if bracket_count == 0:
-            end = i + 1
-            break
-
-    # Extract the JSON substring
-    json_str = string[start:end]
-
-    # Attempt to parse the extracted string as JSON
-    try:
-        return json.loads(json_str)
-    except json.JSONDecodeError:
-        return json_str  # Return the raw string if it's not valid JSON
+    # Return the raw string if it's not valid JSON
+    return parser.result if parser.result is not None else parser.text
 
 
 def extract_content(text) -> str | None:
@@ -79,8 +70,7 @@ def extract_content(text) -> str | None:
     summary_str = None
 
     # Match triple backtick blocks with or without language specifier
-    backtick_pattern = r'(?m)^\s*```(\w+)?\s*(.*?)^```'
-    backtick_match = re.findall(backtick_pattern, text, re.DOTALL)
+    backtick_match = re.findall(CODE_BLOCK_PATTERN, text, re.DOTALL)
     if backtick_match:
         code_str = backtick_match[0][1]
     else:
@@ -88,25 +78,49 @@ def extract_content(text) -> str | None:
 
     return code_str
 
-def load_prompt(yaml_file: str, prompt_name: str):
-    with open(yaml_file, 'r') as file:
-        prompts = yaml.safe_load(file)
 
-    prompt_data = prompts['prompts'].get(prompt_name, {})
+def extract_summary(text) -> str | None:
+    """
+    Extracts the change summary from a <summary></summary> block.
+
+    Args:
+        text (str): The text to search in.
+
+    Returns:
+        str: The summary text, or None if no summary block is found.
+    """
+    summary_match = re.search(r'<summary>(.*?)</summary>', text, re.DOTALL | re.IGNORECASE)
+    if summary_match:
+        return summary_match.group(1).strip()
 
-    # Define the order of fields and their corresponding tags
-    field_order = [
-        ('instruction', 'instruction'),
-        ('output_format', 'output_format'),
-        ('additional_instructions', 'additional_instructions'),
-        ('example_output', 'example'),
-        ('final_instruction', 'final_instruction')
-    ]
+    return None
 
-    prompt_parts = []
-    for field, tag in field_order:
-        if field in prompt_data:
-            content = prompt_data[field].strip()
-            prompt_parts.append(f"<{tag}> {content} </{tag}>")
 
-    return " ".join(prompt_parts)
+def strip_summary(text) -> str:
+    """
+    Removes any <summary></summary> block from the text.
+
+    Args:
+        text (str): The text to clean.
+
+    Returns:
+        str: The text without the summary block.
+    """
+    return re.sub(r'<summary>.*?</summary>', '', text, flags=re.DOTALL | re.IGNORECASE).strip()
+
+def load_prompt(yaml_file: str, prompt_name: str) -> str:
+    """
+    Returns a prompt from a prompts YAML file.  The file is parsed once and again only when it changes.
+
+    Args:
+        yaml_file (str): The YAML file with the prompts.
+        prompt_name (str): The name of the prompt.
+
+    Returns:
+        str: The prompt's fields joined in order, each wrapped in its tag, or an empty string if there
+             is no such prompt.
+
+    Raises:
+        FileNotFoundError: If the YAML file doesn't exist.
+    """
+    return get_prompt_registry(yaml_file).get(prompt_name).text
@@ -0,0 +1,343 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable
+
+from agents.code_review_agent import CodeReviewAgent
+from agents.coding_agent import CodingAgent
+from tools.file_tools import read_file, write_file
+from utils.rate_limiter import RateLimiter
+from utils.tracing import tracer
+
+
+class BuildError(Exception):
+    """Raised when an agent can't produce a file."""
+    pass
+
+
+def _normalize(name: str) -> str:
+    """
+    Normalizes a component or file name so 'TaskManager', 'task_manager' and 'task-manager' compare equal.
+    """
+    return re.sub(r'[^a-z0-9]', '', name.lower())
+
+
+def map_components_to_files(architecture: dict) -> dict[str, str]:
+    """
+    Matches the components of an architecture to the files that implement them.
+
+    Components are matched by name (e.g. component 'TaskManager' -> 'task_manager.py'), falling back to
+    a mention of the component in the file's description.
+
+    :param architecture: The architecture with 'file_structure' and 'component_schema'.
+    :return: A mapping of normalized component name to file path.
+    """
+    files = [file["path"] for file in architecture.get("file_structure", [])]
+    descriptions = {file["path"]: file.get("description", "") for file in architecture.get("file_structure", [])}
+
+    component_files: dict[str, str] = {}
+    for component in architecture.get("component_schema", []):
+        name = _normalize(component.get("name", ""))
+        if not name:
+            continue
+        match = next((path for path in files
+                      if _normalize(os.path.splitext(os.path.basename(path))[0]) == name), None)
+        if not match:
+            match = next((path for path in files if component["name"] in descriptions[path]), None)
+        if match:
+            component_files[name] = match
+
+    return component_files
+
+
+def build_dependency_graph(architecture: dict) -> dict[str, set[str]]:
+    """
+    Builds a file level dependency graph from the architecture produced by SWArchitect.
+
+    A file depends on another file when one of its components lists a component of the other file
+    in 'dependencies'.
+
+    :param architecture: The architecture with 'file_structure' and 'component_schema'.
+    :return: A mapping of file path to the set of file paths it depends on.
+    """
+    graph = {file["path"]: set() for file in architecture.get("file_structure", [])}
+    component_files = map_components_to_files(architecture)
+
+    for component in architecture.get("component_schema", []):
+        path = component_files.get(_normalize(component.get("name", "")))
+        if not path:
+            continue
+        for dependency in component.get("dependencies", []) or []:
+            dependency_path = component_files.get(_normalize(dependency))
+            if dependency_path and dependency_path != path:
+                graph[path].add(dependency_path)
+
+    return graph
+
+
+def _hash(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class BuildManifest:
+    """
+    Records, per generated file, the hash of the inputs it was built from and the hash of its output,
+    so a rebuild can skip files whose inputs have not changed.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Path to the manifest file.
+        """
+        self._path = path
+        self._entries: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self._path, 'r') as f:
+                self._entries = json.load(f).get("files", {})
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._entries = {}
+
+    def save(self) -> None:
+        with self._lock:
+            data = json.dumps({"files": self._entries}, indent=2, sort_keys=True)
+            # write to a temporary file first so an interrupted build never leaves a corrupt manifest
+            temp_path = f"{self._path}.tmp"
+            with open(temp_path, 'w') as f:
+                f.write(data)
+            os.replace(temp_path, self._path)
+
+    def is_current(self, filepath: str, input_hash: str) -> bool:
+        """
+        Returns True if the file was built from the same inputs and has not changed since.
+        """
+        with self._lock:
+            entry = self._entries.get(filepath)
+        if not entry or entry.get("input_hash") != input_hash or not os.path.exists(filepath):
+            return False
+        return entry.get("output_hash") == _hash(read_file(filepath))
+
+    def record(self, filepath: str, input_hash: str, output: str) -> None:
+        with self._lock:
+            self._entries[filepath] = {"input_hash": input_hash, "output_hash": _hash(output)}
+        self.save()
+
+    def prune(self, filepaths: set[str]) -> None:
+        """
+        Drops entries for files that are no longer part of the architecture.
+        """
+        with self._lock:
+            self._entries = {path: entry for path, entry in self._entries.items() if path in filepaths}
+        self.save()
+
+
+class AppBuilder:
+    """
+    Generates and reviews the files of an architecture concurrently, respecting dependencies between files.
+
+    Each worker owns its own coding and review agents (and therefore its own conversations), so files
+    built in parallel never share chat history.  Every message the agents' models send goes through
+    the shared rate limiter.  A file that fails doesn't stop the build; its error is recorded in
+    failures, and the files depending on it, directly or not, are skipped and recorded as well.
+    """
+
+    def __init__(self,
+                 agent_factory: Callable[[], tuple[CodingAgent, CodeReviewAgent]],
+                 architecture_file: str = "architecture.txt",
+                 max_workers: int = 4,
+                 requests_per_minute: int = 0,
+                 manifest_file: str | None = ".build_manifest.json",
+                 prompts: list[str] | None = None,
+                 model_fingerprints: list[str] | None = None):
+        """
+        :param agent_factory: Callable returning a new (CodingAgent, CodeReviewAgent) pair for a worker.
+        :param architecture_file: Path to the architecture written by SWArchitect.
+        :param max_workers: Maximum number of files built at the same time.
+        :param requests_per_minute: Provider rate limit shared by all workers, or 0 for no limit.
+        :param manifest_file: Path of the build manifest used for incremental rebuilds, or None to always rebuild.
+        :param prompts: The system prompts used by the agents; changing them invalidates every file.
+        :param model_fingerprints: The BaseModel.fingerprint of each model used by the agents; changing
+            a model or its generation settings invalidates every file.
+        """
+        self._agent_factory = agent_factory
+        self._architecture_file = architecture_file
+        self._max_workers = max(1, max_workers)
+        self._rate_limiter = RateLimiter(requests_per_minute)
+        self._local = threading.local()
+        self._outputs: dict[str, str] = {}
+        self._manifest = BuildManifest(manifest_file) if manifest_file else None
+        self._fingerprint = _hash(*(model_fingerprints or []), *(prompts or []))
+        self._file_inputs: dict[str, str] = {}
+        self.failures: dict[str, str] = {}
+
+    def build(self, architecture: dict) -> dict[str, str]:
+        """
+        Builds every file in the architecture.
+
+        :param architecture: The architecture with 'file_structure' and 'component_schema'.
+        :return: A mapping of file path to its change summary, or to its error if it failed.
+        """
+        self.failures = {}
+        graph = build_dependency_graph(architecture)
+        descriptions = {file["path"]: file.get("description", "") for file in architecture.get("file_structure", [])}
+
+        # everything in the architecture that describes a file: its description and its components
+        component_files = map_components_to_files(architecture)
+        self._file_inputs = {path: description for path, description in descriptions.items()}
+        for component in architecture.get("component_schema", []):
+            path = component_files.get(_normalize(component.get("name", "")))
+            if path:
+                self._file_inputs[path] += json.dumps(component, sort_keys=True)
+
+        if self._manifest:
+            self._manifest.prune(set(graph))
+
+        with tracer.span("build", "workflow", files=len(graph)):
+            return self._run(graph, descriptions)
+
+    def _run(self, graph: dict[str, set[str]], descriptions: dict[str, str]) -> dict[str, str]:
+        remaining = {path: set(dependencies) for path, dependencies in graph.items()}
+        dependents: dict[str, set[str]] = {path: set() for path in graph}
+        for path, dependencies in graph.items():
+            for dependency in dependencies:
+                dependents[dependency].add(path)
+
+        summaries: dict[str, str] = {}
+        running: dict[Future, str] = {}
+        build_span = tracer.current()
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            def submit_ready():
+                ready = [path for path, dependencies in remaining.items() if not dependencies]
+                if not ready and not running and remaining:
+                    # a dependency cycle; break it by building the file with the fewest unmet dependencies
+                    ready = [min(remaining, key=lambda p: len(remaining[p]))]
+                    print(f"Dependency cycle detected, building {ready[0]} first")
+                for path in ready:
+                    del remaining[path]
+                    future = executor.submit(self._traced_build_file, path, descriptions[path], graph[path],
+                                             build_span)
+                    running[future] = path
+
+            def skip_dependents(failed: str):
+                pending = [failed]
+                while pending:
+                    dependency = pending.pop()
+                    for dependent in dependents[dependency]:
+                        if dependent in remaining:
+                            del remaining[dependent]
+                            summaries[dependent] = self.failures[dependent] = f"Skipped, {dependency} failed"
+                            pending.append(dependent)
+
+            submit_ready()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = running.pop(future)
+                    try:
+                        summaries[path] = future.result()
+                    except Exception as e:
+                        print(f"Building {path} failed: {e}")
+                        summaries[path] = self.failures[path] = f"{type(e).__name__}: {e}"
+                        skip_dependents(path)
+                        continue
+                    for dependent in dependents[path]:
+                        if dependent in remaining:
+                            remaining[dependent].discard(path)
+                submit_ready()
+
+        return summaries
+
+    def _agents(self) -> tuple[CodingAgent, CodeReviewAgent]:
+        """
+        Returns the agents owned by the calling worker thread, creating them on first use.
+        """
+        if not hasattr(self._local, "agents"):
+            code_agent, review_agent = self._agent_factory()
+            self._rate_limiter.throttle(code_agent.llm)
+            self._rate_limiter.throttle(review_agent.llm)
+            review_agent.rate_limiter = self._rate_limiter
+            self._local.agents = code_agent, review_agent
+        return self._local.agents
+
+    def _traced_build_file(self, filepath: str, description: str, dependencies: set[str],
+                           parent: int | None) -> str:
+        with tracer.span(f"file {filepath}", "step", parent=parent):
+            return self._build_file(filepath, description, dependencies)
+
+    def _build_file(self, filepath: str, description: str, dependencies: set[str]) -> str:
+        """
+        Writes, reviews and rewrites a single file.
+
+        :return: The summary of the final revision.
+        :raises BuildError: If the coding agent can't write the file.
+        """
+        input_hash = self._input_hash(filepath, dependencies)
+        if self._manifest and self._manifest.is_current(filepath, input_hash):
+            print(f"{filepath} is up to date")
+            tracer.annotate(cache_hit=True)
+            self._outputs[filepath] = read_file(filepath)
+            return "Up to date."
+
+        code_agent, review_agent = self._agents()
+        print(f"Building {filepath}")
+
+        # generated dependencies are passed as context so interfaces line up
+        context = " ".join(f"{path} {self._outputs[path]}" for path in sorted(dependencies) if path in self._outputs)
+
+        try:
+            # write code for this file
+            response = code_agent.run_agent(agent_input={"user_input": f"Write the code for {filepath}.",
+                                                         "prompt": description,
+                                                         "context": context,
+                                                         "architecture": self._architecture_file})
+            if "error" in response:
+                raise BuildError(response["error"])
+            write_file(filename=filepath, content=response["modified_code"])
+            code_agent.clear_chat()
+
+            # review the code
+            review_output = review_agent.run_agent(agent_input={"prompt": "",
+                                                                "architecture": self._architecture_file,
+                                                                "path": filepath})
+            summary = response["agent_summary"]
+
+            # provide feedback and write the updated code back to the file
+            if "error" not in review_output and review_output["response"]:
+                coding_prompt = f"Please make the following changes to the code: {review_output['response']}"
+                response = code_agent.run_agent(agent_input={"user_input": coding_prompt,
+                                                             "prompt": description,
+                                                             "code_to_modify": read_file(filepath),
+                                                             "path": filepath})
+                if "error" not in response:
+                    write_file(filename=filepath, content=response["modified_code"])
+                    summary = response["agent_summary"]
+        finally:
+            # cleanup
+            code_agent.clear_chat()
+            review_agent.clear_chat()
+
+        self._outputs[filepath] = read_file(filepath)
+        if self._manifest:
+            self._manifest.record(filepath, input_hash, self._outputs[filepath])
+        print(summary)
+        return summary
+
+    def _input_hash(self, filepath: str, dependencies: set[str]) -> str:
+        """
+        Returns the cache key of a file: its part of the architecture, the generated code of its
+        dependencies, and the prompts and model used to build it.
+        """
+        dependency_outputs = [f"{path}:{_hash(self._outputs[path] if path in self._outputs else read_file(path))}"
+                              for path in sorted(dependencies)]
+        return _hash(self._fingerprint, filepath, self._file_inputs.get(filepath, ""), *dependency_outputs)
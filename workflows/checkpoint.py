@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+import tempfile
+
+
+class CheckpointStore:
+    """
+    Stores workflow checkpoints as JSON files, one per run of a workflow.
+
+    Checkpoints are written to a temporary file and renamed into place so a crash mid-write never
+    leaves a truncated checkpoint, and writes are skipped when nothing changed since the last one.
+    """
+
+    def __init__(self, directory: str = "checkpoints"):
+        """
+        :param directory: The directory checkpoints are written to.
+        """
+        self._directory = directory
+        self._last_digest: dict[str, str] = {}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self._directory, f"{name}.json")
+
+    def save(self, name: str, checkpoint: dict) -> None:
+        """
+        Atomically writes a checkpoint.
+
+        :param name: The checkpoint name, typically the workflow id and run id.
+        :param checkpoint: JSON serializable checkpoint data.
+        :raises TypeError: If the checkpoint isn't JSON serializable; a checkpoint that can't be resumed
+                           from faithfully isn't written.
+        """
+        data = json.dumps(checkpoint)
+        digest = hashlib.sha1(data.encode("utf-8")).hexdigest()
+        if self._last_digest.get(name) == digest:
+            return
+
+        os.makedirs(self._directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self._directory, prefix=f".{name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            os.replace(temp_path, self._path(name))
+        except OSError as e:
+            print(f"Unable to write checkpoint {name}: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+
+        self._last_digest[name] = digest
+
+    def load(self, name: str) -> dict | None:
+        """
+        Reads a checkpoint.
+
+        :param name: The checkpoint name.
+        :return: The checkpoint data, or None if there is no readable checkpoint.
+        """
+        try:
+            with open(self._path(name), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def clear(self, name: str) -> None:
+        """
+        Removes a checkpoint once its workflow has finished.
+
+        :param name: The checkpoint name.
+        """
+        self._last_digest.pop(name, None)
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,146 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+
+def step_keys(step: dict, field: str) -> list[str]:
+    """
+    Returns the state keys a step reads ('input') or writes ('output').
+
+    'input' of a user_input step holds the prompt shown to the user rather than state keys, so the
+    keys it reads are the ones listed in 'prepend'.
+    """
+    if field == 'input' and step.get('type') == 'user_input':
+        return list(step.get('prepend', []))
+
+    keys = step.get(field, [])
+    if isinstance(keys, dict):
+        return list(keys.keys())
+    return list(keys)
+
+
+def build_step_graph(steps: list[dict]) -> dict:
+    """
+    Builds the dependency graph of a workflow's steps from their input and output keys.
+
+    A step depends on the latest earlier step that writes one of the keys it reads, and on any
+    steps listed in its optional 'depends_on'.
+
+    :param steps: The workflow steps, in the order they are declared.
+    :return: A mapping of step id to the set of step ids it depends on.
+    """
+    graph = {}
+    producers: dict[str, object] = {}
+    for step in steps:
+        dependencies = {producers[key] for key in step_keys(step, 'input') if key in producers}
+        dependencies.update(step.get('depends_on', []))
+        graph[step['id']] = dependencies
+        for key in step_keys(step, 'output'):
+            producers[key] = step['id']
+    return graph
+
+
+class DagExecutor:
+    """
+    Runs a workflow's steps as a dependency graph, executing every step whose inputs are ready
+    concurrently on a bounded thread pool.
+
+    user_input steps are asked one at a time; while one waits for the user, independent steps
+    keep running.  next_step links are ignored in this mode.
+    """
+
+    def __init__(self, controller, max_workers: int = 4):
+        """
+        :param controller: The WorkflowController whose step handlers run the steps.
+        :param max_workers: Maximum number of steps executed at the same time.
+        """
+        self._controller = controller
+        self._max_workers = max(1, max_workers)
+        self._steps: dict = {}
+        self._graph: dict = {}
+        self._completed: set = set()
+        self._pending: list = []
+        self._waiting_step: dict | None = None
+
+    def load(self, steps: list[dict]) -> None:
+        """
+        Prepares a new run of the steps.
+        """
+        self._steps = {step['id']: step for step in steps}
+        self._graph = build_step_graph(steps)
+        self.reset()
+
+    def reset(self) -> None:
+        self._completed = set()
+        self._pending = list(self._steps)
+        self._waiting_step = None
+
+    @property
+    def finished(self) -> bool:
+        return not self._pending and not self._waiting_step
+
+    def _ready(self) -> list:
+        return [step_id for step_id in self._pending if self._graph[step_id] <= self._completed]
+
+    def run(self) -> None:
+        """
+        Runs steps until the workflow finishes or every remaining step waits on user input.
+        """
+        running: dict[Future, object] = {}
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            while True:
+                for step_id in self._ready():
+                    step = self._steps[step_id]
+                    if step['type'] == 'user_input':
+                        # only one question can be put to the user at a time
+                        if self._waiting_step:
+                            continue
+                        self._pending.remove(step_id)
+                        self._waiting_step = step
+                        self._controller.handle_user_input(step)
+                    else:
+                        self._pending.remove(step_id)
+                        running[executor.submit(self._controller.run_step, step)] = step_id
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step_id = running.pop(future)
+                    future.result()
+                    self._completed.add(step_id)
+                    self._controller.save_checkpoint()
+
+        if self._pending and not self._waiting_step:
+            print(f"Workflow steps {self._pending} can never run; their inputs are not produced by any step.")
+            self._pending = []
+
+    def snapshot(self) -> dict:
+        """
+        Returns the progress of the current run for a checkpoint.
+        """
+        return {
+            'completed': list(self._completed),
+            'pending': list(self._pending),
+            'waiting_step_id': self._waiting_step['id'] if self._waiting_step else None
+        }
+
+    def restore(self, snapshot: dict) -> None:
+        """
+        Restores the progress of a run from a checkpoint.  Steps that were running when the checkpoint
+        was written are not in 'completed', so they are run again.
+        """
+        self._completed = set(snapshot.get('completed', []))
+        self._pending = [step_id for step_id in self._steps if step_id not in self._completed]
+        waiting_step_id = snapshot.get('waiting_step_id')
+        self._waiting_step = self._steps.get(waiting_step_id) if waiting_step_id is not None else None
+        if self._waiting_step:
+            self._pending.remove(waiting_step_id)
+
+    def complete_user_input(self) -> None:
+        """
+        Marks the user_input step that was waiting as complete.  The caller stores the input in the
+        state and then calls run() to continue.
+        """
+        if self._waiting_step:
+            self._completed.add(self._waiting_step['id'])
+            self._waiting_step = None
@@ -0,0 +1,214 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable
+
+from agents.base_agent import BaseAgent
+from models.base_model import BaseModel
+from utils.timeouts import timeout_scheduler
+from workflows.workflow_controller import WorkflowController
+
+
+@dataclass
+class Session:
+    """
+    Everything one client works with: its own model (and conversation), agent and workflow.  They're
+    set up by the session's first task, so they're None until then.
+    """
+    session_id: str
+    model: BaseModel | None = None
+    agent: BaseAgent | None = None
+    controller: WorkflowController | None = None
+    last_active: float = field(default_factory=time.monotonic)
+    tasks: deque = field(default_factory=deque)
+    running: bool = False  # a worker is draining the session's tasks
+    executing: bool = False  # one of the tasks is being run
+    closed: bool = False
+
+
+class SessionManager:
+    """
+    Keeps one Session per client and runs their work on a shared, bounded thread pool.
+
+    A new session is set up by its first task, so creating models and loading workflows never blocks
+    the caller, and tasks submitted meanwhile run once it's ready.  Tasks of one session run one at a
+    time and in the order they were submitted.  Submissions are rejected rather than queued without
+    limit when a session already has max_pending tasks or the whole pool has max_workers + max_queued
+    tasks, no more than max_sessions sessions are open, and sessions idle for idle_timeout seconds are
+    closed.
+    """
+
+    def __init__(self, session_setup: Callable[[Session], None], max_workers: int = 8, max_queued: int = 32,
+                 max_pending: int = 2, max_sessions: int = 32, idle_timeout: float = 1800.0):
+        """
+        :param session_setup: Sets up the model, agent and workflow of a new session.  If it raises, the
+                              session is closed and the tasks queued for it are dropped.
+        :param max_workers: Maximum number of sessions doing work at the same time.
+        :param max_queued: Maximum number of tasks waiting for a worker across all sessions.
+        :param max_pending: Maximum number of tasks queued or running for a single session.
+        :param max_sessions: Maximum number of open sessions.
+        :param idle_timeout: Seconds without activity after which a session is closed.
+        """
+        self._session_setup = session_setup
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="session")
+        self._slots = threading.BoundedSemaphore(max(1, max_workers) + max_queued)
+        self._max_pending = max(1, max_pending)
+        self._max_sessions = max(1, max_sessions)
+        self._idle_timeout = idle_timeout
+        self._sessions: dict[str, Session] = {}
+        self._lock = threading.Lock()
+        self._sweeping = False
+
+    def open(self, session_id: str) -> Session | None:
+        """
+        Returns the session of a client.  A client without one, because it just connected or its session
+        was closed for being idle, gets a new session whose setup is queued as its first task.
+
+        :return: The session, or None if max_sessions sessions are already open.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session:
+                session.last_active = time.monotonic()
+                return session
+            if len(self._sessions) >= self._max_sessions:
+                return None
+
+            session = self._sessions[session_id] = Session(session_id=session_id)
+            # the setup isn't limited by max_pending or max_queued, so a new session can always start
+            session.tasks.append((self._setup, (session,), False))
+            session.running = True
+            if not self._sweeping and self._idle_timeout:
+                self._sweeping = True
+                timeout_scheduler.schedule(self._idle_timeout / 2, self._sweep)
+
+        self._executor.submit(self._drain, session)
+        return session
+
+    def _setup(self, session: Session) -> None:
+        if session.closed:
+            return
+        try:
+            self._session_setup(session)
+        except Exception:
+            with self._lock:
+                if self._sessions.get(session.session_id) is session:
+                    del self._sessions[session.session_id]
+                session.closed = True
+                dropped = sum(counted for _, _, counted in session.tasks)
+                session.tasks.clear()
+            for _ in range(dropped):
+                self._slots.release()
+            raise
+
+    def get(self, session_id: str) -> Session | None:
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    @property
+    def session_count(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def submit(self, session_id: str, fn: Callable, *args) -> bool:
+        """
+        Queues work for a session.
+
+        :param session_id: The session the work belongs to.
+        :param fn: The function to run.
+        :param args: Arguments passed to fn.
+        :return: False if the session doesn't exist or the work was rejected because the server is busy.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if not session or session.closed:
+                return False
+            if len(session.tasks) + session.executing >= self._max_pending:
+                return False
+            if not self._slots.acquire(blocking=False):
+                return False
+
+            session.last_active = time.monotonic()
+            session.tasks.append((fn, args, True))
+            if session.running:
+                return True
+            session.running = True
+
+        self._executor.submit(self._drain, session)
+        return True
+
+    def _drain(self, session: Session) -> None:
+        """Runs a session's queued tasks in order on one worker."""
+        while True:
+            with self._lock:
+                session.executing = False
+                if not session.tasks:
+                    session.running = False
+                    closed = session.closed
+                    break
+                fn, args, counted = session.tasks.popleft()
+                session.executing = True
+
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"Session {session.session_id} task failed: {e}")
+            finally:
+                session.last_active = time.monotonic()
+                if counted:
+                    self._slots.release()
+
+        if closed:
+            self._cleanup(session)
+
+    def close(self, session_id: str) -> None:
+        """
+        Closes a session.  Work already queued for it is finished first.
+        """
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if not session:
+                return
+            session.closed = True
+            busy = session.running
+
+        if not busy:
+            self._cleanup(session)
+
+    @staticmethod
+    def _cleanup(session: Session) -> None:
+        if session.controller:
+            session.controller.exit_workflow()
+        print(f"Session {session.session_id} closed")
+
+    def evict_idle(self) -> list[str]:
+        """
+        Closes every session that has been idle for longer than idle_timeout.
+
+        :return: The ids of the closed sessions.
+        """
+        cutoff = time.monotonic() - self._idle_timeout
+        with self._lock:
+            idle = [session_id for session_id, session in self._sessions.items()
+                    if not session.running and session.last_active < cutoff]
+        for session_id in idle:
+            self.close(session_id)
+        return idle
+
+    def _sweep(self) -> None:
+        self.evict_idle()
+        with self._lock:
+            if self._sessions:
+                timeout_scheduler.schedule(self._idle_timeout / 2, self._sweep)
+            else:
+                self._sweeping = False
+
+    def shutdown(self) -> None:
+        """Closes every session and stops the worker pool."""
+        with self._lock:
+            session_ids = list(self._sessions)
+        for session_id in session_ids:
+            self.close(session_id)
+        self._executor.shutdown(wait=True)
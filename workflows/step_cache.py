@@ -0,0 +1,65 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+
+class StepCache:
+    """
+    Memoizes the outputs of workflow steps, keyed by a hash of the step definition and the inputs it reads.
+
+    Entries are kept per workflow so a workflow's cache can be evicted on its own, and each workflow
+    keeps at most max_entries results (least recently used are dropped first).
+    """
+
+    def __init__(self, max_entries: int = 128):
+        """
+        :param max_entries: Maximum number of cached step results per workflow.
+        """
+        self._max_entries = max_entries
+        self._entries: dict[str, OrderedDict[str, dict]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(step: dict, inputs: dict, files: dict | None = None, agent: str | None = None) -> str:
+        """
+        Builds the cache key of a step.
+
+        :param step: The step definition.
+        :param inputs: The state values the step reads.
+        :param files: Optional (mtime, size) of the files the step reads, so edits invalidate the entry.
+        :param agent: The fingerprint of the agent running the step, so switching models or settings
+                      invalidates the entry.
+        :return: The cache key.
+        """
+        data = json.dumps([step, inputs, files or {}, agent], sort_keys=True, default=str)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def get(self, workflow_id: str, key: str) -> dict | None:
+        """
+        Returns the cached outputs of a step, or None.
+        """
+        with self._lock:
+            entries = self._entries.get(workflow_id)
+            if not entries or key not in entries:
+                return None
+            entries.move_to_end(key)
+            return entries[key]
+
+    def put(self, workflow_id: str, key: str, outputs: dict) -> None:
+        """
+        Stores the outputs of a step.
+        """
+        with self._lock:
+            entries = self._entries.setdefault(workflow_id, OrderedDict())
+            entries[key] = outputs
+            entries.move_to_end(key)
+            while len(entries) > self._max_entries:
+                entries.popitem(last=False)
+
+    def evict(self, workflow_id: str) -> None:
+        """
+        Drops every cached result of a workflow.
+        """
+        with self._lock:
+            self._entries.pop(workflow_id, None)
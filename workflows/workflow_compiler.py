@@ -0,0 +1,193 @@
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+
+from workflows.dag_executor import step_keys
+
+STEP_TYPES = {"user_input", "agent_action", "system_action", "loop"}
+
+
+@dataclass
+class CompiledWorkflow:
+    workflow_id: str
+    definition: dict
+    steps_by_id: dict = field(default_factory=dict)
+    parent_by_id: dict = field(default_factory=dict)  # sub-step id -> id of the loop step containing it
+    errors: list[str] = field(default_factory=list)
+    warnings: list[str] = field(default_factory=list)
+    version: tuple = ()
+
+    @property
+    def valid(self) -> bool:
+        return not self.errors
+
+    @property
+    def first_step(self) -> dict | None:
+        steps = self.definition.get('steps', [])
+        return steps[0] if steps else None
+
+    def get_step(self, step_id) -> dict | None:
+        return self.steps_by_id.get(step_id)
+
+
+def _next_step_ids(step: dict) -> list:
+    next_step = step.get('next_step')
+    if isinstance(next_step, dict):
+        return [next_step.get('on_success'), next_step.get('on_failure')]
+    return [next_step] if next_step is not None else []
+
+
+def compile_workflow(workflow_id: str, definition: dict) -> CompiledWorkflow:
+    """
+    Validates a workflow definition and builds its step lookup tables.
+
+    Errors make the workflow unusable: missing or duplicate ids, unknown step types, loops without
+    'loop_over' or 'sub-steps', next_step links to steps that don't exist and inputs that no step
+    produces.  Warnings flag steps that can never be reached and steps that end the workflow implicitly.
+
+    Args:
+        workflow_id (str): The name of the workflow.
+        definition (dict): The workflow as loaded from JSON.
+
+    Returns:
+        CompiledWorkflow: The compiled workflow, with any errors and warnings.
+    """
+    compiled = CompiledWorkflow(workflow_id=workflow_id, definition=definition)
+    steps = definition.get('steps')
+    if not isinstance(steps, list) or not steps:
+        compiled.errors.append("Workflow has no steps.")
+        return compiled
+
+    # index every step and sub-step by id
+    all_steps = []
+    for step in steps:
+        all_steps.append(step)
+        if step.get('type') == 'loop':
+            for sub_step in step.get('sub-steps', []):
+                all_steps.append(sub_step)
+                if 'id' in sub_step:
+                    compiled.parent_by_id[sub_step['id']] = step.get('id')
+
+    for step in all_steps:
+        if 'id' not in step:
+            compiled.errors.append(f"Step '{step.get('description', '')}' has no id.")
+            continue
+        if step['id'] in compiled.steps_by_id:
+            compiled.errors.append(f"Duplicate step id {step['id']}.")
+        compiled.steps_by_id[step['id']] = step
+
+        if step.get('type') not in STEP_TYPES:
+            compiled.errors.append(f"Step {step['id']} has unknown type '{step.get('type')}'.")
+        elif step['type'] == 'loop':
+            if not step.get('sub-steps'):
+                compiled.errors.append(f"Loop step {step['id']} has no sub-steps.")
+            if '.' not in step.get('loop_over', ''):
+                compiled.errors.append(f"Loop step {step['id']} needs 'loop_over' in the form 'list.item'.")
+            if step.get('mode', 'sequential') == 'parallel':
+                # items of a parallel loop run unattended, so none of them can wait on the user
+                if any(sub_step.get('type') == 'user_input' for sub_step in step.get('sub-steps', [])):
+                    compiled.errors.append(f"Parallel loop step {step['id']} can't contain user_input steps.")
+                max_concurrency = step.get('max_concurrency', 1)
+                if not isinstance(max_concurrency, int) or max_concurrency < 1:
+                    compiled.errors.append(f"Loop step {step['id']} needs a positive integer max_concurrency.")
+        elif step['type'] in ('agent_action', 'system_action') and not step.get('agent'):
+            compiled.errors.append(f"Step {step['id']} has no agent.")
+
+    for step in all_steps:
+        for next_id in _next_step_ids(step):
+            if next_id not in compiled.steps_by_id:
+                compiled.errors.append(f"Step {step.get('id')} links to missing step {next_id}.")
+        # sub-steps run in order inside their loop, so only top-level steps need an explicit exit
+        if 'next_step' not in step and step.get('id') not in compiled.parent_by_id \
+                and definition.get('executor', 'sequential') != 'parallel':
+            compiled.warnings.append(f"Step {step.get('id')} has no next_step; use \"next_step\": null "
+                                     f"to end the workflow there.")
+
+    # inputs must be produced by some step (or be a loop variable)
+    produced = set()
+    for step in all_steps:
+        produced.update(step_keys(step, 'output'))
+        if step.get('type') == 'loop' and '.' in step.get('loop_over', ''):
+            produced.add(step['loop_over'].split('.')[1])
+    for step in all_steps:
+        if step.get('type') == 'loop':
+            continue
+        for key in step_keys(step, 'input'):
+            if key not in produced:
+                compiled.errors.append(f"Step {step.get('id')} reads '{key}' which no step produces.")
+
+    # reachability only applies to workflows that follow next_step links
+    if definition.get('executor', 'sequential') != 'parallel':
+        reachable = set()
+        pending = [steps[0].get('id')]
+        while pending:
+            step_id = pending.pop()
+            step = compiled.steps_by_id.get(step_id)
+            if step is None or step_id in reachable:
+                continue
+            reachable.add(step_id)
+            pending.extend(_next_step_ids(step))
+            if step.get('type') == 'loop':
+                pending.extend(sub_step.get('id') for sub_step in step.get('sub-steps', []))
+        for step_id in compiled.steps_by_id:
+            if step_id not in reachable:
+                compiled.warnings.append(f"Step {step_id} can never be reached.")
+
+    return compiled
+
+
+class WorkflowRegistry:
+    """
+    Loads, compiles and caches workflows from a directory.  A workflow is recompiled only when its
+    file changes, so edits are picked up without restarting the server.
+    """
+
+    def __init__(self, directory: str = "workflows"):
+        """
+        :param directory: The directory holding the workflow JSON files.
+        """
+        self._directory = directory
+        self._compiled: dict[str, CompiledWorkflow] = {}
+        self._lock = threading.Lock()
+
+    def get(self, workflow_id: str) -> CompiledWorkflow | None:
+        """
+        Returns the compiled workflow, recompiling it if its file changed since it was last compiled.
+
+        :param workflow_id: The name of the workflow file, without extension.
+        :return: The compiled workflow, or None if there is no such workflow.
+        """
+        path = os.path.join(self._directory, f"{workflow_id}.json")
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            compiled = self._compiled.get(workflow_id)
+        if compiled and compiled.version == version:
+            return compiled
+
+        try:
+            with open(path, 'r') as f:
+                definition = json.load(f)
+        except json.JSONDecodeError as e:
+            compiled = CompiledWorkflow(workflow_id=workflow_id, definition={}, errors=[f"Invalid JSON: {e}"])
+        else:
+            compiled = compile_workflow(workflow_id, definition)
+        compiled.version = version
+
+        for warning in compiled.warnings:
+            print(f"Workflow {workflow_id}: {warning}")
+        for error in compiled.errors:
+            print(f"Workflow {workflow_id} error: {error}")
+
+        with self._lock:
+            self._compiled[workflow_id] = compiled
+        return compiled
+
+
+# registry shared by every controller so each workflow is compiled once per change
+workflow_registry = WorkflowRegistry()
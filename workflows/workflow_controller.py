@@ -1,99 +1,464 @@
-import json
+import copy
+import os
+import re
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
 
 from agents.base_agent import BaseAgent
-from tools.file_tools import read_file, write_file
+from tools.file_tools import StreamingFileWriter, read_file, write_file
+from utils.retrieval import build_context
+from utils.tracing import tracer
+from workflows.checkpoint import CheckpointStore
+from workflows.dag_executor import DagExecutor, step_keys
+from workflows.step_cache import StepCache
+from workflows.workflow_compiler import CompiledWorkflow, workflow_registry
 
 
 class WorkflowController:
-    def __init__(self, input_provider):
+    # system tools with side effects, never served from the step cache
+    UNCACHEABLE_TOOLS = {"file_write"}
+
+    # state keys a system tool reads in addition to its declared inputs
+    SYSTEM_TOOL_READS = {"file_read": ["files_to_modify", "context_files", "user_input"]}
+
+    def __init__(self, input_provider, context_token_budget: int = 4000, context_top_k: int = 8,
+                 max_workers: int = 4, checkpoint_dir: str | None = "checkpoints",
+                 step_cache: StepCache | None = None, loop_workers: int = 4, trace_file: str | None = None,
+                 run_id: str | None = None):
+        # names this run's checkpoints (e.g. the session id), so concurrent runs of a workflow don't
+        # overwrite each other's; pass the id of an earlier run to resume it
+        self._run_id = run_id or uuid.uuid4().hex
         self._workflow: dict | None = None
+        self._workflow_id: str | None = None
+        self._compiled: CompiledWorkflow | None = None
         self._current_step: dict | None = None
         self._input_provider = input_provider
         self._agent: BaseAgent | None = None
         self._state = {}  # Store inputs/outputs for passing between steps
         self._waiting_for_input = False
         self._current_loop_state: dict | None = None
-        self._loop_steps: dict | None = None
+        self._loop_file: str | None = None  # the file of the current iteration of a loop over files_to_modify
+        self._context_token_budget = context_token_budget  # max tokens of context_files sent to the agent
+        self._context_top_k = context_top_k  # max chunks of context_files when they exceed the budget
+        self._waiting_step: dict | None = None  # the user_input step waiting for a response
+        self._agent_lock = threading.Lock()  # the agent's conversation can only serve one step at a time
+        self._dag = DagExecutor(self, max_workers=max_workers)
+        self._parallel = False
+        self._checkpoints = CheckpointStore(checkpoint_dir) if checkpoint_dir else None
+        self._step_cache = step_cache if step_cache is not None else StepCache()
+        self._loop_workers = loop_workers  # default concurrency of parallel loops
+        self._agent_factory: Callable[[], BaseAgent] | None = None
+        self._trace_file = trace_file  # Chrome trace written after each run when set
+        self._trace_parent: int | None = None  # span that steps run on worker threads nest under
+        self._code_writers: dict[str, StreamingFileWriter] = {}  # code streamed ahead of file_write steps
+        if trace_file:
+            tracer.enable()
+
+    @property
+    def run_id(self) -> str:
+        return self._run_id
+
+    def _checkpoint_name(self, workflow_id: str) -> str:
+        return f"{workflow_id}.{re.sub(r'[^A-Za-z0-9_-]', '_', self._run_id)}"
 
     def set_agent(self, agent: BaseAgent) -> None:
         self._agent = agent
 
+    def set_agent_factory(self, agent_factory: Callable[[], BaseAgent]) -> None:
+        """
+        Set a factory creating an agent per item of a parallel loop.  Without one, the items share the
+        workflow's agent and its steps run one at a time.
+        """
+        self._agent_factory = agent_factory
+
+    def _read_workflow(self, workflow_id: str) -> bool:
+        """Get the compiled workflow definition and prepare the executor."""
+        compiled = workflow_registry.get(workflow_id)
+        if compiled is None:
+            print(f"No workflow with name {workflow_id} found.")
+            return False
+        if not compiled.valid:
+            print(f"Workflow {workflow_id} is invalid and can't be run.")
+            return False
+
+        self._compiled = compiled
+        self._workflow = compiled.definition
+        self._workflow_id = workflow_id
+
+        # "executor": "parallel" runs steps as a dependency graph built from their input/output keys
+        self._parallel = self._workflow.get('executor', 'sequential') == 'parallel'
+        if self._parallel:
+            self._dag.load(self._workflow['steps'])
+        return True
+
+    def _reload_if_changed(self) -> None:
+        """
+        Switch to the latest version of the workflow if its file changed.  The run continues from the
+        step with the same id; an invalid edit is ignored and the current version is kept.
+        """
+        if not self._workflow_id:
+            return
+        compiled = workflow_registry.get(self._workflow_id)
+        if compiled is None or compiled is self._compiled or not compiled.valid:
+            return
+
+        print(f"Workflow {self._workflow_id} changed, reloading")
+        self._compiled = compiled
+        self._workflow = compiled.definition
+        if self._current_step:
+            self._current_step = self._find_step(self._current_step['id'])
+        if self._waiting_step:
+            self._waiting_step = self._find_step(self._waiting_step['id'])
+        if self._current_loop_state:
+            self._current_loop_state['parent_step'] = self._find_step(self._current_loop_state['parent_step']['id'])
+
+        parallel = self._workflow.get('executor', 'sequential') == 'parallel'
+        if parallel:
+            snapshot = self._dag.snapshot() if self._parallel else {}
+            self._dag.load(self._workflow['steps'])
+            self._dag.restore(snapshot)
+        self._parallel = parallel
+
     def load_workflow(self, workflow_id: str):
         """Load the workflow and initialize the first step."""
-        try:
-            with open(f'workflows/{workflow_id}.json', 'r') as f:
-                self._workflow = json.load(f)
-        except FileNotFoundError:
-            print(f"No workflow with name {workflow_id} found.")
+        if not self._read_workflow(workflow_id):
             return
 
         self._current_step = self._workflow['steps'][0]  # Start at the first step
-        self.execute_workflow()
         print(f"Starting workflow: {self._workflow['name']}")
+        self.execute_workflow()
+
+    def resume_workflow(self, workflow_id: str) -> bool:
+        """
+        Resume a workflow from the last checkpoint of this controller's run id.  Completed steps are not
+        run again; if the workflow was waiting for user input, the user is asked again.
+
+        :param workflow_id: The workflow to resume.
+        :return: True if a checkpoint was found and the workflow resumed.
+        """
+        checkpoint = self._checkpoints.load(self._checkpoint_name(workflow_id)) if self._checkpoints else None
+        if not checkpoint or not self._read_workflow(workflow_id):
+            return False
+
+        print(f"Resuming workflow: {self._workflow['name']}")
+        self._state = checkpoint.get('state', {})
+        self._current_step = self._find_step(checkpoint.get('current_step_id'))
+
+        loop = checkpoint.get('loop')
+        self._current_loop_state = None
+        if loop:
+            self._current_loop_state = {
+                'parent_step': self._find_step(loop['parent_step_id']),
+                'items': loop['items'],
+                'current_index': loop['current_index'],
+                'current_sub_step': loop['current_sub_step']
+            }
+
+        if self._parallel:
+            self._dag.restore(checkpoint.get('dag', {}))
+
+        waiting_step = self._find_step(checkpoint.get('waiting_step_id'))
+        if waiting_step:
+            self.handle_user_input(waiting_step)
+        else:
+            self.execute_workflow()
+        return True
+
+    def save_checkpoint(self) -> None:
+        """
+        Durably record the workflow's state and position so it can be resumed.
+
+        :raises TypeError: If the state holds values that can't be stored as JSON.
+        """
+        if not self._checkpoints or not self._workflow_id:
+            return
+
+        loop = None
+        if self._current_loop_state:
+            loop = {
+                'parent_step_id': self._current_loop_state['parent_step']['id'],
+                'items': self._current_loop_state['items'],
+                'current_index': self._current_loop_state['current_index'],
+                'current_sub_step': self._current_loop_state['current_sub_step']
+            }
+
+        self._checkpoints.save(self._checkpoint_name(self._workflow_id), {
+            'workflow_id': self._workflow_id,
+            'run_id': self._run_id,
+            'state': dict(self._state),
+            'current_step_id': self._current_step['id'] if self._current_step else None,
+            'waiting_step_id': self._waiting_step['id'] if self._waiting_step else None,
+            'loop': loop,
+            'dag': self._dag.snapshot() if self._parallel else None
+        })
+
+    def _find_step(self, step_id):
+        """Find a step, or a loop's sub-step, by its ID."""
+        if step_id is None or not self._compiled:
+            return None
+        return self._compiled.get_step(step_id)
 
     def execute_workflow(self):
         print('execute_workflow()')
+        self._reload_if_changed()
+        try:
+            with tracer.span(f"workflow {self._workflow_id}", "workflow"):
+                self._trace_parent = tracer.current()
+                self._run_workflow()
+        finally:
+            # written even when a step fails, which is when the trace is most useful
+            if self._trace_file:
+                tracer.export(self._trace_file)
+
+    def _run_workflow(self):
+        """Runs steps until the workflow waits for user input or finishes."""
         while True:
-            while self._current_step:
-                if self._current_step['type'] == 'loop':
-                    self.execute_loop(self._current_step)
-                else:
-                    self.execute_step(self._current_step)
-
+            if self._parallel:
+                self._dag.run()
                 if self._waiting_for_input:
+                    self.save_checkpoint()
                     return  # exit workflow as we wait for response
+            else:
+                while self._current_step:
+                    self.run_step(self._current_step)
 
-                self.transition_to_next_step()
+                    if self._waiting_for_input:
+                        self.save_checkpoint()
+                        return  # exit workflow as we wait for response
+
+                    self.transition_to_next_step()
+                    self.save_checkpoint()
 
             # if we get here, the workflow has finished
+            if not self._should_repeat():
+                print('Workflow complete.')
+                if self._checkpoints:
+                    self._checkpoints.clear(self._checkpoint_name(self._workflow_id))
+                return
+
             print('Workflow complete. Starting over.')
             self._current_step = self._workflow['steps'][0]  # Start at the first step
+            if self._parallel:
+                self._dag.reset()
+
+    def _should_repeat(self) -> bool:
+        """
+        Returns True if the workflow should start over once complete.  Restarting is only done when the
+        first step asks the user for input, so a workflow without user input can't spin forever.
+        """
+        if not self._workflow or not self._workflow.get('repeat', True):
+            return False
+        return self._workflow['steps'][0]['type'] == 'user_input'
+
+    def run_step(self, step: dict):
+        """Runs a single step or loop."""
+        if step['type'] == 'loop':
+            with tracer.span(f"loop {step['id']}", "step", parent=self._trace_parent,
+                             mode=step.get('mode', 'sequential')):
+                self.execute_loop(step)
+        else:
+            self.execute_step(step)
 
     def execute_loop(self, loop_step):
+        # "mode": "parallel" maps the sub-steps over the items concurrently instead of one item at a time
+        if loop_step.get('mode', 'sequential') == 'parallel':
+            self._execute_parallel_loop(loop_step)
+            return
+
         if not self._current_loop_state:
             self._initialize_loop_state(loop_step)
 
+        loop_over_item = loop_step['loop_over'].split('.')[1]
         while self._current_loop_state['current_index'] < len(self._current_loop_state['items']):
-            for sub_step in loop_step['sub-steps']:
-                self.execute_step(sub_step)
+            item = self._current_loop_state['items'][self._current_loop_state['current_index']]
+            self._state[loop_over_item] = item
+            self._loop_file = item if self._loops_over_files(loop_step) else None
+            sub_steps = loop_step['sub-steps']
+            # resume from the loop cursor so completed sub-steps aren't run again
+            while self._current_loop_state['current_sub_step'] < len(sub_steps):
+                self.execute_step(sub_steps[self._current_loop_state['current_sub_step']])
                 if self._waiting_for_input:
                     return
+                self._current_loop_state['current_sub_step'] += 1
+                self.save_checkpoint()
+            self._current_loop_state['current_sub_step'] = 0
             self._current_loop_state['current_index'] += 1
 
         self._current_loop_state = None
+        self._loop_file = None
+
+    @staticmethod
+    def _loops_over_files(loop_step: dict) -> bool:
+        return loop_step['loop_over'].split('.')[0] == 'files_to_modify'
 
     def _initialize_loop_state(self, step):
         loop_over_list = step['loop_over'].split('.')[0]
-        loop_over_item = step['loop_over'].split('.')[1]
         self._current_loop_state = {
             'parent_step': step,
-            'items': self._state.get(loop_over_list, []),
+            'items': self._state.get(loop_over_list, None) or [],
             'current_index': 0,
             'current_sub_step': 0
         }
-        self._state[loop_over_item] = self._current_loop_state['items'][0]
+
+    def _execute_parallel_loop(self, loop_step):
+        """
+        Runs a loop's sub-steps for every item concurrently, at most "max_concurrency" items at a time.
+
+        Each item runs in its own deep copy of the state, so items can't see or change each other's
+        values.  In a loop over files_to_modify, each item's steps modify that item's file.  Once all
+        items are done, each of the loop's output keys (by default, every sub-step output) is set to the
+        list of that key's values, in the order of the items.
+        """
+        loop_over_list, loop_over_item = loop_step['loop_over'].split('.')
+        items = self._state.get(loop_over_list, None) or []
+        max_concurrency = loop_step.get('max_concurrency', self._loop_workers)
+
+        loop_span = tracer.current()
+
+        def run_item(item):
+            scope = self._item_scope(copy.deepcopy({**self._state, loop_over_item: item}),
+                                     item if self._loops_over_files(loop_step) else None)
+            scope._trace_parent = loop_span
+            try:
+                for sub_step in loop_step['sub-steps']:
+                    scope.execute_step(sub_step)
+            finally:
+                # code streamed for a file the item didn't write
+                scope._discard_code_writer()
+            return scope._state
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(items) or 1))) as executor:
+            item_states = list(executor.map(run_item, items))
+
+        output_keys = step_keys(loop_step, 'output') or [key for sub_step in loop_step['sub-steps']
+                                                         for key in step_keys(sub_step, 'output')]
+        for key in output_keys:
+            self._state[key] = [item_state.get(key, None) for item_state in item_states]
+
+    def _item_scope(self, state: dict, loop_file: str | None = None) -> 'WorkflowController':
+        """
+        Returns a controller that runs steps of this workflow against its own state, for an item of a
+        parallel loop.  It shares this controller's step cache and, unless an agent factory was set, its
+        agent.
+
+        :param state: The item's state.
+        :param loop_file: The file the item's steps modify, if the loop is over files_to_modify.
+        """
+        scope = WorkflowController(self._input_provider, context_token_budget=self._context_token_budget,
+                                   context_top_k=self._context_top_k, checkpoint_dir=None,
+                                   step_cache=self._step_cache)
+        scope._workflow = self._workflow
+        scope._workflow_id = self._workflow_id
+        scope._compiled = self._compiled
+        scope._state = state
+        scope._loop_file = loop_file
+        if self._agent_factory:
+            scope._agent = self._agent_factory()
+        else:
+            scope._agent = self._agent
+            scope._agent_lock = self._agent_lock
+        return scope
 
     def execute_step(self, step: dict):
         """Executes the workflow from the current step."""
+        with tracer.span(f"step {step['id']}", "step", parent=self._trace_parent, type=step['type']):
+            self._execute_step(step)
+
+    def _execute_step(self, step: dict):
         step_type = step['type']
-        step_id = self._current_step['id']
+        step_id = step['id']
 
-        print(f"Executing step {step_id}: {self._current_step}")
+        print(f"Executing step {step_id}: {step}")
 
         if step_type == 'user_input':
-            self.handle_user_input(self._current_step)
+            self.handle_user_input(step)
             return # wait for user input
-        elif step_type == 'agent_action':
-            self.handle_agent_action(self._current_step)
+
+        cache_key = self._step_cache_key(step)
+        if cache_key:
+            outputs = self._step_cache.get(self._workflow_id, cache_key)
+            if outputs is not None:
+                print(f"Step {step_id} inputs unchanged, using cached outputs")
+                tracer.annotate(cache_hit=True)
+                self._state.update(copy.deepcopy(outputs))
+                return
+            tracer.annotate(cache_hit=False)
+            state_before = dict(self._state)
+
+        if step_type == 'agent_action':
+            self.handle_agent_action(step)
             print('agent_action step handled')
         elif step_type == 'system_action':
-            self.handle_system_action(self._current_step)
+            with tracer.span(f"tool {step['agent']}", "tool"):
+                self.handle_system_action(step)
             print('system_action step handled')
         # elif step_type == 'loop':
         #     self.handle_loop(self._current_step)
         #     print('loop step handled')
         else:
             print(f"Unknown step type: {step_type}")
+            return
+
+        if cache_key:
+            # the step's declared outputs, or else whatever it added or changed in the state
+            output_keys = step_keys(step, 'output') or [key for key, value in self._state.items()
+                                                         if key not in state_before or state_before[key] is not value]
+            outputs = {key: self._state.get(key, None) for key in output_keys}
+            self._step_cache.put(self._workflow_id, cache_key, copy.deepcopy(outputs))
+
+    def _step_cache_key(self, step: dict) -> str | None:
+        """
+        Returns the cache key for a step's outputs, or None if the step must always run.
+        Steps opt out with "cache": false.
+        """
+        if not self._workflow_id or not step.get('cache', True):
+            return None
+        if step['type'] == 'system_action' and step['agent'] in self.UNCACHEABLE_TOOLS:
+            return None
+
+        reads = step_keys(step, 'input')
+        if step['type'] == 'system_action':
+            reads += self.SYSTEM_TOOL_READS.get(step['agent'], [])
+        inputs = {key: self._state.get(key, None) for key in reads}
+        if step['type'] == 'agent_action':
+            inputs['path'] = self._target_path()
+
+        # include the modification time of every file the step reads
+        files = {}
+        if step['type'] == 'system_action' and step['agent'] == 'file_read':
+            paths = [self._file_to_read(step)] + list(self._state.get('context_files', None) or [])
+            for path in filter(None, paths):
+                try:
+                    stat = os.stat(path)
+                    files[path] = (stat.st_mtime, stat.st_size)
+                except OSError:
+                    files[path] = None
+
+        agent = getattr(self._agent, 'fingerprint', None) if step['type'] == 'agent_action' else None
+        return StepCache.make_key(step, inputs, files, agent=agent)
+
+    def _file_to_read(self, step) -> str | None:
+        """
+        The file read by a file_read step: its first input, such as a loop's current file, or the first
+        of the files to modify.
+        """
+        input_keys = step_keys(step, 'input')
+        path = self._state.get(input_keys[0], None) if input_keys else None
+        if path is None or isinstance(path, list):
+            path = path[0] if path else self._target_path()
+        return path
+
+    def _target_path(self) -> str | None:
+        """
+        The file the workflow is modifying: the current item of a loop over files, or else the first of
+        the files to modify.
+        """
+        if self._loop_file:
+            return self._loop_file
+        files_to_modify = self._state.get('files_to_modify', None) or []
+        return files_to_modify[0] if files_to_modify else None
 
     def handle_user_input(self, step, user_input: dict | None = None):
         print('Handling user input')
@@ -108,6 +473,7 @@ class WorkflowController:
         for item in step['input'].values():
             input_prompt += f' {item} '
 
+        self._waiting_step = step
         self._waiting_for_input = True
         self._input_provider(input_prompt)
 
@@ -133,15 +499,22 @@ class WorkflowController:
         if tool_to_use == "file_read":
 
             self._state["code_to_modify"] = ''
-            file_content = read_file(self._state["files_to_modify"][0])
+            file_content = read_file(self._file_to_read(step))
             self._state["code_to_modify"] += file_content
 
-            self._state["context"] = ""
-            for file in self._state["context_files"]:
-                self._state["context"] += f"{file} {read_file(file)} "
+            # only the parts of the context files relevant to the instruction when they don't fit the budget
+            self._state["context"] = build_context(paths=self._state["context_files"],
+                                                   query=self._state.get("user_input", None) or "",
+                                                   token_budget=self._context_token_budget,
+                                                   top_k=self._context_top_k)
 
         elif tool_to_use == "file_write":
-            result = write_file(self._state["files_to_modify"][0], self._state["modified_code"])
+            path = self._target_path()
+            writer = self._code_writers.pop(path, None)
+            if writer:
+                result = writer.commit(self._state["modified_code"])
+            else:
+                result = write_file(path, self._state["modified_code"])
             self._state["result_of_write"] = result
 
         # print("handle_system_action outputting ", self._state)
@@ -157,12 +530,41 @@ class WorkflowController:
         input_keys = step['input']
         inputs = {key: self._state.get(key, None) for key in input_keys}
 
-        agent_output = self._agent.run_agent(inputs)
+        # agents that take the path of the file they work on, e.g. to leave its own definitions out of
+        # the context, get the file being modified
+        path = self._target_path()
+        schema = getattr(self._agent, 'input_schema', None) or {}
+        if path and 'path' in schema.get('properties', {}):
+            inputs.setdefault('path', path)
+
+        # stream whole-file code to the file being modified, so writing it only has to rename the result
+        writer = None
+        if path and hasattr(self._agent, 'set_code_writer'):
+            self._discard_code_writer(path)
+            writer = StreamingFileWriter(path)
+
+        with self._agent_lock, tracer.span(f"agent {agent}", "agent"):
+            if writer:
+                self._agent.set_code_writer(writer)
+            try:
+                agent_output = self._agent.run_agent(inputs)
+            finally:
+                if writer:
+                    self._agent.set_code_writer(None)
+        if writer:
+            self._code_writers[path] = writer
 
         # the output of the agent should have the same keys as step['output']
         for output in step['output']:
             self._state[output] = agent_output[output]
 
+    def _discard_code_writer(self, path: str | None = None):
+        """Drops the code streamed for a file (or every file) that wasn't written."""
+        for key in ([path] if path else list(self._code_writers)):
+            writer = self._code_writers.pop(key, None)
+            if writer:
+                writer.discard()
+
     def transition_to_next_step(self):
         """Handle transition logic to the next step."""
         if self._current_loop_state:
@@ -195,33 +597,41 @@ class WorkflowController:
     def get_step_by_id(self, step_id):
         """Find a step by its ID."""
         print('get_step_by_id: ', step_id)
-        if self._current_loop_state:
-            for substep in self._loop_steps:
-                if substep['id'] == step_id:
-                    # print('  returning: ', substep)
-                    return substep
-        else:
-            for step in self._workflow['steps']:
-                if step['id'] == step_id:
-                    return step
-        return None
+        return self._find_step(step_id)
 
     def set_user_input(self, user_input: dict):
         if self._waiting_for_input:
             print('set_user_input received: ', user_input)
-            for output_key in self._current_step['output']:
+            for output_key in self._waiting_step['output']:
                 self._state[output_key] = user_input.get(output_key, None)
 
             self._waiting_for_input = False
-            self.transition_to_next_step()
+            self._waiting_step = None
+            if self._parallel:
+                self._dag.complete_user_input()
+            elif self._current_loop_state:
+                # the input answered a loop sub-step; continue the loop after it
+                self._current_loop_state['current_sub_step'] += 1
+            else:
+                self.transition_to_next_step()
+            self.save_checkpoint()
             self.execute_workflow()
 
     def exit_workflow(self):
         """Cleanup and stop running the workflow."""
+        if self._checkpoints and self._workflow_id:
+            self._checkpoints.clear(self._checkpoint_name(self._workflow_id))
+        if self._workflow_id:
+            self._step_cache.evict(self._workflow_id)
+        self._discard_code_writer()
         self._workflow = None
+        self._workflow_id = None
         self._current_step = None
         self._state = {}
         self._waiting_for_input = False
+        self._waiting_step = None
         self._current_loop_state = None
-        self._loop_steps = None
+        self._loop_file = None
+        self._compiled = None
+        self._parallel = False
         print("Workflow exited")